@@ -0,0 +1,10 @@
+"""
+Backend de gestion de stock.
+
+Le fichier .env est chargé ici, une seule fois, avant tout module de
+l'application : les réglages sont lus à l'import (les variables déjà
+définies dans l'environnement restent prioritaires).
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,80 @@
+"""
+Détection des franchissements de seuil d'alerte.
+
+Chaque flush inspecte les produits modifiés : si le stock (ou un seuil) fait
+passer un produit au-dessous ou au-dessus de son seuil kg/cartons, une alerte
+est préparée, puis publiée sur le bus d'événements une fois le commit réussi.
+Toutes les routes qui écrivent le stock sont couvertes sans modification.
+"""
+from sqlalchemy import event, inspect
+
+from app.database import SessionLocal, Product, is_low_stock
+from app.events import bus
+
+ALERT_TOPIC = "alerts"
+_WATCHED = ("stock_actuel_kg", "stock_actuel_cartons", "seuil_alerte", "seuil_alerte_cartons", "unite_kg", "unite_cartons")
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history : l'ancienne valeur est chargée même si l'attribut a été expiré
+# par un commit précédent, sinon le franchissement ne serait pas détectable.
+for _name in _WATCHED:
+    event.listen(getattr(Product, _name), "set", _keep_previous_value, active_history=True)
+
+
+def _values_before_and_after(product: Product):
+    state = inspect(product)
+    before, after = [], []
+    for name in _WATCHED:
+        history = state.attrs[name].history
+        current = getattr(product, name)
+        after.append(current)
+        before.append(history.deleted[0] if history.deleted else current)
+    return before, after
+
+
+def alert_payload(product: Product, low: bool) -> dict:
+    return {
+        "product_id": product.id,
+        "code_produit": product.code_produit,
+        "nom_produit": product.nom_produit,
+        "etat": "bas" if low else "normal",
+        "stock_kg": float(product.stock_actuel_kg or 0.0),
+        "stock_cartons": int(product.stock_actuel_cartons or 0),
+        "seuil_alerte": float(product.seuil_alerte or 0.0),
+        "seuil_alerte_cartons": int(product.seuil_alerte_cartons or 0),
+    }
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _detect_threshold_crossings(session, flush_context):
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        before, after = _values_before_and_after(obj)
+        if before == after:
+            continue
+        # État au début de la transaction (une transaction peut flusher plusieurs fois)
+        initial = session.info.setdefault("stock_alert_initial", {}).setdefault(obj.id, is_low_stock(*before))
+        pending = session.info.setdefault("stock_alerts", {})
+        now_low = is_low_stock(*after)
+        if now_low != initial:
+            pending[obj.id] = alert_payload(obj, now_low)
+        else:
+            pending.pop(obj.id, None)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_alerts(session):
+    session.info.pop("stock_alert_initial", None)
+    for payload in session.info.pop("stock_alerts", {}).values():
+        bus.publish(ALERT_TOPIC, payload, product_id=payload["product_id"])
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_alerts(session, previous_transaction):
+    session.info.pop("stock_alert_initial", None)
+    session.info.pop("stock_alerts", None)
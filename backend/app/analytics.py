@@ -0,0 +1,191 @@
+"""
+Analyse des sorties dans le temps : quantités sorties par période (jour,
+semaine ou mois), par produit et par type de sortie.
+
+Le regroupement est fait par la base, en une requête. L'expression de
+période dépend du dialecte (`strftime` / `date` sous SQLite, `date_trunc`
+sous PostgreSQL) et donne toujours le premier jour de la période au format
+AAAA-MM-JJ, semaines commençant le lundi.
+
+La réponse est en colonnes (une liste par champ, même longueur) : sur une
+année de sorties, les noms de champs ne sont pas répétés à chaque ligne.
+Seule la base principale est lue (exercices archivés exclus).
+
+`abc_classification` : classement ABC (Pareto) des produits sur une période,
+par valeur sortie (kg × prix de vente du produit) et par volume (kg).
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.database import Product, StockExit, StockExitItem
+
+GRANULARITIES = ("day", "week", "month")
+SERIES_FIELDS = ("period", "product_id", "type_sortie", "qte_kg", "qte_cartons", "lignes")
+
+
+def period_bucket(column, granularity: str, dialect: str):
+    """Premier jour de la période de `column`, en texte AAAA-MM-JJ."""
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc(granularity, column), "YYYY-MM-DD")
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", column)
+    if granularity == "week":
+        # 'weekday 0' : dimanche de la semaine (ou le jour même), puis lundi précédent
+        return func.date(column, "weekday 0", "-6 days")
+    return func.date(column)
+
+
+def exit_series(
+    db: Session,
+    granularity: str,
+    date_debut: datetime,
+    date_fin: datetime,
+    product_ids: Optional[List[int]] = None,
+    types: Optional[List[str]] = None,
+    top: Optional[int] = None,
+) -> Dict:
+    """Sorties groupées par (période, produit, type), en colonnes.
+
+    `top` : seulement les `top` produits les plus sortis (kg) sur la période,
+    dans l'ordre du classement (`ranking`).
+    """
+    criteria = [StockExit.date_sortie >= date_debut, StockExit.date_sortie <= date_fin]
+    if product_ids:
+        criteria.append(StockExitItem.product_id.in_(product_ids))
+    if types:
+        criteria.append(StockExit.type_sortie.in_(types))
+
+    def joined(statement):
+        return statement.join(StockExit, StockExitItem.exit_id == StockExit.id).where(*criteria)
+
+    ranking = None
+    if top:
+        ranking = list(db.scalars(
+            joined(select(StockExitItem.product_id))
+            .group_by(StockExitItem.product_id)
+            .order_by(func.sum(StockExitItem.qte_kg).desc(), StockExitItem.product_id)
+            .limit(top)
+        ))
+        criteria.append(StockExitItem.product_id.in_(ranking))
+
+    period = period_bucket(StockExit.date_sortie, granularity, db.get_bind().dialect.name).label("period")
+    # Exécution Core : pas de couche de chargement ORM pour des dizaines de milliers de lignes
+    rows = db.connection().execute(
+        joined(select(
+            period,
+            StockExitItem.product_id,
+            StockExit.type_sortie,
+            func.sum(StockExitItem.qte_kg),
+            func.sum(StockExitItem.qte_cartons),
+            func.count(StockExitItem.id),
+        ))
+        .group_by(period, StockExitItem.product_id, StockExit.type_sortie)
+        .order_by(period, StockExitItem.product_id, StockExit.type_sortie)
+    ).all()
+
+    columns = [list(values) for values in zip(*rows)] if rows else [[] for _ in SERIES_FIELDS]
+    series = dict(zip(SERIES_FIELDS, columns))
+    series["qte_kg"] = [value or 0.0 for value in series["qte_kg"]]
+    series["qte_cartons"] = [value or 0 for value in series["qte_cartons"]]
+    result = {
+        "granularity": granularity,
+        "date_debut": date_debut,
+        "date_fin": date_fin,
+        "rows": len(rows),
+        "series": series,
+    }
+    if ranking is not None:
+        result["ranking"] = ranking
+    return result
+
+
+def _abc_class(cumulative, amount, total, a_share: float, b_share: float):
+    """A tant que la part cumulée *avant* le produit est sous `a_share` (le produit qui franchit le seuil est A)."""
+    before = cumulative - amount
+    return case(
+        (total <= 0, "C"),
+        (before < a_share * total, "A"),
+        (before < b_share * total, "B"),
+        else_="C",
+    )
+
+
+def abc_classification(
+    db: Session,
+    date_debut: datetime,
+    date_fin: datetime,
+    a_share: float = 0.8,
+    b_share: float = 0.95,
+) -> List[Dict]:
+    """Classes ABC de tous les produits, par valeur et par volume sortis sur la période.
+
+    Une requête : sorties agrégées par produit (jointure externe : un produit
+    sans sortie est en C), puis cumuls et rangs par fonctions de fenêtre,
+    triés par valeur décroissante.
+    """
+    totals = (
+        select(
+            StockExitItem.product_id,
+            func.sum(StockExitItem.qte_kg).label("qte_kg"),
+            func.sum(StockExitItem.qte_cartons).label("qte_cartons"),
+            func.count(StockExitItem.id).label("lignes"),
+        )
+        .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .where(StockExit.date_sortie >= date_debut, StockExit.date_sortie <= date_fin)
+        .group_by(StockExitItem.product_id)
+        .subquery("totals")
+    )
+    volume = func.coalesce(totals.c.qte_kg, 0.0)
+    value = volume * func.coalesce(Product.prix_vente, 0.0)
+    per_product = (
+        select(
+            Product.id.label("product_id"),
+            Product.code_produit,
+            Product.nom_produit,
+            value.label("valeur"),
+            volume.label("qte_kg"),
+            func.coalesce(totals.c.qte_cartons, 0).label("qte_cartons"),
+            func.coalesce(totals.c.lignes, 0).label("lignes"),
+        )
+        .outerjoin(totals, totals.c.product_id == Product.id)
+        .subquery("per_product")
+    )
+
+    by_value = (per_product.c.valeur.desc(), per_product.c.product_id)
+    by_volume = (per_product.c.qte_kg.desc(), per_product.c.product_id)
+    ranked = select(
+        per_product,
+        func.row_number().over(order_by=by_value).label("rang_valeur"),
+        func.sum(per_product.c.valeur).over(order_by=by_value, rows=(None, 0)).label("cumul_valeur"),
+        func.sum(per_product.c.valeur).over().label("total_valeur"),
+        func.row_number().over(order_by=by_volume).label("rang_volume"),
+        func.sum(per_product.c.qte_kg).over(order_by=by_volume, rows=(None, 0)).label("cumul_volume"),
+        func.sum(per_product.c.qte_kg).over().label("total_volume"),
+    ).subquery("ranked")
+
+    rows = db.connection().execute(
+        select(
+            ranked.c.product_id,
+            ranked.c.code_produit,
+            ranked.c.nom_produit,
+            ranked.c.valeur,
+            ranked.c.qte_kg,
+            ranked.c.qte_cartons,
+            ranked.c.lignes,
+            ranked.c.rang_valeur,
+            case((ranked.c.total_valeur > 0, ranked.c.cumul_valeur / ranked.c.total_valeur), else_=0.0)
+            .label("part_cumulee_valeur"),
+            _abc_class(ranked.c.cumul_valeur, ranked.c.valeur, ranked.c.total_valeur, a_share, b_share)
+            .label("classe_valeur"),
+            ranked.c.rang_volume,
+            case((ranked.c.total_volume > 0, ranked.c.cumul_volume / ranked.c.total_volume), else_=0.0)
+            .label("part_cumulee_volume"),
+            _abc_class(ranked.c.cumul_volume, ranked.c.qte_kg, ranked.c.total_volume, a_share, b_share)
+            .label("classe_volume"),
+        ).order_by(ranked.c.rang_valeur)
+    ).all()
+    keys = rows[0]._fields if rows else ()
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,269 @@
+"""
+Archivage des exercices clos dans des fichiers SQLite par année.
+
+`archive_year` déplace les réceptions et sorties (entêtes et lignes) d'un
+exercice clos, par date métier, dans `ARCHIVE_DIR/stock_<année>.db`, avec
+les mouvements de ces documents et des ajustements datés de l'exercice
+(même saisis l'année suivante). Pour chaque produit, un mouvement
+d'ouverture (`reference_type="OPENING"`, daté du 1er janvier suivant)
+reporte la somme des mouvements archivés : l'historique restant se suffit
+à lui-même.
+
+Les exercices s'archivent dans l'ordre : pas d'exercice tant qu'un plus
+ancien reste dans la base principale. Les ajustements restent en place.
+
+Lecture : `history` renvoie la table principale seule, sauf si la période
+demandée remonte à un exercice archivé ; les archives concernées sont
+alors attachées (ATTACH, gardées sur la connexion du pool) et réunies par
+UNION ALL. Sans borne de date, seule la base principale est lue. Les
+mouvements, lus par `created_at` mais archivés avec leur document, sont
+aussi cherchés dans les exercices voisins de la période.
+"""
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, and_, delete, func, insert, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from app.database import (
+    LedgerArchive,
+    StockAdjustment,
+    StockEntry,
+    StockEntryItem,
+    StockExit,
+    StockExitItem,
+    StockMovement,
+)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archives")
+OPENING = "OPENING"
+# SQLITE_MAX_ATTACHED vaut 10 par défaut
+MAX_ATTACHED = 8
+
+ARCHIVED_TABLES = [
+    StockEntry.__table__,
+    StockEntryItem.__table__,
+    StockExit.__table__,
+    StockExitItem.__table__,
+    StockMovement.__table__,
+]
+
+# Écart admis, en exercices, entre la date lue et l'exercice d'archivage : un
+# mouvement saisi le 3 janvier pour une réception du 30 décembre est archivé
+# avec l'exercice précédent
+DATE_MARGIN = {StockMovement.__table__.name: 1}
+
+_archive_tables: Dict[tuple, Table] = {}
+
+
+class ArchiveError(ValueError):
+    """Archivage impossible (exercice non clos, déjà archivé, base non SQLite...)."""
+
+
+def archive_path(year: int) -> str:
+    return os.path.join(ARCHIVE_DIR, f"stock_{year}.db")
+
+
+def _alias(year: int) -> str:
+    return f"archive_{year}"
+
+
+def archive_table(table: Table, year: int) -> Table:
+    """Copie de `table` dans le fichier attaché de l'exercice (sans clés étrangères)."""
+    key = (table.name, year)
+    if key not in _archive_tables:
+        metadata = MetaData(schema=_alias(year))
+        copy = Table(table.name, metadata, *[
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in table.columns
+        ])
+        for index in table.indexes:
+            Index(index.name, *[copy.c[column.name] for column in index.columns])
+        _archive_tables[key] = copy
+    return _archive_tables[key]
+
+
+def archived_years(db: Session) -> List[int]:
+    return list(db.scalars(select(LedgerArchive.year).order_by(LedgerArchive.year)))
+
+
+def _attach(db: Session, years: Iterable[int]):
+    """Attacher les archives des exercices à la connexion de la session (si ce n'est déjà fait)."""
+    years = list(years)
+    if not years:
+        return
+    connection = db.connection()
+    attached = {row[1] for row in connection.exec_driver_sql("PRAGMA database_list")}
+    missing = [year for year in years if _alias(year) not in attached]
+    if not missing:
+        return
+    # Place libérée en détachant les archives inutiles à cette lecture (main et temp ne comptent pas)
+    wanted = {_alias(year) for year in years}
+    spare = [name for name in attached if name.startswith("archive_") and name not in wanted]
+    while spare and len(attached) - 2 + len(missing) > MAX_ATTACHED:
+        name = spare.pop()
+        connection.exec_driver_sql(f"DETACH DATABASE {name}")
+        attached.discard(name)
+    for year in missing:
+        connection.exec_driver_sql(f"ATTACH DATABASE ? AS {_alias(year)}", (archive_path(year),))
+
+
+def years_for_range(
+    db: Session, date_debut: Optional[datetime], date_fin: Optional[datetime], margin: int = 0,
+) -> List[int]:
+    """Exercices archivés que recouvre la période, élargie de `margin` ans (aucun si elle n'est pas bornée)."""
+    if date_debut is None and date_fin is None:
+        return []
+    if db.get_bind().dialect.name != "sqlite":
+        return []
+    years = archived_years(db)
+    if not years:
+        return []
+    first = date_debut.year - margin if date_debut else years[0]
+    last = date_fin.year + margin if date_fin else years[-1]
+    return [year for year in years if first <= year <= last]
+
+
+def history(
+    db: Session,
+    table: Table,
+    date_column: str,
+    date_debut: Optional[datetime] = None,
+    date_fin: Optional[datetime] = None,
+    where: Optional[Callable[[Table], list]] = None,
+):
+    """Sous-requête des lignes de `table` sur la période, archives comprises si nécessaire.
+
+    `where(t)` renvoie les critères supplémentaires, construits sur la table
+    principale puis sur chaque copie archivée.
+    """
+    years = years_for_range(db, date_debut, date_fin, DATE_MARGIN.get(table.name, 0))
+    _attach(db, years)
+    selects = []
+    for source in [table] + [archive_table(table, year) for year in years]:
+        date = source.c[date_column]
+        criteria = list(where(source)) if where else []
+        if date_debut:
+            criteria.append(date >= date_debut)
+        if date_fin:
+            criteria.append(date <= date_fin)
+        selects.append(select(*source.c).where(*criteria))
+    statement = selects[0] if len(selects) == 1 else union_all(*selects)
+    return statement.subquery("history")
+
+
+def _year_criteria(year: int) -> Dict[str, object]:
+    """Critères de sélection, dans la base principale, des lignes de l'exercice par table.
+
+    Réceptions et sorties par date métier ; leurs mouvements par le document
+    référencé (ligne de réception, de sortie ou ajustement daté de l'exercice),
+    quelle que soit leur date d'insertion, plus le report de l'exercice précédent.
+    """
+    start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    entries = select(StockEntry.id).where(StockEntry.date_reception >= start, StockEntry.date_reception < end)
+    exits = select(StockExit.id).where(StockExit.date_sortie >= start, StockExit.date_sortie < end)
+    adjustments = select(StockAdjustment.id).where(
+        StockAdjustment.date_ajustement >= start, StockAdjustment.date_ajustement < end,
+    )
+    movements = or_(
+        and_(StockMovement.reference_type == "ENTRY",
+             StockMovement.reference_id.in_(select(StockEntryItem.id).where(StockEntryItem.entry_id.in_(entries)))),
+        and_(StockMovement.reference_type == "EXIT",
+             StockMovement.reference_id.in_(select(StockExitItem.id).where(StockExitItem.exit_id.in_(exits)))),
+        and_(StockMovement.reference_type == "ADJUSTMENT", StockMovement.reference_id.in_(adjustments)),
+        and_(StockMovement.reference_type == OPENING, StockMovement.reference_id == year - 1),
+    )
+    return {
+        "stock_entries": StockEntry.id.in_(entries),
+        "stock_entry_items": StockEntryItem.entry_id.in_(entries),
+        "stock_exits": StockExit.id.in_(exits),
+        "stock_exit_items": StockExitItem.exit_id.in_(exits),
+        "stock_movements": movements,
+    }
+
+
+def archive_year(db: Session, year: int, user_id: int, today: Optional[datetime] = None) -> LedgerArchive:
+    """Déplacer l'exercice `year` dans son fichier d'archive et reporter les stocks. Commits compris.
+
+    Deux transactions : la copie dans l'archive est validée d'abord, puis les
+    lignes copiées (et elles seules, par identifiant) sont supprimées de la
+    base principale avec l'écriture du report. En WAL, SQLite ne rend pas
+    atomique un commit sur plusieurs fichiers attachés : une interruption
+    laisse au pire les lignes dans les deux fichiers, et une relance refait
+    la copie puis termine la suppression.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        raise ArchiveError("Archiving requires SQLite (ATTACH)")
+    today = today or datetime.now()
+    if year >= today.year:
+        raise ArchiveError(f"L'exercice {year} n'est pas clos")
+    if db.get(LedgerArchive, year) is not None:
+        raise ArchiveError(f"L'exercice {year} est déjà archivé")
+
+    start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    adjusted = select(StockMovement.reference_id).where(StockMovement.reference_type == "ADJUSTMENT")
+    oldest = [
+        db.scalar(select(func.min(StockEntry.date_reception))),
+        db.scalar(select(func.min(StockExit.date_sortie))),
+        # Les ajustements restent en place : seuls comptent ceux dont le mouvement est encore ici
+        db.scalar(select(func.min(StockAdjustment.date_ajustement)).where(StockAdjustment.id.in_(adjusted))),
+    ]
+    oldest = min((value for value in oldest if value is not None), default=None)
+    if oldest is not None and oldest < start:
+        raise ArchiveError(f"Archiver d'abord l'exercice {oldest.year}")
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # ATTACH hors transaction : rien n'a encore été écrit sur cette connexion
+    _attach(db, [year])
+    connection = db.connection()
+    copies = {table.name: archive_table(table, year) for table in ARCHIVED_TABLES}
+    criteria = _year_criteria(year)
+
+    # 1. Copie dans l'archive, validée seule
+    for table in ARCHIVED_TABLES:
+        copy = copies[table.name]
+        copy.create(connection, checkfirst=True)
+        # Reprise après un archivage interrompu : le fichier de l'exercice repart de zéro
+        db.execute(delete(copy))
+        db.execute(insert(copy).from_select(
+            [column.name for column in table.columns], select(*table.columns).where(criteria[table.name]),
+        ))
+    db.commit()
+
+    # 2. Base principale : suppression des lignes copiées et report à nouveau, en une transaction
+    # (la session peut avoir repris une autre connexion du pool : l'archive y est attachée au besoin)
+    _attach(db, [year])
+    # Lignes avant entêtes (clés étrangères)
+    for table in reversed(ARCHIVED_TABLES):
+        db.execute(delete(table).where(table.c.id.in_(select(copies[table.name].c.id))))
+
+    # Report : somme des mouvements archivés de chaque produit (report précédent compris),
+    # l'historique restant s'additionne ainsi exactement au stock actuel
+    archived = copies[StockMovement.__tablename__]
+    kg = func.sum(archived.c.qte_kg_mouvement)
+    cartons = func.sum(archived.c.qte_cartons_mouvement)
+    db.execute(insert(StockMovement).from_select(
+        ["product_id", "type_mouvement", "qte_kg_avant", "qte_cartons_avant", "qte_kg_mouvement",
+         "qte_cartons_mouvement", "qte_kg_apres", "qte_cartons_apres", "reference_id", "reference_type",
+         "created_by", "created_at"],
+        select(
+            archived.c.product_id, literal("ENTREE"), literal(0.0), literal(0),
+            kg, cartons, kg, cartons,
+            literal(year), literal(OPENING), literal(user_id), literal(end),
+        ).group_by(archived.c.product_id),
+    ))
+
+    counts = {name: db.scalar(select(func.count()).select_from(copies[name]))
+              for name in ("stock_entries", "stock_exits", "stock_movements")}
+    record = LedgerArchive(
+        year=year,
+        filename=os.path.basename(archive_path(year)),
+        entries=counts["stock_entries"],
+        exits=counts["stock_exits"],
+        movements=counts["stock_movements"],
+        archived_by=user_id,
+    )
+    db.add(record)
+    db.commit()
+    return record
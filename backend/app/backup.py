@@ -0,0 +1,321 @@
+"""
+Sauvegarde à chaud de la base SQLite, sans arrêter l'API.
+
+Copie par l'API de sauvegarde en ligne de SQLite, par paquets de
+`BACKUP_PAGES_PER_STEP` pages séparés de `BACKUP_STEP_SLEEP_MS`, pour ne pas
+saturer le disque pendant les écritures de stock.
+
+- base en WAL (par défaut, voir `SQLITE_WAL`) : la connexion source garde une
+  transaction de lecture ouverte pendant toute la copie ; l'instantané est
+  figé, les écritures continuent dans le WAL sans jamais attendre ;
+- journal classique : aucun verrou entre deux paquets, mais une écriture
+  concurrente fait reprendre la copie au début ; échec après
+  `BACKUP_MAX_RESTARTS` reprises.
+
+Chaque copie est vérifiée (`PRAGMA integrity_check`, ou `quick_check` avec
+`BACKUP_VERIFY=quick`) avant d'être conservée.
+
+- complète : `full-<horodatage>.db`, base d'une chaîne ;
+- incrémentale : `full-<horodatage>.inc-<horodatage>.gz`, seulement les pages
+  modifiées depuis l'instantané précédent de la chaîne (empreintes des pages
+  dans `full-<horodatage>.pages`). `restore` rejoue base + incréments.
+
+`BACKUP_INTERVAL_MINUTES` > 0 : instantané incrémental périodique, nouvelle
+chaîne après `BACKUP_FULL_EVERY` incréments, `BACKUP_KEEP` chaînes conservées.
+"""
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+STEP_SLEEP = int(os.getenv("BACKUP_STEP_SLEEP_MS", "20")) / 1000.0
+MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "5"))
+VERIFY = os.getenv("BACKUP_VERIFY", "full").lower()
+INTERVAL_MINUTES = float(os.getenv("BACKUP_INTERVAL_MINUTES", "0"))
+FULL_EVERY = int(os.getenv("BACKUP_FULL_EVERY", "24"))
+KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+_DELTA_MAGIC = b"SQLDELTA1"
+_DIGEST_SIZE = 8
+
+
+class BackupError(RuntimeError):
+    """Sauvegarde impossible ou copie corrompue."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _stamp() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def copy_database(source_path: str, dest_path: str) -> Dict:
+    """Copie cohérente de `source_path` par paquets de pages ; renvoie les statistiques de copie."""
+    source = sqlite3.connect(source_path, timeout=30)
+    dest = sqlite3.connect(dest_path)
+    state = {"remaining": None, "restarts": 0, "steps": 0, "pages": 0, "snapshot": False}
+
+    def progress(status, remaining, total):
+        state["steps"] += 1
+        state["pages"] = total
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            # La source a été modifiée par une autre connexion : la copie repart du début
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _Restarted()
+        state["remaining"] = remaining
+        if remaining:
+            time.sleep(STEP_SLEEP)
+
+    started = time.perf_counter()
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0].lower() == "wal":
+            # Instantané de lecture figé jusqu'à la fin de la copie : pas de reprise
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            state["snapshot"] = True
+        try:
+            source.backup(dest, pages=PAGES_PER_STEP, progress=progress)
+        except _Restarted:
+            raise BackupError(f"Database modified during backup ({state['restarts']} restarts); "
+                              "enable WAL (SQLITE_WAL=1) or retry later")
+    finally:
+        dest.close()
+        source.close()
+    state["seconds"] = round(time.perf_counter() - started, 3)
+    del state["remaining"]
+    return state
+
+
+def verify(path: str):
+    """Lever BackupError si la copie n'est pas intègre."""
+    pragma = "quick_check" if VERIFY == "quick" else "integrity_check"
+    connection = sqlite3.connect(path)
+    try:
+        result = [row[0] for row in connection.execute(f"PRAGMA {pragma}")]
+    finally:
+        connection.close()
+    if result != ["ok"]:
+        raise BackupError(f"{pragma} failed for {os.path.basename(path)}: {'; '.join(result[:5])}")
+
+
+def _page_size(path: str) -> int:
+    with open(path, "rb") as f:
+        header = f.read(100)
+    size = struct.unpack(">H", header[16:18])[0]
+    return 65536 if size == 1 else size
+
+
+def _digests(path: str, page_size: int) -> List[bytes]:
+    digests = []
+    with open(path, "rb") as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            digests.append(hashlib.blake2b(page, digest_size=_DIGEST_SIZE).digest())
+    return digests
+
+
+def _read_manifest(path: str) -> List[bytes]:
+    with open(path, "rb") as f:
+        data = f.read()
+    return [data[i:i + _DIGEST_SIZE] for i in range(0, len(data), _DIGEST_SIZE)]
+
+
+def _write_manifest(path: str, digests: List[bytes]):
+    with open(path + ".tmp", "wb") as f:
+        f.write(b"".join(digests))
+    os.replace(path + ".tmp", path)
+
+
+def _chains(directory: str) -> List[str]:
+    """Bases des chaînes (sauvegardes complètes), de la plus ancienne à la plus récente."""
+    return sorted(glob.glob(os.path.join(directory, "full-*.db")))
+
+
+def _increments(base: str) -> List[str]:
+    return sorted(glob.glob(base[:-len(".db")] + ".inc-*.gz"))
+
+
+def full_backup(source_path: str, directory: str = BACKUP_DIR) -> Dict:
+    """Sauvegarde complète vérifiée, base d'une nouvelle chaîne d'incréments."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"full-{_stamp()}.db")
+    partial = path + ".partial"
+    try:
+        stats = copy_database(source_path, partial)
+        verify(partial)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    os.replace(partial, path)
+    _write_manifest(path[:-len(".db")] + ".pages", _digests(path, _page_size(path)))
+    _prune(directory)
+    return dict(stats, kind="full", file=os.path.basename(path), bytes=os.path.getsize(path))
+
+
+def incremental_backup(source_path: str, directory: str = BACKUP_DIR) -> Dict:
+    """Instantané des pages modifiées depuis le précédent (complet s'il n'y a pas encore de chaîne)."""
+    chains = _chains(directory)
+    if not chains:
+        return full_backup(source_path, directory)
+    base = chains[-1]
+    manifest_path = base[:-len(".db")] + ".pages"
+    temp = os.path.join(directory, f"snapshot-{_stamp()}.partial")
+    try:
+        stats = copy_database(source_path, temp)
+        verify(temp)
+        page_size = _page_size(temp)
+        previous = _read_manifest(manifest_path)
+        current = _digests(temp, page_size)
+        changed = [number for number, digest in enumerate(current)
+                   if number >= len(previous) or previous[number] != digest]
+        path = base[:-len(".db")] + f".inc-{_stamp()}.gz"
+        with open(temp, "rb") as snapshot, gzip.open(path + ".tmp", "wb", compresslevel=1) as delta:
+            delta.write(_DELTA_MAGIC + struct.pack(">II", page_size, len(current)))
+            for number in changed:
+                snapshot.seek(number * page_size)
+                delta.write(struct.pack(">I", number) + snapshot.read(page_size))
+        os.replace(path + ".tmp", path)
+        _write_manifest(manifest_path, current)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return dict(stats, kind="incremental", file=os.path.basename(path), changed_pages=len(changed),
+                bytes=os.path.getsize(path))
+
+
+def restore(base: str, target: str, upto: Optional[str] = None) -> int:
+    """Reconstituer dans `target` la base `base` plus ses incréments (jusqu'à `upto` compris).
+
+    Renvoie le nombre d'incréments rejoués ; la base obtenue est vérifiée.
+    """
+    shutil.copyfile(base, target)
+    applied = 0
+    with open(target, "r+b") as out:
+        for path in _increments(base):
+            with gzip.open(path, "rb") as delta:
+                if delta.read(len(_DELTA_MAGIC)) != _DELTA_MAGIC:
+                    raise BackupError(f"Not an incremental snapshot: {path}")
+                page_size, page_count = struct.unpack(">II", delta.read(8))
+                while True:
+                    number = delta.read(4)
+                    if not number:
+                        break
+                    out.seek(struct.unpack(">I", number)[0] * page_size)
+                    out.write(delta.read(page_size))
+                out.truncate(page_count * page_size)
+            applied += 1
+            if upto and os.path.basename(path) == os.path.basename(upto):
+                break
+    verify(target)
+    return applied
+
+
+def list_backups(directory: str = BACKUP_DIR) -> List[Dict]:
+    return [
+        {
+            "file": os.path.basename(base),
+            "bytes": os.path.getsize(base),
+            "increments": [
+                {"file": os.path.basename(path), "bytes": os.path.getsize(path)} for path in _increments(base)
+            ],
+        }
+        for base in _chains(directory)
+    ]
+
+
+def _prune(directory: str):
+    for base in _chains(directory)[:-KEEP] if KEEP > 0 else []:
+        for path in _increments(base) + [base, base[:-len(".db")] + ".pages"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class BackupService:
+    """Une sauvegarde à la fois dans le processus ; lancement en arrière-plan et planification."""
+
+    def __init__(self, source_path: str, directory: str = BACKUP_DIR):
+        self.source_path = source_path
+        self.directory = directory
+        self.last: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._scheduler: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, kind: str = "incremental") -> Dict:
+        if not self._lock.acquire(blocking=False):
+            raise BackupError("A backup is already running")
+        started_at = datetime.now()
+        try:
+            backup = full_backup if kind == "full" else incremental_backup
+            result = backup(self.source_path, self.directory)
+            result["status"] = "ok"
+        except Exception as e:
+            logger.exception("Backup failed")
+            result = {"kind": kind, "status": "failed", "error": str(e)}
+        finally:
+            self._lock.release()
+        self.last = dict(result, started_at=started_at.isoformat(timespec="seconds"))
+        return self.last
+
+    def start(self, kind: str = "incremental") -> bool:
+        """Lancer une sauvegarde en arrière-plan ; False si une sauvegarde est déjà en cours."""
+        if self.running:
+            return False
+        threading.Thread(target=self.run, args=(kind,), name="backup", daemon=True).start()
+        return True
+
+    def _recent(self, seconds: float) -> bool:
+        # Plusieurs workers planifient la même sauvegarde : un seul la fait par intervalle
+        files = glob.glob(os.path.join(self.directory, "full-*"))
+        return any(time.time() - os.path.getmtime(path) < seconds for path in files)
+
+    def _schedule(self, interval: float):
+        while not self._stop.wait(interval):
+            if self.running or self._recent(interval / 2):
+                continue
+            chains = _chains(self.directory)
+            # Nouvelle chaîne après FULL_EVERY incréments : la restauration reste courte
+            full = not chains or len(_increments(chains[-1])) >= FULL_EVERY
+            self.run("full" if full else "incremental")
+
+    def start_schedule(self, minutes: float = INTERVAL_MINUTES):
+        if minutes <= 0 or self._scheduler is not None:
+            return
+        self._stop.clear()
+        self._scheduler = threading.Thread(target=self._schedule, args=(minutes * 60,),
+                                           name="backup-scheduler", daemon=True)
+        self._scheduler.start()
+
+    def stop_schedule(self):
+        self._stop.set()
+        if self._scheduler is not None:
+            self._scheduler.join(timeout=5)
+            self._scheduler = None
+
+
+# Base principale (SQLite uniquement ; PostgreSQL se sauvegarde avec pg_dump / pg_basebackup)
+backup_service = BackupService(engine.url.database) if engine.dialect.name == "sqlite" else None
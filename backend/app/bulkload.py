@@ -0,0 +1,229 @@
+"""
+Chargement en masse (jeux de test, reprise de données).
+
+- `BulkLoader` : accumule des lignes par table et les insère par gros lots,
+  dans l'ordre des clés étrangères : `COPY` sur PostgreSQL (psycopg2),
+  `executemany` direct du pilote sous SQLite (conversions de types faites une
+  fois par colonne, sans la compilation de paramètres ligne par ligne de
+  SQLAlchemy), `executemany` Core ailleurs ;
+- `fast_load()` : pendant le chargement, supprime les index non uniques des
+  tables chargées (recréés à la fin, en une passe triée plutôt qu'une mise à
+  jour par ligne) et, sous SQLite, allège la journalisation ;
+- `StockLedger` : stock des produits tenu en mémoire, qui produit en une passe
+  les lignes `stock_movements` (quantités avant/après) et le stock final.
+
+Aucun hook de session n'est déclenché : pas d'alertes, d'événements ni
+d'invalidation de cache pendant un chargement. Réservé aux bases hors service.
+"""
+import csv
+import io
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import Table, bindparam, func, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+DEFAULT_CHUNK_SIZE = 20000
+_COPY_NULL = "\\N"
+
+
+class BulkLoader:
+    """Insertion par lots, table par table, dans l'ordre donné (parents d'abord)."""
+
+    def __init__(self, conn: Connection, tables: Sequence[Table], chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.conn = conn
+        self.tables = {table.name: table for table in tables}
+        self.chunk_size = chunk_size
+        self.rows: Dict[str, List[dict]] = {name: [] for name in self.tables}
+        self.counts: Dict[str, int] = {name: 0 for name in self.tables}
+        self.use_copy = conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+        self.use_driver = conn.dialect.name == "sqlite"
+
+    def add(self, table_name: str, row: dict):
+        rows = self.rows[table_name]
+        rows.append(row)
+        if len(rows) >= self.chunk_size:
+            # Vider toutes les tables : une ligne enfant ne part jamais avant son parent
+            self.flush()
+
+    def extend(self, table_name: str, rows: Iterable[dict]):
+        for row in rows:
+            self.add(table_name, row)
+
+    def flush(self):
+        for name, table in self.tables.items():
+            rows = self.rows[name]
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(table, rows)
+            elif self.use_driver:
+                self._executemany(table, rows)
+            else:
+                self.conn.execute(insert(table), rows)
+            self.counts[name] += len(rows)
+            rows.clear()
+
+    @staticmethod
+    def _row_layout(table: Table, rows: List[dict]):
+        """Colonnes fournies, puis valeurs par défaut Python des colonnes omises.
+
+        Hors `insert()` Core, SQLAlchemy n'applique pas les `default=` des modèles.
+        """
+        columns = list(rows[0])
+        defaults = {
+            column.name: column.default.arg
+            for column in table.columns
+            if column.name not in rows[0] and column.default is not None and column.default.is_scalar
+        }
+        getter = itemgetter(*columns) if len(columns) > 1 else (lambda row: (row[columns[0]],))
+        return columns + list(defaults), getter, tuple(defaults.values())
+
+    def _executemany(self, table: Table, rows: List[dict]):
+        columns, getter, defaults = self._row_layout(table, rows)
+        dialect = self.conn.dialect
+        processors = [
+            (i, process) for i, process in enumerate(
+                table.c[name].type._cached_bind_processor(dialect) for name in columns
+            ) if process is not None
+        ]
+        params = []
+        for row in rows:
+            values = getter(row) + defaults
+            if processors:
+                values = list(values)
+                for i, process in processors:
+                    if values[i] is not None:
+                        values[i] = process(values[i])
+                values = tuple(values)
+            params.append(values)
+        sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.conn.exec_driver_sql(sql, params)
+
+    def _copy(self, table: Table, rows: List[dict]):
+        columns, getter, defaults = self._row_layout(table, rows)
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_COPY_NULL if value is None else value for value in getter(row) + defaults])
+        buf.seek(0)
+        cursor = self.conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')",
+                buf,
+            )
+        finally:
+            cursor.close()
+
+
+def next_ids(conn: Connection, tables: Sequence[Table]) -> Dict[str, int]:
+    """Plus grand identifiant de chaque table (0 si vide) : les ids sont attribués côté client."""
+    return {
+        table.name: conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        for table in tables
+    }
+
+
+def reset_sequences(conn: Connection, tables: Sequence[Table]):
+    """PostgreSQL : réaligner les séquences après insertion d'ids explicites."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+        ))
+
+
+@contextmanager
+def fast_load(engine: Engine, tables: Sequence[Table]) -> Iterator[Connection]:
+    """Connexion transactionnelle optimisée pour le chargement de `tables`.
+
+    Les index non uniques sont supprimés puis recréés à la sortie ; les index
+    uniques et clés primaires restent en place (ils garantissent l'intégrité).
+    """
+    deferred = [index for table in tables for index in table.indexes if not index.unique]
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # Hors transaction : journal_mode ne peut pas changer dans une transaction
+            journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+            synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+            # Une base en WAL ne peut en sortir tant qu'une autre connexion est ouverte
+            # (l'application, un worker) : on la garde, synchronous = OFF suffit
+            wal = journal_mode.lower() == "wal"
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            if not wal:
+                conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+            conn.exec_driver_sql("PRAGMA cache_size = -200000")
+            conn.exec_driver_sql("PRAGMA temp_store = MEMORY")
+            conn.commit()
+        try:
+            with conn.begin():
+                for index in deferred:
+                    index.drop(conn, checkfirst=True)
+                yield conn
+        finally:
+            # Aussi après un échec : sous SQLite le DDL n'est pas annulé avec la transaction
+            with conn.begin():
+                for index in deferred:
+                    index.create(conn, checkfirst=True)
+                reset_sequences(conn, tables)
+            if sqlite:
+                if not wal:
+                    conn.exec_driver_sql(f"PRAGMA journal_mode = {journal_mode}")
+                conn.exec_driver_sql(f"PRAGMA synchronous = {synchronous}")
+                conn.commit()
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+
+
+class StockLedger:
+    """Stock par produit tenu en mémoire pendant un chargement chronologique."""
+
+    def __init__(self, loader: BulkLoader, first_movement_id: int, created_by: int):
+        self.loader = loader
+        self.movement_id = first_movement_id
+        self.created_by = created_by
+        self.kg: Dict[int, float] = {}
+        self.cartons: Dict[int, int] = {}
+
+    def open(self, product_id: int, kg: float = 0.0, cartons: int = 0):
+        self.kg[product_id] = float(kg or 0.0)
+        self.cartons[product_id] = int(cartons or 0)
+
+    def move(self, product_id: int, type_mouvement: str, dkg: float, dcartons: int,
+             reference_id: int, reference_type: str, at, created_by: Optional[int] = None):
+        """Appliquer un mouvement signé et produire sa ligne `stock_movements`."""
+        old_kg, old_cartons = self.kg[product_id], self.cartons[product_id]
+        new_kg = round(old_kg + dkg, 3)
+        new_cartons = old_cartons + dcartons
+        self.kg[product_id], self.cartons[product_id] = new_kg, new_cartons
+        self.movement_id += 1
+        self.loader.add("stock_movements", {
+            "id": self.movement_id,
+            "product_id": product_id,
+            "type_mouvement": type_mouvement,
+            "qte_kg_avant": old_kg,
+            "qte_cartons_avant": old_cartons,
+            "qte_kg_mouvement": dkg,
+            "qte_cartons_mouvement": dcartons,
+            "qte_kg_apres": new_kg,
+            "qte_cartons_apres": new_cartons,
+            "reference_id": reference_id,
+            "reference_type": reference_type,
+            "created_by": self.created_by if created_by is None else created_by,
+            "created_at": at,
+        })
+
+    def write_stock(self, conn: Connection, products: Table, updated_at=None):
+        """Écrire le stock final de tous les produits suivis (un executemany)."""
+        values = {"stock_actuel_kg": bindparam("kg"), "stock_actuel_cartons": bindparam("cartons")}
+        if updated_at is not None:
+            values["updated_at"] = updated_at
+        conn.execute(
+            update(products).where(products.c.id == bindparam("pid")).values(**values),
+            [{"pid": pid, "kg": self.kg[pid], "cartons": self.cartons[pid]} for pid in self.kg],
+        )
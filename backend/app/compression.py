@@ -0,0 +1,142 @@
+"""
+Compression des réponses (gzip, et brotli / zstd si installés).
+
+`CompressionMiddleware` (ASGI) choisit l'encodage d'après `Accept-Encoding`
+(préférence serveur : br, zstd, gzip, en respectant `q=0`) et ne compresse
+que les réponses :
+- d'un seul bloc (les flux, dont les événements SSE, passent tels quels) ;
+- de type texte ou JSON (les PDF et classeurs Excel sont déjà compressés) ;
+- d'au moins `COMPRESSION_MIN_SIZE` octets.
+
+Variables : `COMPRESSION=0` pour désactiver, `COMPRESSION_MIN_SIZE` (1024),
+`GZIP_LEVEL` (4), `BROTLI_QUALITY` (4), `ZSTD_LEVEL` (3).
+"""
+import gzip
+import os
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optionnel : pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optionnel : pip install zstandard
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION", "1").lower() in ("1", "true", "yes", "on")
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "4"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# Au-delà, la compression se fait dans le pool de threads pour ne pas bloquer la boucle
+THREADPOOL_SIZE = 64 * 1024
+
+_COMPRESSIBLE_PREFIXES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+_STREAMING_TYPES = ("text/event-stream",)
+
+
+def _codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    """Encodages disponibles, par ordre de préférence du serveur."""
+    codecs = {}
+    if brotli is not None:
+        codecs["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        codecs["zstd"] = compressor.compress
+    codecs["gzip"] = lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Encodage à utiliser pour cet `Accept-Encoding`, ou None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    wildcard = accepted.get("*", 0.0)
+    for name in CODECS:
+        if accepted.get(name, wildcard) > 0:
+            return name
+    return None
+
+
+def _compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "").lower()
+    if content_type.startswith(_STREAMING_TYPES):
+        return False
+    return content_type.startswith(_COMPRESSIBLE_PREFIXES) and "content-encoding" not in headers
+
+
+class CompressionMiddleware:
+    """Middleware ASGI : compression des réponses d'un seul bloc."""
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Retenu jusqu'au premier bloc : on ne connaît pas encore la taille
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message.setdefault("headers", []))
+            body = message.get("body", b"")
+            if not _compressible(headers):
+                passthrough = True
+            elif message.get("more_body", False):
+                # Réponse en flux : transmise sans compression, bloc par bloc
+                headers.add_vary_header("Accept-Encoding")
+                passthrough = True
+            elif len(body) >= self.minimum_size:
+                if len(body) >= THREADPOOL_SIZE:
+                    body = await run_in_threadpool(CODECS[encoding], body)
+                else:
+                    body = CODECS[encoding](body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = dict(message, body=body)
+            else:
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send(message)
+            passthrough = True
+
+        await self.app(scope, receive, send_wrapper)
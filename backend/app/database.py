@@ -1,20 +1,58 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Float, Text, ForeignKey, Boolean, Index, inspect, and_, or_
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
+import hashlib
+import math
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./stock_management.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+def _engine_options(url: str) -> dict:
+    """Options du moteur selon la base : pool réglable par variables d'environnement."""
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Recycler avant les coupures d'inactivité côté serveur / pare-feu
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes", "on"),
+    }
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_math_functions(dbapi_connection, connection_record):
+        """pow et sqrt (rapports) sur les SQLite compilés sans fonctions mathématiques."""
+        try:
+            dbapi_connection.execute("SELECT pow(2, 1), sqrt(4)").fetchone()
+        except Exception:
+            dbapi_connection.create_function("pow", 2, math.pow, deterministic=True)
+            dbapi_connection.create_function("sqrt", 1, lambda x: math.sqrt(x) if x and x > 0 else 0.0,
+                                             deterministic=True)
+
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1").lower() in ("1", "true", "yes", "on")
+
+def enable_wal(bind=None):
+    """Passer une base SQLite en WAL (réglage conservé dans le fichier).
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Les lectures, dont la sauvegarde à chaud (app/backup.py), ne bloquent plus
+    les écritures et inversement. Sans effet sur les autres bases.
+    """
+    bind = bind or engine
+    if bind.dialect.name == "sqlite":
+        with bind.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+# expire_on_commit=False : après le commit, les objets gardent leur état en
+# mémoire, les réponses sont construites sans relire la base. Chaque requête a
+# sa propre session ; les relectures sous verrou passent par populate_existing.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
@@ -50,10 +88,70 @@ class Product(Base):
     prix_vente = Column(Float, default=0.0)
     stock_actuel_kg = Column(Float, default=0.0)
     stock_actuel_cartons = Column(Integer, default=0)
-    seuil_alerte = Column(Float, default=0.0)
+    seuil_alerte = Column(Float, default=0.0)  # seuil en kg
+    seuil_alerte_cartons = Column(Integer, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # updated_at (onupdate côté SQL) relu par UPDATE ... RETURNING, pas par un SELECT différé
+    __mapper_args__ = {"eager_defaults": True}
+
+# Prédicat « stock bas », partagé par les requêtes et l'index partiel ci-dessous :
+# les requêtes qui filtrent avec exactement ce prédicat lisent l'index au lieu
+# de parcourir toute la table products. Chaque seuil ne vaut que pour une unité
+# gérée par le produit : un produit au kg seul n'a jamais de stock en cartons.
+low_stock_condition = or_(
+    and_(Product.unite_kg.is_not(False), Product.stock_actuel_kg <= Product.seuil_alerte),
+    and_(Product.unite_cartons.is_not(False), Product.stock_actuel_cartons <= Product.seuil_alerte_cartons),
+)
+Index(
+    "ix_products_low_stock",
+    Product.id,
+    sqlite_where=low_stock_condition,
+    postgresql_where=low_stock_condition,
+)
+
+def is_low_stock(stock_kg, stock_cartons, seuil_kg, seuil_cartons, unite_kg=True, unite_cartons=True) -> bool:
+    """Équivalent Python de `low_stock_condition` (unité NULL = gérée)."""
+    return (
+        (unite_kg is not False and float(stock_kg or 0.0) <= float(seuil_kg or 0.0))
+        or (unite_cartons is not False and int(stock_cartons or 0) <= int(seuil_cartons or 0))
+    )
+
+def get_product_for_update(db, product_id):
+    """Charger un produit en verrouillant sa ligne jusqu'au commit (SELECT ... FOR UPDATE).
+
+    À utiliser avant toute modification du stock : deux requêtes concurrentes
+    sur le même produit s'exécutent l'une après l'autre au lieu de s'écraser.
+    Sans effet sous SQLite, qui sérialise déjà les écritures. Les modifications
+    en attente sont d'abord envoyées : la relecture ne les écrase pas.
+    """
+    db.flush()
+    return (
+        db.query(Product)
+        .filter(Product.id == product_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
+
+def get_products_for_update(db, product_ids):
+    """Variante en une requête de `get_product_for_update` : {id: Product} des produits trouvés.
+
+    Les lignes sont verrouillées dans l'ordre des ids : deux écritures qui se
+    recouvrent ne peuvent pas s'interbloquer.
+    """
+    db.flush()
+    products = (
+        db.query(Product)
+        .filter(Product.id.in_(sorted(set(product_ids))))
+        .order_by(Product.id)
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+    return {product.id: product for product in products}
+
 class StockEntry(Base):
     __tablename__ = "stock_entries"
     
@@ -92,11 +190,15 @@ class StockExit(Base):
     created_user = relationship("User")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+# Listes de documents triées par date puis id (pagination par clé, voir app/pagination.py)
+Index("ix_stock_entries_date_id", StockEntry.date_reception, StockEntry.id)
+Index("ix_stock_exits_date_id", StockExit.date_sortie, StockExit.id)
+
 class StockEntryItem(Base):
     __tablename__ = "stock_entry_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    entry_id = Column(Integer, ForeignKey("stock_entries.id"), nullable=False)
+    entry_id = Column(Integer, ForeignKey("stock_entries.id"), nullable=False, index=True)
     entry = relationship("StockEntry", back_populates="items")
 
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
@@ -111,7 +213,7 @@ class StockExitItem(Base):
     __tablename__ = "stock_exit_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    exit_id = Column(Integer, ForeignKey("stock_exits.id"), nullable=False)
+    exit_id = Column(Integer, ForeignKey("stock_exits.id"), nullable=False, index=True)
     exit = relationship("StockExit", back_populates="items")
 
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
@@ -162,3 +264,139 @@ class StockAdjustment(Base):
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_user = relationship("User")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ProductDemand(Base):
+    """Consommation journalière lissée d'un produit, tenue à chaque sortie (voir app/demand.py)."""
+    __tablename__ = "product_demand"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True, autoincrement=False)
+    jour = Column(Date, nullable=False)  # journée en cours de cumul, pas encore lissée
+    jour_kg = Column(Float, nullable=False, default=0.0)
+    jour_cartons = Column(Float, nullable=False, default=0.0)
+    moyenne_kg = Column(Float, nullable=False, default=0.0)
+    variance_kg = Column(Float, nullable=False, default=0.0)
+    moyenne_cartons = Column(Float, nullable=False, default=0.0)
+    variance_cartons = Column(Float, nullable=False, default=0.0)
+    jours = Column(Integer, nullable=False, default=0)  # journées closes prises en compte
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StockTake(Base):
+    """Session d'inventaire physique (voir app/stocktake.py)."""
+    __tablename__ = "stock_takes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    reference = Column(String(100), nullable=False)
+    statut = Column(String(20), nullable=False, default="en_cours")  # en_cours, validee, annulee
+    remarque = Column(Text, nullable=True)
+    started_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    closed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    ajustements = Column(Integer, default=0)  # ajustements créés à la validation
+
+class StockTakeSnapshot(Base):
+    """Stock des produits (non nul) figé à l'ouverture de la session."""
+    __tablename__ = "stock_take_snapshots"
+
+    stock_take_id = Column(Integer, ForeignKey("stock_takes.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    qte_kg = Column(Float, nullable=False, default=0.0)
+    qte_cartons = Column(Integer, nullable=False, default=0)
+
+class StockTakeCount(Base):
+    """Dernier comptage d'un produit à un emplacement (le plus récent l'emporte)."""
+    __tablename__ = "stock_take_counts"
+
+    stock_take_id = Column(Integer, ForeignKey("stock_takes.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    emplacement = Column(String(50), primary_key=True, default="")
+    qte_kg = Column(Float, nullable=False, default=0.0)
+    qte_cartons = Column(Integer, nullable=False, default=0)
+    counted_at = Column(DateTime(timezone=True), nullable=False)
+    device_id = Column(String(100), nullable=True)
+    counted_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+class MovementJournalState(Base):
+    """Dernier numéro du journal de mouvements inséré en base (voir app/journal.py)."""
+    __tablename__ = "movement_journal_state"
+
+    id = Column(Integer, primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
+
+class MovementJournalCommit(Base):
+    """Transaction validée dont les mouvements journalisés restent à insérer (voir app/journal.py)."""
+    __tablename__ = "movement_journal_commits"
+
+    seq = Column(Integer, primary_key=True, autoincrement=False)  # dernier numéro du groupe
+
+class LedgerArchive(Base):
+    """Exercice clos déplacé dans un fichier d'archive (voir app/archive.py)."""
+    __tablename__ = "ledger_archives"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    filename = Column(String(255), nullable=False)
+    entries = Column(Integer, default=0)
+    exits = Column(Integer, default=0)
+    movements = Column(Integer, default=0)
+    archived_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class SchemaVersion(Base):
+    """Empreinte des modèles lors de la dernière synchronisation du schéma (voir ensure_schema)."""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+def schema_fingerprint(metadata=None) -> str:
+    """Empreinte des tables, colonnes et index déclarés par les modèles."""
+    parts = []
+    for table in (metadata or Base.metadata).sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name}:{column.type!r}:{column.nullable}" for column in table.columns)
+        parts.extend(sorted(f"{index.name}:{','.join(c.name for c in index.columns)}" for index in table.indexes))
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def ensure_schema(bind=None) -> bool:
+    """Synchroniser le schéma seulement si les modèles ont changé depuis la dernière synchronisation.
+
+    Au démarrage, une seule lecture suffit quand l'empreinte enregistrée est à
+    jour ; sinon (base neuve, mise à jour de l'application) `sync_schema`.
+    Renvoie True si le schéma a été synchronisé.
+    """
+    bind = bind or engine
+    try:
+        with bind.connect() as conn:
+            stored = conn.execute(select(SchemaVersion.fingerprint).where(SchemaVersion.id == 1)).scalar()
+    except DBAPIError:
+        stored = None  # base neuve : pas encore de table schema_version
+    if stored == schema_fingerprint():
+        return False
+    sync_schema(bind)
+    return True
+
+def sync_schema(bind=None):
+    """Créer les tables manquantes, puis les colonnes et index ajoutés aux modèles depuis.
+
+    `create_all` ne modifie pas une table existante : les bases déjà déployées
+    reçoivent ici les nouvelles colonnes (ALTER TABLE ... ADD COLUMN) et index.
+    L'empreinte des modèles est enregistrée pour `ensure_schema`.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        conn.execute(delete(SchemaVersion.__table__))
+        conn.execute(insert(SchemaVersion.__table__).values(id=1, fingerprint=schema_fingerprint()))
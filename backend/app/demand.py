@@ -0,0 +1,264 @@
+"""
+Consommation journalière par produit et suggestions de réapprovisionnement.
+
+Chaque sortie comptabilisée (`post_stock_exit`) met à jour, en temps
+constant par produit, une moyenne et une variance mobiles exponentielles
+(EWMA, facteur `DEMAND_ALPHA`) de la quantité sortie par jour, en kg et en
+cartons. Les sorties d'une même journée sont cumulées (`jour_kg`,
+`jour_cartons`) ; la journée est lissée à la première sortie d'un jour
+suivant, les journées sans sortie entre les deux comptant pour zéro (formule
+fermée, sans boucle). Une sortie antidatée est comptée dans la journée en
+cours de cumul.
+
+Seuls les types de `DEMAND_EXIT_TYPES` comptent (ventes, dépôts, dons par
+défaut) : les pertes ne font pas monter la consommation. Les corrections
+(modification, suppression de sorties) et les chargements en masse ne
+passent pas par ce chemin : `rebuild_demand` recalcule tout depuis
+l'historique.
+
+`reorder_suggestions` lit ces statistiques (aucun parcours de l'historique) :
+couverture en jours, point de commande et quantité à commander, avec un
+stock de sécurité `z · σ · √jours`. La moyenne lissée décroît à chaque
+journée sans sortie sans jamais atteindre zéro : sous `DEMAND_MIN_RATE` par
+jour, la consommation est tenue pour nulle (ni couverture, ni commande).
+"""
+import math
+import os
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import Product, ProductDemand, StockExit, StockExitItem
+
+ALPHA = float(os.getenv("DEMAND_ALPHA", "0.1"))
+MIN_RATE = float(os.getenv("DEMAND_MIN_RATE", "0.001"))
+DEMAND_EXIT_TYPES = tuple(
+    name.strip() for name in os.getenv("DEMAND_EXIT_TYPES", "vente,depot_vente,don").split(",") if name.strip()
+)
+
+
+def _smooth(mean: float, variance: float, total: float, first: bool) -> Tuple[float, float]:
+    """Ajouter une journée close de consommation `total` à (moyenne, variance)."""
+    if first:
+        return total, 0.0
+    diff = total - mean
+    increment = ALPHA * diff
+    return mean + increment, (1.0 - ALPHA) * (variance + diff * increment)
+
+
+def _idle(mean: float, variance: float, days: int) -> Tuple[float, float]:
+    """(moyenne, variance) après `days` journées consécutives sans sortie."""
+    if days <= 0:
+        return mean, variance
+    decay = (1.0 - ALPHA) ** days
+    return mean * decay, decay * variance + mean * mean * decay * (1.0 - decay)
+
+
+def _close_day(state: ProductDemand, until: date):
+    """Lisser la journée en cours de `state` et les journées vides jusqu'à `until` (exclu)."""
+    first = not state.jours
+    state.moyenne_kg, state.variance_kg = _idle(
+        *_smooth(state.moyenne_kg or 0.0, state.variance_kg or 0.0, state.jour_kg or 0.0, first),
+        (until - state.jour).days - 1,
+    )
+    state.moyenne_cartons, state.variance_cartons = _idle(
+        *_smooth(state.moyenne_cartons or 0.0, state.variance_cartons or 0.0, state.jour_cartons or 0.0, first),
+        (until - state.jour).days - 1,
+    )
+    state.jours = (state.jours or 0) + 1
+    state.jour, state.jour_kg, state.jour_cartons = until, 0.0, 0.0
+
+
+def record_demand(db: Session, exit_date: datetime, type_sortie: str, demand: Dict[int, Tuple[float, int]]):
+    """Compter une sortie (quantités cumulées par produit) dans la consommation (sans commit).
+
+    Une lecture groupée des états des produits, puis des mises à jour en
+    mémoire : appelée sous le verrou des produits de `post_stock_exit`.
+    """
+    if type_sortie not in DEMAND_EXIT_TYPES or not demand:
+        return
+    day = exit_date.date()
+    states = {
+        state.product_id: state
+        for state in db.scalars(select(ProductDemand).where(ProductDemand.product_id.in_(demand)))
+    }
+    for product_id, (kg, cartons) in demand.items():
+        state = states.get(product_id)
+        if state is None:
+            db.add(ProductDemand(
+                product_id=product_id, jour=day, jour_kg=kg, jour_cartons=cartons,
+                moyenne_kg=0.0, variance_kg=0.0, moyenne_cartons=0.0, variance_cartons=0.0, jours=0,
+            ))
+            continue
+        if day > state.jour:
+            _close_day(state, day)
+        state.jour_kg = (state.jour_kg or 0.0) + kg
+        state.jour_cartons = (state.jour_cartons or 0.0) + cartons
+
+
+def rebuild_demand(db) -> int:
+    """Recalculer la consommation de tous les produits depuis l'historique des sorties (sans commit).
+
+    `db` : session ou connexion. Renvoie le nombre de produits suivis.
+    """
+    day = func.date(StockExit.date_sortie)
+    rows = db.execute(
+        select(StockExitItem.product_id, day, func.sum(StockExitItem.qte_kg), func.sum(StockExitItem.qte_cartons))
+        .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .where(StockExit.type_sortie.in_(DEMAND_EXIT_TYPES))
+        .group_by(StockExitItem.product_id, day)
+        .order_by(StockExitItem.product_id, day)
+    ).all()
+
+    states: Dict[int, ProductDemand] = {}
+    for product_id, exit_day, kg, cartons in rows:
+        if isinstance(exit_day, str):
+            exit_day = date.fromisoformat(exit_day)
+        state = states.get(product_id)
+        if state is None:
+            states[product_id] = ProductDemand(
+                product_id=product_id, jour=exit_day, jour_kg=kg or 0.0, jour_cartons=cartons or 0,
+                moyenne_kg=0.0, variance_kg=0.0, moyenne_cartons=0.0, variance_cartons=0.0, jours=0,
+            )
+            continue
+        _close_day(state, exit_day)
+        state.jour_kg, state.jour_cartons = kg or 0.0, cartons or 0
+
+    db.execute(delete(ProductDemand))
+    columns = [column.name for column in ProductDemand.__table__.columns if column.name != "updated_at"]
+    if states:
+        db.execute(insert(ProductDemand), [{name: getattr(state, name) for name in columns} for state in states.values()])
+    return len(states)
+
+
+def _days_since(day_column, today: date, dialect: str):
+    """Jours écoulés entre `day_column` (Date) et `today`, selon le dialecte."""
+    if dialect == "postgresql":
+        return literal(today) - day_column
+    return func.julianday(literal(today.isoformat())) - func.julianday(day_column)
+
+
+def _rate_today(mean, variance, day_total, first, past, elapsed):
+    """(moyenne, variance) par jour au jour de lecture, en SQL : `_smooth` puis `_idle`.
+
+    La journée du jour, incomplète, n'est pas comptée ; une journée passée
+    encore en cumul est lissée à la lecture, sans écriture.
+    """
+    diff = day_total - mean
+    closed_mean = case((first, day_total), else_=mean + ALPHA * diff)
+    closed_variance = case((first, 0.0), else_=(1.0 - ALPHA) * (variance + ALPHA * diff * diff))
+    decay = func.pow(1.0 - ALPHA, elapsed - 1)
+    return (
+        case((past, closed_mean * decay), else_=mean),
+        case((past, decay * closed_variance + closed_mean * closed_mean * decay * (1.0 - decay)), else_=variance),
+    )
+
+
+def _negligible(mean, variance):
+    """(moyenne, variance) ramenées à zéro sous `MIN_RATE` : produit sans consommation réelle."""
+    idle = mean < MIN_RATE
+    return case((idle, 0.0), else_=mean), case((idle, 0.0), else_=variance)
+
+
+def _sqrt(value):
+    # Une variance peut sortir très légèrement négative (arrondis) : sqrt échouerait sous PostgreSQL
+    return func.sqrt(case((value > 0, value), else_=0.0))
+
+
+def _plan(stock, mean, sigma, lead_time: float, horizon: float, z: float):
+    """(couverture en jours, point de commande, quantité à commander) en SQL, pour une unité."""
+    point = mean * lead_time + z * math.sqrt(lead_time) * sigma
+    target = mean * horizon + z * math.sqrt(horizon) * sigma
+    cover = case((mean > 0, stock / mean), else_=None)
+    quantity = case((and_(stock <= point, target > stock), target - stock), else_=0.0)
+    return cover, point, quantity
+
+
+def reorder_suggestions(
+    db: Session,
+    today: date,
+    lead_time_days: float = 7.0,
+    review_days: float = 7.0,
+    z: float = 1.65,
+    only_needed: bool = True,
+) -> List[Dict]:
+    """Couverture et réapprovisionnement des produits suivis, les moins couverts d'abord.
+
+    Point de commande : consommation pendant le délai `lead_time_days` plus
+    stock de sécurité ; quantité suggérée : de quoi tenir
+    `lead_time_days + review_days`, seulement sous le point de commande.
+    Tout est calculé par la base, en une requête sur les statistiques
+    stockées : seuls les produits retenus remontent.
+    """
+    past = ProductDemand.jour < today
+    first = ProductDemand.jours == 0
+    elapsed = _days_since(ProductDemand.jour, today, db.get_bind().dialect.name)
+    mean_kg, variance_kg = _negligible(*_rate_today(
+        ProductDemand.moyenne_kg, ProductDemand.variance_kg, ProductDemand.jour_kg, first, past, elapsed,
+    ))
+    mean_cartons, variance_cartons = _negligible(*_rate_today(
+        ProductDemand.moyenne_cartons, ProductDemand.variance_cartons, ProductDemand.jour_cartons, first, past, elapsed,
+    ))
+    rates = (
+        select(
+            Product.id.label("product_id"), Product.code_produit, Product.nom_produit,
+            func.coalesce(Product.stock_actuel_kg, 0.0).label("stock_kg"),
+            func.coalesce(Product.stock_actuel_cartons, 0).label("stock_cartons"),
+            func.coalesce(Product.seuil_alerte, 0.0).label("seuil_alerte"),
+            func.coalesce(Product.seuil_alerte_cartons, 0).label("seuil_alerte_cartons"),
+            mean_kg.label("conso_jour_kg"),
+            _sqrt(variance_kg).label("ecart_type_kg"),
+            mean_cartons.label("conso_jour_cartons"),
+            _sqrt(variance_cartons).label("ecart_type_cartons"),
+        )
+        .join(ProductDemand, ProductDemand.product_id == Product.id)
+        .where(or_(past, ProductDemand.jours > 0))  # au moins une journée close
+        .subquery("rates")
+    )
+
+    horizon = lead_time_days + review_days
+    cover_kg, point_kg, quantity_kg = _plan(
+        rates.c.stock_kg, rates.c.conso_jour_kg, rates.c.ecart_type_kg, lead_time_days, horizon, z,
+    )
+    cover_cartons, point_cartons, quantity_cartons = _plan(
+        rates.c.stock_cartons, rates.c.conso_jour_cartons, rates.c.ecart_type_cartons, lead_time_days, horizon, z,
+    )
+    plans = select(
+        rates,
+        cover_kg.label("cover_kg"), cover_cartons.label("cover_cartons"),
+        point_kg.label("point_commande_kg"), point_cartons.label("point_commande_cartons"),
+        quantity_kg.label("quantite_suggeree_kg"), quantity_cartons.label("quantite_suggeree_cartons"),
+    ).subquery("plans")
+    statement = select(plans)
+    if only_needed:
+        statement = statement.where(or_(plans.c.quantite_suggeree_kg > 0, plans.c.quantite_suggeree_cartons > 0))
+
+    suggestions = []
+    for row in db.connection().execute(statement):
+        covers = [cover for cover in (row.cover_kg, row.cover_cartons) if cover is not None]
+        suggestion = {
+            "product_id": row.product_id,
+            "code_produit": row.code_produit,
+            "nom_produit": row.nom_produit,
+            "stock_kg": float(row.stock_kg),
+            "stock_cartons": int(row.stock_cartons),
+            "conso_jour_kg": round(row.conso_jour_kg, 3),
+            "ecart_type_kg": round(row.ecart_type_kg, 3),
+            "conso_jour_cartons": round(row.conso_jour_cartons, 3),
+            "ecart_type_cartons": round(row.ecart_type_cartons, 3),
+            "couverture_jours": round(min(covers), 1) if covers else None,
+            "seuil_alerte": float(row.seuil_alerte),
+            "seuil_alerte_cartons": int(row.seuil_alerte_cartons),
+            "point_commande_kg": round(row.point_commande_kg, 3),
+            # Arrondi avant ceil : un résidu flottant (1e-12) ne doit pas devenir un carton
+            "point_commande_cartons": math.ceil(round(row.point_commande_cartons, 6)),
+            "quantite_suggeree_kg": round(row.quantite_suggeree_kg, 3),
+            "quantite_suggeree_cartons": math.ceil(round(row.quantite_suggeree_cartons, 6)),
+        }
+        if only_needed and not (suggestion["quantite_suggeree_kg"] or suggestion["quantite_suggeree_cartons"]):
+            continue  # quantité qui s'arrondit à zéro
+        suggestions.append(suggestion)
+    suggestions.sort(key=lambda s: (s["couverture_jours"] is None, s["couverture_jours"] or 0.0))
+    return suggestions
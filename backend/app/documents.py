@@ -0,0 +1,69 @@
+"""
+Listes au niveau document : une ligne par réception ou bon de sortie.
+
+L'entête et les totaux de ses lignes (nombre de lignes, de produits, kg et
+cartons) viennent d'une seule requête : la page d'entêtes est d'abord
+choisie sur l'index (date, id), puis seules ses lignes sont agrégées.
+"""
+from typing import List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+
+from app.pagination import after_cursor, next_cursor
+
+
+def list_documents(
+    db: Session,
+    header,
+    item,
+    foreign_key,
+    date_column,
+    criteria: List,
+    cursor: Optional[str],
+    limit: int,
+) -> ORJSONResponse:
+    """Page `{"items": [...], "next_cursor": ...}` des documents, du plus récent au plus ancien."""
+    keyset = after_cursor(date_column, header.id, cursor)
+    if keyset is not None:
+        criteria = criteria + [keyset]
+    page = (
+        select(*header.__table__.columns)
+        .where(*criteria)
+        .order_by(date_column.desc(), header.id.desc())
+        .limit(limit + 1)
+        .subquery("page")
+    )
+    rows = db.execute(
+        select(
+            *page.c,
+            func.count(item.id).label("nb_lignes"),
+            func.count(func.distinct(item.product_id)).label("nb_produits"),
+            func.coalesce(func.sum(item.qte_kg), 0.0).label("total_kg"),
+            func.coalesce(func.sum(item.qte_cartons), 0).label("total_cartons"),
+        )
+        .outerjoin(item, foreign_key == page.c.id)
+        .group_by(*page.c)
+        .order_by(page.c[date_column.key].desc(), page.c.id.desc())
+    ).all()
+    keys = rows[0]._fields if rows else ()
+    return ORJSONResponse({
+        "items": [dict(zip(keys, row)) for row in rows[:limit]],
+        "next_cursor": next_cursor(rows, limit, date_column.key),
+    })
+
+
+def document_lines(db: Session, header, item, foreign_key, document_id: int):
+    """Lignes d'un document avec leur produit (une requête) ; 404 si le document n'existe pas."""
+    lines = (
+        db.query(item)
+        .options(joinedload(item.product))
+        .filter(foreign_key == document_id)
+        .order_by(item.id)
+        .all()
+    )
+    if not lines and db.get(header, document_id) is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return lines
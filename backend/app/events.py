@@ -0,0 +1,187 @@
+"""
+Bus d'événements en mémoire et diffusion Server-Sent Events.
+
+Les routes synchrones s'exécutent dans le threadpool : `publish` est donc
+thread-safe et remet chaque événement à la boucle asyncio de l'abonné. Chaque
+abonné dispose d'une file bornée ; un client trop lent pour suivre est
+déconnecté plutôt que de faire grossir la mémoire du serveur. Il se reconnecte
+avec `Last-Event-ID` et reçoit les événements manqués depuis le tampon de
+rejeu ; si ceux-ci n'y sont plus (ou si le serveur a redémarré), il reçoit un
+événement `reset` et doit recharger l'état complet.
+
+Le bus est propre au processus : avec plusieurs workers (serve.py), un
+abonné ne verrait que les écritures de son worker et chaque reconnexion vers
+un autre worker finirait en `reset`. serve.py désactive alors les flux
+(`SSE_EVENTS=0`) : les routes SSE répondent 503 et rien n'est publié.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from fastapi import HTTPException, Request
+
+KEEPALIVE_SECONDS = 15.0
+QUEUE_SIZE = 256
+REPLAY_SIZE = 4096
+RESET_TOPIC = "reset"
+EVENTS_ENABLED = os.getenv("SSE_EVENTS", "1").lower() in ("1", "true", "yes", "on")
+
+
+class Event:
+    __slots__ = ("id", "topic", "data", "product_id", "epoch")
+
+    def __init__(self, id: int, topic: str, data: Dict[str, Any], product_id: Optional[int] = None, epoch: str = ""):
+        self.id = id
+        self.topic = topic
+        self.data = data
+        self.product_id = product_id
+        self.epoch = epoch
+
+    def to_sse(self) -> str:
+        payload = json.dumps(self.data, default=str, separators=(",", ":"))
+        return f"id: {self.epoch}-{self.id}\nevent: {self.topic}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    def __init__(
+        self,
+        bus: "EventBus",
+        topics: Optional[Iterable[str]],
+        queue_size: int,
+        product_ids: Optional[Iterable[int]] = None,
+    ):
+        self.bus = bus
+        self.topics = frozenset(topics) if topics else None
+        self.product_ids = frozenset(product_ids) if product_ids else None
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def accepts(self, event: Event) -> bool:
+        if self.topics is not None and event.topic not in self.topics:
+            return False
+        return self.product_ids is None or event.product_id in self.product_ids
+
+    def _offer(self, event: Event):
+        # Exécuté dans la boucle de l'abonné
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)  # signal de fin de flux
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = QUEUE_SIZE, replay_size: int = REPLAY_SIZE, enabled: bool = True):
+        self.queue_size = queue_size
+        self.enabled = enabled
+        # Identifie cette instance : un Last-Event-ID d'un autre démarrage impose un reset
+        self.epoch = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._subscribers = set()
+        self._replay: "deque[Event]" = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        topics: Optional[Iterable[str]] = None,
+        product_ids: Optional[Iterable[int]] = None,
+        last_event_id: Optional[str] = None,
+    ) -> Subscription:
+        """
+        Créer un abonnement (à appeler depuis la boucle asyncio qui le consommera).
+
+        Avec `last_event_id`, les événements publiés depuis sont d'abord rejoués.
+        """
+        sub = Subscription(self, topics, self.queue_size, product_ids)
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_event_id:
+                backlog = self._backlog_since(last_event_id)
+                if backlog is not None:
+                    backlog = [event for event in backlog if sub.accepts(event)]
+                if backlog is None or len(backlog) >= self.queue_size:
+                    sub.queue.put_nowait(Event(self._last_id, RESET_TOPIC, {}, epoch=self.epoch))
+                else:
+                    for event in backlog:
+                        sub.queue.put_nowait(event)
+        return sub
+
+    def _backlog_since(self, last_event_id: str):
+        """Événements postérieurs à `last_event_id`, ou None s'ils ne sont plus disponibles."""
+        epoch, _, seq = last_event_id.rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._last_id:
+            return None
+        oldest = self._replay[0].id if self._replay else self._last_id + 1
+        if seq < oldest - 1:
+            return None
+        return [event for event in self._replay if event.id > seq]
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, topic: str, data: Dict[str, Any], product_id: Optional[int] = None) -> Optional[Event]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            event = Event(next(self._ids), topic, data, product_id, self.epoch)
+            self._last_id = event.id
+            self._replay.append(event)
+            subscribers = [s for s in self._subscribers if s.accepts(event)]
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, event)
+            except RuntimeError:
+                # Boucle fermée : l'abonné a disparu sans se désinscrire
+                self.unsubscribe(sub)
+        return event
+
+
+bus = EventBus(enabled=EVENTS_ENABLED)
+
+
+def events_available():
+    """Dépendance des routes SSE : 503 quand les flux sont désactivés (plusieurs workers)."""
+    if not bus.enabled:
+        raise HTTPException(
+            status_code=503,
+            detail="Live events are disabled when the server runs several workers (serve.py --workers 1)",
+        )
+
+
+async def sse_stream(request: Request, sub: Subscription) -> AsyncIterator[str]:
+    """Générateur SSE : événements de l'abonnement + commentaires keepalive."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                event = await sub.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is None:
+                break
+            yield event.to_sse()
+    finally:
+        sub.bus.unsubscribe(sub)
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,104 @@
+"""
+GET conditionnels (ETag faibles) pour les endpoints de lecture.
+
+L'ETag d'une liste est dérivé des compteurs de version par table du grand
+livre (app/ledger.py), sans lire la base : `W/"<époque>-<version>"`.
+L'époque change à chaque démarrage du serveur, les compteurs repartant de
+zéro ; elle est commune à tous les workers (serve.py).
+
+Une route l'active avec la dépendance `conditional_get(*tables)`, déclarée
+après l'authentification (les dépendances sont résolues dans l'ordre des
+paramètres : un client non authentifié n'obtient jamais de 304) :
+- `If-None-Match` correspond : la route n'est pas exécutée, réponse 304 ;
+- sinon l'ETag est ajouté à la réponse 200 par `ETagMiddleware`.
+
+Une réponse qui dépend aussi de la date du jour (période par défaut qui
+finit aujourd'hui, consommation qui décroît avec les jours écoulés) utilise
+`conditional_get(..., daily=True)` : la date entre dans l'ETag, un client
+qui revalide le lendemain reçoit un 200 même sans écriture.
+
+La version est lue avant la requête SQL : une écriture concurrente rend
+l'ETag périmé (un 200 de plus), jamais un 304 à tort.
+"""
+from datetime import date
+from typing import Callable, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import MutableHeaders
+
+from app.ledger import current_version, epoch
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def etag_for(tables: Optional[Iterable[str]] = None, day: Optional[date] = None) -> str:
+    """ETag faible de l'état actuel des tables (toutes si None), du jour `day` si donné."""
+    if day is None:
+        return f'W/"{epoch()}-{current_version(tables)}"'
+    return f'W/"{epoch()}-{current_version(tables)}-{day.isoformat()}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    opaque = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # Comparaison faible (RFC 9110 §13.1.2) : le préfixe W/ est ignoré
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def conditional_get(*tables: str, daily: bool = False) -> Callable:
+    """Dépendance : 304 si le client a déjà la version courante de `tables` (toutes si vide).
+
+    `daily` : la réponse dépend aussi de la date du jour, qui entre dans l'ETag.
+    """
+    names = frozenset(tables) or None
+
+    def check(request: Request):
+        etag = etag_for(names, date.today() if daily else None)
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise NotModified(etag)
+        request.state.etag = etag
+
+    return check
+
+
+async def _not_modified(request: Request, exc: NotModified) -> Response:
+    return Response(status_code=304, headers={"ETag": exc.etag, "Cache-Control": "no-cache"})
+
+
+class ETagMiddleware:
+    """Middleware ASGI : ajoute l'ETag calculé par `conditional_get` aux réponses 200."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                etag = scope.get("state", {}).get("etag")
+                if etag:
+                    headers = MutableHeaders(raw=message.setdefault("headers", []))
+                    if "etag" not in headers:
+                        headers["ETag"] = etag
+                        # Le client peut garder la réponse mais doit la revalider à chaque fois
+                        headers["Cache-Control"] = "no-cache"
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def install(app):
+    app.add_exception_handler(NotModified, _not_modified)
+    app.add_middleware(ETagMiddleware)
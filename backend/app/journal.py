@@ -0,0 +1,319 @@
+"""
+Journal d'écriture différée des mouvements de stock.
+
+Activé par `MOVEMENT_JOURNAL=1`. La mise à jour du stock reste transactionnelle
+dans la requête ; seul l'enregistrement du `StockMovement` (historique) est
+différé :
+
+1. `record_movement` rattache le mouvement à la transaction de la requête ;
+   *avant* le commit, les mouvements de la transaction sont ajoutés au
+   fichier journal (une ligne JSON chacun, un seul fsync), et la transaction
+   insère un marqueur `movement_journal_commits` (dernier numéro du groupe) ;
+   une erreur d'écriture du journal fait échouer le commit ;
+2. après le commit, le groupe passe dans une file en mémoire ; un thread de
+   fond la vide par lots, en INSERT multi-lignes, en supprimant dans la même
+   transaction les marqueurs des groupes insérés ;
+3. au démarrage, les groupes du fichier dont le marqueur existe sont
+   rejoués. Un groupe sans marqueur vient d'une transaction annulée ou déjà
+   insérée : il est ignoré. Un arrêt brutal, à n'importe quel moment, ne perd
+   ni ne duplique aucun mouvement.
+
+Les lectures de l'historique peuvent donc avoir jusqu'à
+`MOVEMENT_JOURNAL_FLUSH_MS` de retard sur le stock.
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, event, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, StockMovement, MovementJournalCommit, MovementJournalState
+from app.stock_events import movement_delta, publish_movements
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_ENABLED = os.getenv("MOVEMENT_JOURNAL", "0").lower() in ("1", "true", "yes", "on")
+JOURNAL_PATH = os.getenv("MOVEMENT_JOURNAL_PATH", "./movement_journal.wal")
+FLUSH_INTERVAL = int(os.getenv("MOVEMENT_JOURNAL_FLUSH_MS", "200")) / 1000.0
+BATCH_SIZE = int(os.getenv("MOVEMENT_JOURNAL_BATCH", "500"))
+# Au-delà, le fichier est réécrit avec les seules lignes encore en attente
+COMPACT_BYTES = int(os.getenv("MOVEMENT_JOURNAL_COMPACT_BYTES", str(8 * 1024 * 1024)))
+
+_MOVEMENT_FIELDS = (
+    "product_id", "type_mouvement",
+    "qte_kg_avant", "qte_cartons_avant",
+    "qte_kg_mouvement", "qte_cartons_mouvement",
+    "qte_kg_apres", "qte_cartons_apres",
+    "reference_id", "reference_type", "created_by", "created_at",
+)
+
+
+class _Row:
+    """Vue attributaire d'un mouvement inséré, pour `movement_delta`."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MovementJournal:
+    def __init__(self, path: str, session_factory=SessionLocal, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: "deque[Dict]" = deque()
+        # Groupes journalisés dont la transaction n'est pas encore validée
+        self._inflight: Dict[int, List[Dict]] = {}
+        self._seq = 0
+        self._file = None
+        self._lock = threading.Lock()          # fichier + file en mémoire
+        self._flush_lock = threading.Lock()    # un seul vidage à la fois
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._file is not None
+
+    # -- écriture ---------------------------------------------------------
+
+    def append_many(self, movements: List[Dict]) -> int:
+        """Journaliser durablement (un seul fsync) les mouvements d'une transaction.
+
+        Renvoie le numéro du groupe (son dernier numéro), à marquer dans la
+        transaction ; le groupe attend ensuite `commit` ou `abandon`.
+        """
+        now = datetime.utcnow().isoformat()
+        records = []
+        for fields in movements:
+            record = {name: fields.get(name) for name in _MOVEMENT_FIELDS}
+            if record["created_at"] is None:
+                record["created_at"] = now
+            records.append(record)
+        with self._lock:
+            if self._file is None:
+                raise RuntimeError("Movement journal is not started")
+            group = self._seq + len(records)
+            for record in records:
+                self._seq += 1
+                record["seq"] = self._seq
+                record["commit"] = group
+                self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._inflight[group] = records
+            return group
+
+    def commit(self, group: int):
+        """La transaction du groupe est validée : ses mouvements peuvent être insérés."""
+        with self._lock:
+            records = self._inflight.pop(group, None)
+            if records:
+                self._pending.extend(records)
+                if len(self._pending) >= self.batch_size:
+                    self._wakeup.notify()
+
+    def abandon(self, group: int):
+        """La transaction du groupe est annulée : ses lignes, sans marqueur, ne seront jamais rejouées."""
+        with self._lock:
+            self._inflight.pop(group, None)
+
+    # -- vidage -----------------------------------------------------------
+
+    def flush(self) -> int:
+        """Insérer un lot de mouvements en attente ; renvoie le nombre inséré."""
+        with self._flush_lock:
+            with self._lock:
+                # Groupes entiers : le marqueur d'un groupe est supprimé avec l'insertion de toutes ses lignes
+                batch = []
+                for record in self._pending:
+                    if len(batch) >= self.batch_size and batch[-1]["seq"] == batch[-1]["commit"]:
+                        break
+                    batch.append(record)
+            if not batch:
+                return 0
+            inserted = self._insert(batch)
+            with self._lock:
+                for _ in range(len(batch)):
+                    self._pending.popleft()
+                self._compact_locked()
+            publish_movements(inserted)
+            return len(batch)
+
+    def flush_all(self):
+        while self.flush():
+            pass
+
+    def _insert(self, batch: List[Dict]) -> List[dict]:
+        rows = [self._to_row(record) for record in batch]
+        db: Session = self.session_factory()
+        try:
+            state = db.get(MovementJournalState, 1)
+            last_seq = state.last_seq if state else 0
+            # Les marqueurs supprimés ici désignent les groupes à insérer : un groupe déjà inséré n'en a plus
+            groups = set(db.scalars(
+                delete(MovementJournalCommit)
+                .where(MovementJournalCommit.seq.in_({record["commit"] for record in batch}))
+                .returning(MovementJournalCommit.seq)
+            ))
+            todo = [(record, row) for record, row in zip(batch, rows) if record["commit"] in groups]
+            inserted = []
+            if todo:
+                # insertmanyvalues : INSERT multi-lignes, ids renvoyés dans l'ordre
+                ids = db.scalars(
+                    insert(StockMovement).returning(StockMovement.id, sort_by_parameter_order=True),
+                    [row for _, row in todo],
+                ).all()
+                inserted = [movement_delta(_Row(id=id_, **row)) for id_, (_, row) in zip(ids, todo)]
+            if state is None:
+                db.add(MovementJournalState(id=1, last_seq=batch[-1]["seq"]))
+            else:
+                state.last_seq = max(last_seq, max(record["seq"] for record in batch))
+            db.commit()
+            return inserted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _to_row(record: Dict) -> Dict:
+        row = {name: record.get(name) for name in _MOVEMENT_FIELDS}
+        row["created_at"] = datetime.fromisoformat(record["created_at"])
+        return row
+
+    def _compact_locked(self):
+        if not self._pending and not self._inflight:
+            self._file.seek(0)
+            self._file.truncate()
+        elif self._file.tell() > COMPACT_BYTES:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as tmp:
+                for record in [*self._pending, *(r for group in self._inflight.values() for r in group)]:
+                    tmp.write(json.dumps(record, separators=(",", ":")) + "\n")
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        else:
+            return
+        os.fsync(self._file.fileno())
+
+    # -- cycle de vie -----------------------------------------------------
+
+    def _read_file(self) -> List[Dict]:
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal : jamais acquittée
+                    logger.warning("Ignoring truncated movement journal line")
+                    break
+        return records
+
+    def start(self):
+        """Rejouer le fichier journal puis lancer le thread de vidage."""
+        records = self._read_file()
+        db = self.session_factory()
+        try:
+            state = db.get(MovementJournalState, 1)
+            last_seq = state.last_seq if state else 0
+            groups = {r["commit"] for r in records if "commit" in r}
+            committed = set(db.scalars(
+                select(MovementJournalCommit.seq).where(MovementJournalCommit.seq.in_(groups))
+            )) if groups else set()
+        finally:
+            db.close()
+        with self._lock:
+            self._seq = max([last_seq] + [r["seq"] for r in records])
+            self._pending.extend(r for r in records if r.get("commit") in committed)
+            self._file = open(self.path, "a", encoding="utf-8")
+        if self._pending:
+            logger.info("Replaying %d journaled stock movements", len(self._pending))
+        self.flush_all()
+        with self._lock:
+            self._compact_locked()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="movement-journal", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                stopping = self._stopping
+            try:
+                self.flush_all()
+            except Exception:
+                # Les lignes restent dans le fichier et la file : nouvel essai au prochain tour
+                logger.exception("Movement journal flush failed")
+            if stopping:
+                return
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+movement_journal = MovementJournal(JOURNAL_PATH)
+
+
+def record_movement(db: Session, **fields):
+    """
+    Enregistrer un mouvement de stock dans la transaction de la requête
+    (l'appelant fait le commit).
+
+    Sans journal : ajouté à la session, inséré au commit.
+    Avec journal : ajouté durablement au fichier avant le commit, inséré par lots après.
+    """
+    if JOURNAL_ENABLED and movement_journal.running:
+        db.info.setdefault("journal_movements", []).append(fields)
+        return
+    db.add(StockMovement(**fields))
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _journal_movements(session):
+    movements = session.info.pop("journal_movements", None)
+    if movements:
+        # Fichier d'abord (fsync), puis le marqueur dans la transaction : validé ensemble ou pas du tout
+        group = movement_journal.append_many(movements)
+        session.info["journal_group"] = group
+        session.execute(insert(MovementJournalCommit).values(seq=group))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _release_committed_movements(session):
+    group = session.info.pop("journal_group", None)
+    if group is not None:
+        movement_journal.commit(group)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_movements(session, previous_transaction):
+    session.info.pop("journal_movements", None)
+    group = session.info.pop("journal_group", None)
+    if group is not None:
+        movement_journal.abandon(group)
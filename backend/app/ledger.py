@@ -0,0 +1,211 @@
+"""
+Version du grand livre de stock.
+
+Un compteur global est incrémenté après chaque commit qui a écrit dans une
+table de stock (produits, entrées, sorties, mouvements, ajustements). Les
+caches de lecture (tableau de bord, rapports) sont indexés par cette version :
+tant qu'aucune écriture n'a eu lieu, ils servent la valeur en mémoire, et la
+première écriture suivante les invalide sans délai.
+
+Avec plusieurs workers (serve.py), les compteurs sont dans un petit fichier
+projeté en mémoire (`LEDGER_SHARED_FILE`) : une écriture commitée par un
+worker invalide aussitôt les caches et ETags de tous les autres, au prix
+d'une lecture mémoire par consultation. Sans cette variable, ils restent
+propres au processus.
+"""
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+
+from app.database import SessionLocal
+
+LEDGER_TABLES = frozenset({
+    "products",
+    "stock_entries",
+    "stock_entry_items",
+    "stock_exits",
+    "stock_exit_items",
+    "stock_movements",
+    "stock_adjustments",
+    "product_demand",
+})
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedCounters:
+    """
+    Compteurs 64 bits dans un fichier projeté en mémoire, partagés entre processus.
+
+    Emplacement 0 : époque (aléatoire, tirée à la création du fichier) ;
+    1 : version globale ; puis une version par table du grand livre.
+    Lecture sans verrou ; incréments sous verrou de fichier (un descripteur
+    par processus : après un fork, le verrou hérité ne protégerait rien).
+    """
+
+    _TABLES = sorted(LEDGER_TABLES)
+    _SIZE = 8 * (2 + len(_TABLES))
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = {name: 2 + i for i, name in enumerate(self._TABLES)}
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            fd = os.open(path, os.O_RDWR)
+        else:
+            os.write(fd, os.urandom(8) + bytes(self._SIZE - 8))
+        try:
+            self._map = mmap.mmap(fd, self._SIZE)
+        finally:
+            os.close(fd)
+        self._lock_pid = None
+        self._lock_handle = None
+
+    def _get(self, slot: int) -> int:
+        return struct.unpack_from("<Q", self._map, 8 * slot)[0]
+
+    def epoch(self) -> str:
+        return f"{self._get(0):016x}"[:8]
+
+    def version(self, tables: Optional[Iterable[str]] = None) -> int:
+        if tables is None:
+            return self._get(1)
+        return sum(self._get(self._index[name]) for name in tables if name in self._index)
+
+    def bump(self, tables: Iterable[str]) -> int:
+        if self._lock_pid != os.getpid():
+            self._lock_handle = open(self.path, "r+b")
+            self._lock_pid = os.getpid()
+        slots = [1] + [self._index[name] for name in tables]
+        _lock_file(self._lock_handle)
+        try:
+            for slot in slots:
+                struct.pack_into("<Q", self._map, 8 * slot, self._get(slot) + 1)
+            return self._get(1)
+        finally:
+            _unlock_file(self._lock_handle)
+
+
+SHARED_FILE = os.getenv("LEDGER_SHARED_FILE")
+_shared = SharedCounters(SHARED_FILE) if SHARED_FILE else None
+
+_lock = threading.Lock()
+_version = 0
+_table_versions = {name: 0 for name in LEDGER_TABLES}
+_epoch = os.urandom(4).hex()
+
+
+def epoch() -> str:
+    """Identifiant de la série de versions (change quand les compteurs repartent de zéro)."""
+    return _shared.epoch() if _shared is not None else _epoch
+
+
+def current_version(tables: Optional[Iterable[str]] = None) -> int:
+    """Version globale, ou somme des versions des tables demandées."""
+    if _shared is not None:
+        return _shared.version(tables)
+    if tables is None:
+        return _version
+    return sum(_table_versions.get(name, 0) for name in tables)
+
+
+def bump(tables: Optional[Iterable[str]] = None) -> int:
+    """Incrémenter la version (toutes les tables si `tables` est None)."""
+    global _version
+    names = LEDGER_TABLES if tables is None else [t for t in tables if t in LEDGER_TABLES]
+    with _lock:
+        if _shared is not None:
+            return _shared.bump(names)
+        for name in names:
+            _table_versions[name] += 1
+        _version += 1
+        return _version
+
+
+def _mark(session, tables: Iterable[str]):
+    touched = session.info.setdefault("ledger_tables", set())
+    touched.update(t for t in tables if t in LEDGER_TABLES)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_flush(session, flush_context):
+    _mark(session, (
+        getattr(obj, "__tablename__", None)
+        for obj in chain(session.new, session.dirty, session.deleted)
+    ))
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    # query(...).delete() / update() ne passent pas par le flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _mark(orm_execute_state.session, [table.name])
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_on_commit(session):
+    touched = session.info.pop("ledger_tables", None)
+    if touched:
+        bump(touched)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop("ledger_tables", None)
+
+
+class VersionedCache:
+    """Cache LRU dont les entrées ne sont valides que pour une version du grand livre."""
+
+    def __init__(self, maxsize: int = 64, tables: Optional[Iterable[str]] = None):
+        self.maxsize = maxsize
+        self.tables = frozenset(tables) if tables is not None else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        # Lire la version avant le calcul : une écriture concurrente produira
+        # une version plus récente et la valeur calculée ne sera plus servie.
+        version = current_version(self.tables)
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and hit[0] == version:
+                self._data.move_to_end(key)
+                return hit[1]
+        value = compute()
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
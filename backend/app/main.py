@@ -1,23 +1,31 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import uvicorn
 import os
-from dotenv import load_dotenv
 
-from app.database import engine, Base
-from app.routers import auth, products, stock_entries, stock_exits, reports, adjustments, maintenance, mobile
+from app.database import SQLITE_WAL, enable_wal, ensure_schema
+from app import ledger  # noqa: F401  enregistre le suivi des écritures de stock (cache versionné)
+from app import alerts as stock_alerts  # noqa: F401  enregistre la détection des franchissements de seuil
+from app import stock_events  # noqa: F401  publie les mouvements de stock sur le bus d'événements
+from app.journal import JOURNAL_ENABLED, movement_journal
+from app.backup import backup_service
+from app import httpcache, metrics, profiling, sqltrace
+from app.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.routers import auth, products, stock_entries, stock_exits, reports, adjustments, maintenance, mobile, alerts, events, stock_takes
 
-# Charger les variables d'environnement
-load_dotenv()
-
-# Créer les tables
-Base.metadata.create_all(bind=engine)
+# Créer les tables (et ajouter les colonnes/index manquants) si les modèles ont changé
+ensure_schema()
+if SQLITE_WAL:
+    enable_wal()
 
 app = FastAPI(
     title="Stock Management API",
     description="API pour la gestion de stock avec entrées/sorties, codes-barres et impression",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson plutôt que json : voir app/responses.py
+    default_response_class=ORJSONResponse,
 )
 
 # Configuration CORS
@@ -47,6 +55,19 @@ app.add_middleware(
 # Middleware de sécurité
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
+# Compression gzip (brotli / zstd si installés) des réponses texte et JSON
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# GET conditionnels : ETag faibles dérivés des versions du grand livre (voir app/httpcache.py)
+httpcache.install(app)
+
+# Métriques de performance (latence par route, coût SQL par requête)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Trace SQL / journal des requêtes lentes / Server-Timing (opt-in, voir app/sqltrace.py)
+sqltrace.install(app)
+
 # Enregistrement des routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
@@ -54,8 +75,32 @@ app.include_router(stock_entries.router, prefix="/api/stock-entries", tags=["Sto
 app.include_router(stock_exits.router, prefix="/api/stock-exits", tags=["Stock Exits"])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(adjustments.router, prefix="/api/adjustments", tags=["Stock Adjustments"])
+app.include_router(stock_takes.router, prefix="/api/stock-takes", tags=["Stock Takes"])
 app.include_router(maintenance.router, prefix="/api/maintenance", tags=["Maintenance"])
 app.include_router(mobile.router, prefix="/api/mobile", tags=["Mobile APIs"])
+app.include_router(alerts.router, prefix="/api/alerts", tags=["Stock Alerts"])
+app.include_router(events.router, prefix="/api/events", tags=["Live Events"])
+
+@app.on_event("startup")
+def start_movement_journal():
+    if JOURNAL_ENABLED:
+        movement_journal.start()
+
+@app.on_event("shutdown")
+def stop_movement_journal():
+    if JOURNAL_ENABLED:
+        movement_journal.stop()
+
+@app.on_event("startup")
+def start_backup_schedule():
+    # Sauvegardes à chaud périodiques si BACKUP_INTERVAL_MINUTES > 0 (voir app/backup.py)
+    if backup_service is not None:
+        backup_service.start_schedule()
+
+@app.on_event("shutdown")
+def stop_backup_schedule():
+    if backup_service is not None:
+        backup_service.stop_schedule()
 
 @app.get("/")
 async def root():
@@ -65,6 +110,14 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Profil cProfile par requête via l'en-tête X-Profile (opt-in, voir app/profiling.py).
+# Après la déclaration de toutes les routes : elles sont enveloppées une à une.
+profiling.install(app)
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
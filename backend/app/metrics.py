@@ -0,0 +1,278 @@
+"""
+Métriques de performance au format texte Prometheus.
+
+- `MetricsMiddleware` (ASGI) : latence par route (gabarit de chemin, pas l'URL
+  brute), requêtes en cours, et coût base de données de chaque requête ;
+- hooks SQLAlchemy sur le moteur : requêtes, durée, lignes modifiées, commits ;
+- jauges du pool de connexions, lues au moment du scrape.
+
+`render()` produit le corps de `GET /metrics`.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from app.database import engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, *labels):
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [compte par bucket (+Inf inclus), somme]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            slot = self._values.get(labels)
+            if slot is None:
+                slot = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            slot[0][index] += 1
+            slot[1] += value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_requests_total = _register(Counter(
+    "http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status")))
+http_request_duration = _register(Histogram(
+    "http_request_duration_seconds", "Latence des requêtes HTTP par route", ("method", "route")))
+http_in_progress = _register(Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours"))
+request_db_queries = _register(Histogram(
+    "http_request_db_queries", "Requêtes SQL par requête HTTP", ("method", "route"), QUERY_COUNT_BUCKETS))
+request_db_time = _register(Histogram(
+    "http_request_db_seconds", "Temps passé en base par requête HTTP", ("method", "route")))
+request_db_commits = _register(Histogram(
+    "http_request_db_commits", "Commits par requête HTTP", ("method", "route"), QUERY_COUNT_BUCKETS))
+db_queries_total = _register(Counter(
+    "db_queries_total", "Requêtes SQL exécutées"))
+db_query_seconds_total = _register(Counter(
+    "db_query_seconds_total", "Temps cumulé d'exécution SQL"))
+db_rows_affected_total = _register(Counter(
+    "db_rows_affected_total", "Lignes insérées, modifiées ou supprimées"))
+db_commits_total = _register(Counter(
+    "db_commits_total", "Commits de transactions"))
+db_pool_checked_out = _register(Gauge(
+    "db_pool_checked_out", "Connexions du pool actuellement utilisées"))
+db_pool_size = _register(Gauge(
+    "db_pool_size", "Taille configurée du pool de connexions"))
+db_pool_overflow = _register(Gauge(
+    "db_pool_overflow", "Connexions ouvertes au-delà de la taille du pool"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "commits", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.commits = 0
+        self.rows = 0
+
+
+# Objet mutable partagé avec le threadpool : les routes synchrones reçoivent une
+# copie du contexte, mais c'est le même RequestStats qu'elles incrémentent.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    rows = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+    db_queries_total.inc()
+    db_query_seconds_total.inc(elapsed)
+    if rows:
+        db_rows_affected_total.inc(rows)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.rows += rows
+
+
+@event.listens_for(engine, "handle_error")
+def _on_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+@event.listens_for(engine, "commit")
+def _on_commit(conn):
+    db_commits_total.inc()
+    stats = current_request.get()
+    if stats is not None:
+        stats.commits += 1
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence et coût SQL par route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_in_progress.dec()
+            current_request.reset(token)
+            method, route = scope["method"], route_label(scope)
+            http_requests_total.inc(1, method, route, str(status["code"]))
+            http_request_duration.observe(elapsed, method, route)
+            request_db_queries.observe(stats.queries, method, route)
+            request_db_time.observe(stats.db_seconds, method, route)
+            request_db_commits.observe(stats.commits, method, route)
+
+
+def _collect_pool():
+    pool = engine.pool
+    checked_out = getattr(pool, "checkedout", None)
+    if checked_out is not None:
+        db_pool_checked_out.set(checked_out())
+    size = getattr(pool, "size", None)
+    if size is not None:
+        db_pool_size.set(size())
+    overflow = getattr(pool, "overflow", None)
+    if overflow is not None:
+        db_pool_overflow.set(max(overflow(), 0))
+
+
+def render() -> str:
+    _collect_pool()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
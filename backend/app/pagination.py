@@ -0,0 +1,44 @@
+"""
+Pagination par clé (keyset) des listes triées par date décroissante.
+
+Au lieu de `OFFSET n` (le moteur relit et jette n lignes, de plus en plus
+lent page après page), la page suivante reprend après la dernière ligne
+servie : `(date, id) < (date_dernière, id_dernier)`, lu sur l'index
+(date, id). Le curseur renvoyé au client est opaque.
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    raw = f"{date.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        date, _, row_id = raw.rpartition("|")
+        return datetime.fromisoformat(date), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(date_column, id_column, cursor: Optional[str]):
+    """Critère « après le curseur » pour un tri (date DESC, id DESC) ; None sans curseur."""
+    if not cursor:
+        return None
+    date, row_id = decode_cursor(cursor)
+    return tuple_(date_column, id_column) < tuple_(date, row_id)
+
+
+def next_cursor(rows, limit: int, date_field: str) -> Optional[str]:
+    """Curseur de la page suivante si `rows` (limit + 1 lignes demandées) en contient une de plus."""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(getattr(last, date_field), last.id)
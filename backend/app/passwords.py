@@ -0,0 +1,80 @@
+"""
+Hachage des mots de passe (bcrypt) hors du pool de threads des routes.
+
+bcrypt coûte volontairement cher (~250 ms au coût 12) : exécuté dans le pool
+de threads partagé par les routes synchrones, une rafale de connexions en
+début de poste occupait tous les threads et bloquait les endpoints de stock.
+
+- les calculs passent par un exécuteur dédié de `PASSWORD_HASH_WORKERS`
+  threads ; au-delà de `PASSWORD_HASH_QUEUE` calculs en attente, `HashingBusy`
+  est levée immédiatement (503 côté API) au lieu d'allonger la file ;
+- le coût est réglable (`BCRYPT_ROUNDS`, 12 par défaut) ; `needs_rehash`
+  signale un hash d'un autre coût, recalculé à la connexion suivante.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", str(HASH_WORKERS * 8)))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE)
+
+
+class HashingBusy(RuntimeError):
+    """Trop de calculs bcrypt en attente."""
+
+
+def _submit(fn, *args) -> Future:
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy("Password hashing queue is full")
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def _hash(password: str) -> str:
+    import bcrypt  # importé au premier calcul : inutile au démarrage
+
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)).decode("utf-8")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    import bcrypt
+
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_password(password: str) -> str:
+    return _submit(_hash, password).result()
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return _submit(_verify, password, hashed).result()
+
+
+async def hash_password_async(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    return await asyncio.wrap_future(_submit(_verify, password, hashed))
+
+
+def hash_rounds(hashed: str) -> int:
+    """Coût d'un hash bcrypt (`$2b$12$...` -> 12), 0 si illisible."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
@@ -0,0 +1,252 @@
+"""
+Profilage à la demande, en production.
+
+- `SamplingProfiler` : échantillonne périodiquement la pile de tous les threads
+  (boucle asyncio et threadpool d'uvicorn) et produit un fichier « collapsed
+  stacks » lisible par flamegraph.pl / speedscope. Surcoût proportionnel à la
+  fréquence d'échantillonnage, aucun pendant le reste du temps. `run_async`
+  échantillonne dans un thread dédié : la route d'administration n'occupe ni
+  la boucle ni un thread du pool des routes pendant la mesure.
+- Profil cProfile d'une requête : si `REQUEST_PROFILE_TOKEN` est défini, une
+  requête portant l'en-tête `X-Profile: <token>` est profilée (thread de la
+  boucle + thread du threadpool qui exécute la route) ; le fichier `.prof`
+  est écrit dans `PROFILE_DIR` et son nom renvoyé dans `X-Profile-File`.
+  Le profileur de la boucle voit aussi les requêtes concurrentes : une seule
+  requête est profilée à la fois, les autres demandes passent sans profil
+  (`X-Profile-Skipped: busy`).
+"""
+import asyncio
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi.routing import APIRoute
+
+REQUEST_PROFILE_TOKEN = os.getenv("REQUEST_PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+MAX_SAMPLING_SECONDS = 120
+
+_sampler_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sampling-profiler")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Échantillonneur de piles multi-threads (format collapsed stacks)."""
+
+    _running = threading.Lock()
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+
+    def run(self, seconds: float) -> str:
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A sampling profile is already running")
+        return self._sample_and_release(seconds)
+
+    async def run_async(self, seconds: float) -> str:
+        """`run` dans le thread dédié du profileur, attendu sans bloquer la boucle."""
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A sampling profile is already running")
+        try:
+            future = _sampler_executor.submit(self._sample_and_release, seconds)
+        except BaseException:
+            self._running.release()
+            raise
+        return await asyncio.wrap_future(future)
+
+    def _sample_and_release(self, seconds: float) -> str:
+        try:
+            return self._sample(seconds)
+        finally:
+            self._running.release()
+
+    def _sample(self, seconds: float) -> str:
+        own = threading.get_ident()
+        names = {}
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# -- profil cProfile par requête ------------------------------------------
+
+class _RequestProfile:
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add(self, profile: cProfile.Profile):
+        with self._lock:
+            self.profiles.append(profile)
+
+    def dump(self, path: str):
+        stats = None
+        for profile in self.profiles:
+            profile.create_stats()
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        if stats is not None:
+            stats.dump_stats(path)
+
+
+_current_profile: ContextVar[Optional[_RequestProfile]] = ContextVar("current_request_profile", default=None)
+
+
+def _profiled(call):
+    """Profiler l'appel synchrone d'une route dans le thread qui l'exécute."""
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        session = _current_profile.get()
+        if session is None:
+            return call(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce thread
+            return call(*args, **kwargs)
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.disable()
+            session.add(profile)
+
+    return wrapper
+
+
+def instrument_routes(app):
+    """Envelopper les routes synchrones pour le profil par requête."""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.dependant.call):
+            route.dependant.call = _profiled(route.dependant.call)
+
+
+class RequestProfileMiddleware:
+    """Middleware ASGI : profil cProfile des requêtes portant `X-Profile: <token>`."""
+
+    _running = threading.Lock()
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        # Un profil à la fois : deux profileurs sur le thread de la boucle échouent (Python 3.12+)
+        if not self._running.acquire(blocking=False):
+            await self._unprofiled(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._running.release()
+
+    async def _unprofiled(self, scope, receive, send):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-skipped", b"busy")]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _profile(self, scope, receive, send):
+        # Thread de la boucle : validation, sérialisation, routes async
+        loop_profile = cProfile.Profile()
+        try:
+            loop_profile.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif sur ce thread
+            await self._unprofiled(scope, receive, send)
+            return
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.prof"
+        session = _RequestProfile()
+        token = _current_profile.set(session)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-file", name.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            loop_profile.disable()
+            session.add(loop_profile)
+            _current_profile.reset(token)
+            session.dump(os.path.join(PROFILE_DIR, name))
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        for key, value in scope.get("headers", []):
+            if key == b"x-profile":
+                return value.decode("latin-1") == REQUEST_PROFILE_TOKEN
+        return False
+
+
+def install(app) -> bool:
+    if not REQUEST_PROFILE_TOKEN:
+        return False
+    instrument_routes(app)
+    app.add_middleware(RequestProfileMiddleware)
+    return True
+
+
+def list_profiles() -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    files = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".prof"):
+            st = os.stat(os.path.join(PROFILE_DIR, name))
+            files.append({"name": name, "size": st.st_size, "created_at": datetime.fromtimestamp(st.st_mtime)})
+    return files
+
+
+def profile_path(name: str) -> Optional[str]:
+    """Chemin d'un fichier de profil, ou None si le nom est invalide ou inconnu."""
+    if os.path.basename(name) != name or not name.endswith(".prof"):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def profile_summary(path: str, limit: int = 50, sort: str = "cumulative") -> str:
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
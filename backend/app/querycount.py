@@ -0,0 +1,54 @@
+"""
+Comptage des requêtes SQL émises sur un moteur.
+
+Sert à vérifier qu'un endpoint reste dans son budget de requêtes (pas de
+chargement paresseux ligne par ligne) ; voir `check_query_budget.py`.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.database import engine as default_engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(bind: Engine = None) -> Iterator[QueryCounter]:
+    """Compter toutes les requêtes exécutées sur `bind` pendant le bloc."""
+    bind = bind or default_engine
+    counter = QueryCounter()
+    event.listen(bind, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", counter._record)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_query_budget(budget: int, label: str = "", bind: Engine = None) -> Iterator[QueryCounter]:
+    """Échouer si le bloc exécute plus de `budget` requêtes."""
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > budget:
+        detail = "\n".join(f"  {sql.splitlines()[0][:160]}" for sql in counter.statements)
+        raise QueryBudgetExceeded(f"{label or 'block'}: {counter.count} queries > budget {budget}\n{detail}")
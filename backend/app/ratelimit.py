@@ -0,0 +1,51 @@
+"""
+Limitation de débit en mémoire (seau à jetons par clé).
+
+Propre à chaque processus : suffisant pour freiner une rafale ou un essai de
+mots de passe sur un poste, sans dépendance externe.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+def parse_rate(value: str) -> Optional[Tuple[int, float]]:
+    """« 10/60 » -> (10, 60.0) : 10 essais par 60 secondes ; None si « 0 » ou vide."""
+    value = (value or "").strip()
+    if not value or value == "0":
+        return None
+    count, _, period = value.partition("/")
+    return int(count), float(period or 60)
+
+
+class RateLimiter:
+    """`capacity` essais par `period` secondes et par clé, rechargés en continu."""
+
+    def __init__(self, capacity: int, period: float, max_keys: int = 10000):
+        self.capacity = capacity
+        self.refill = capacity / period
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable) -> float:
+        """Consommer un jeton ; renvoie 0 si accepté, sinon l'attente en secondes."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, stamp = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - stamp) * self.refill)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.refill
+            self._buckets[key] = (tokens, now)
+            # Les clés les plus anciennes sont oubliées (seau plein à leur retour)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self, key: Hashable):
+        with self._lock:
+            self._buckets.pop(key, None)
@@ -0,0 +1,35 @@
+"""
+Réponses JSON rapides.
+
+`ORJSONResponse` est la classe de réponse par défaut de l'application (voir
+main.py) : orjson encode datetimes, floats et chaînes en C, bien plus vite que
+le module `json` de la bibliothèque standard.
+
+Pour les listes volumineuses (produits, mouvements), les endpoints
+sélectionnent directement les colonnes du schéma de réponse et renvoient les
+lignes telles quelles via `rows_response` : ni objets ORM à construire, ni
+revalidation Pydantic de valeurs déjà typées par la base. Le `response_model`
+de la route reste la documentation du format (OpenAPI).
+"""
+from typing import List, Sequence, Type
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def schema_columns(schema: Type[BaseModel], model) -> List:
+    """Colonnes de `model` portant les champs de `schema`, dans l'ordre du schéma."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def table_columns(model) -> List:
+    """Toutes les colonnes de la table de `model`."""
+    return list(model.__table__.columns)
+
+
+def rows_response(rows: Sequence) -> ORJSONResponse:
+    """Liste JSON d'objets construite depuis des lignes SQLAlchemy (`Row`)."""
+    if not rows:
+        return ORJSONResponse([])
+    keys = rows[0]._fields
+    return ORJSONResponse([dict(zip(keys, row)) for row in rows])
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from typing import List, Optional
 from datetime import datetime
 
-from app.database import get_db, Product, StockAdjustment, StockMovement
+from app.database import get_db, get_product_for_update, Product, StockAdjustment
 from app.schemas import (
     StockAdjustmentCreate,
     StockAdjustmentUpdate,
@@ -13,6 +13,8 @@ from app.schemas import (
     User,
 )
 from app.routers.auth import get_current_active_user
+from app.httpcache import conditional_get
+from app.journal import record_movement
 
 router = APIRouter()
 
@@ -29,7 +31,8 @@ def create_stock_movement_for_adjustment(
     user_id: int,
 ):
     movement_type = "ENTREE" if delta_kg > 0 or delta_cartons > 0 else "SORTIE"
-    movement = StockMovement(
+    record_movement(
+        db,
         product_id=product.id,
         type_mouvement=movement_type,
         qte_kg_avant=old_kg,
@@ -42,8 +45,6 @@ def create_stock_movement_for_adjustment(
         reference_type="ADJUSTMENT",
         created_by=user_id,
     )
-    db.add(movement)
-    db.commit()
 
 @router.post("/", response_model=StockAdjustmentSchema)
 def create_adjustment(
@@ -51,7 +52,7 @@ def create_adjustment(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
 ):
-    product = db.query(Product).filter(Product.id == payload.product_id).first()
+    product = get_product_for_update(db, payload.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -71,7 +72,6 @@ def create_adjustment(
     # Update product stock
     product.stock_actuel_kg = new_kg
     product.stock_actuel_cartons = new_cartons
-    db.commit()
 
     # Create adjustment record
     adj = StockAdjustment(
@@ -85,8 +85,7 @@ def create_adjustment(
         created_by=current_user.id,
     )
     db.add(adj)
-    db.commit()
-    db.refresh(adj)
+    db.flush()
 
     # Log movement
     create_stock_movement_for_adjustment(
@@ -102,6 +101,7 @@ def create_adjustment(
         user_id=current_user.id,
     )
 
+    db.commit()
     return adj
 
 @router.get("/", response_model=List[StockAdjustmentSchema])
@@ -113,8 +113,9 @@ def list_adjustments(
     date_fin: Optional[datetime] = Query(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_adjustments")),
 ):
-    q = db.query(StockAdjustment)
+    q = db.query(StockAdjustment).options(joinedload(StockAdjustment.product))
     if product_id:
         q = q.filter(StockAdjustment.product_id == product_id)
     if type_ajustement:
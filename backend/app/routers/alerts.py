@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.database import get_db, Product, low_stock_condition
+from app.schemas import Product as ProductSchema, User
+from app.routers.auth import get_current_active_user
+from app.httpcache import conditional_get
+from app.alerts import ALERT_TOPIC
+from app.events import bus, events_available, sse_stream, SSE_HEADERS
+
+router = APIRouter()
+
+@router.get("/", response_model=List[ProductSchema])
+def list_low_stock(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
+):
+    """Produits actuellement sous leur seuil kg ou cartons (lecture de l'index partiel)."""
+    return db.query(Product).filter(low_stock_condition).order_by(Product.id).all()
+
+@router.get("/stream")
+async def stream_alerts(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _available: None = Depends(events_available)
+):
+    """
+    Flux SSE des franchissements de seuil (`event: alerts`).
+
+    Chaque événement est un `StockAlertEvent` : `etat` vaut "bas" quand le produit
+    passe sous un seuil, "normal" quand il repasse au-dessus.
+    """
+    # La session n'est utile qu'à l'authentification : ne pas la garder ouverte pendant le flux
+    db.close()
+    sub = bus.subscribe([ALERT_TOPIC])
+    return StreamingResponse(sse_stream(request, sub), media_type="text/event-stream", headers=SSE_HEADERS)
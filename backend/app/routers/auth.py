@@ -1,17 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import Optional
-import bcrypt
-import jwt
+import math
 import os
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
 from app.database import get_db, User
 from app.schemas import UserCreate, User as UserSchema, Token, TokenData
-
-load_dotenv()
+from app import passwords
+from app.ratelimit import RateLimiter, parse_rate
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
@@ -20,13 +19,21 @@ SECRET_KEY = os.getenv("SECRET_KEY", "fallback-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Tentatives de connexion par utilisateur et par adresse IP (« essais/secondes », 0 = illimité)
+_user_rate = parse_rate(os.getenv("LOGIN_RATE_PER_USER", "5/60"))
+_ip_rate = parse_rate(os.getenv("LOGIN_RATE_PER_IP", "30/60"))
+login_user_limiter = RateLimiter(*_user_rate) if _user_rate else None
+login_ip_limiter = RateLimiter(*_ip_rate) if _ip_rate else None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return passwords.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return passwords.hash_password(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    import jwt  # importé au premier jeton (cryptography est long à charger)
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -51,6 +58,8 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    import jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -92,7 +101,10 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = get_password_hash(user.password)
+    except passwords.HashingBusy:
+        raise HTTPException(status_code=503, detail="Authentication service busy, retry shortly", headers={"Retry-After": "1"})
     db_user = User(
         username=user.username,
         email=user.email,
@@ -102,18 +114,58 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     )
     db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     return db_user
 
+def _load_login_user(db: Session, username: str):
+    user = get_user_by_username(db, username)
+    # Fin de transaction : la connexion retourne au pool pendant le calcul bcrypt
+    # (l'objet reste utilisable, expire_on_commit=False)
+    db.commit()
+    return user
+
+def _check_login_rate(username: str, client_ip: str):
+    wait = 0.0
+    if login_ip_limiter is not None:
+        wait = login_ip_limiter.acquire(client_ip)
+    if not wait and login_user_limiter is not None:
+        wait = login_user_limiter.acquire(username.lower())
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+async def login_for_access_token(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
+):
+    # Route asynchrone : bcrypt tourne dans son exécuteur dédié (app/passwords.py),
+    # l'attente n'occupe pas un thread du pool des routes de stock.
+    _check_login_rate(form_data.username, request.client.host if request.client else "")
+    user = await run_in_threadpool(_load_login_user, db, form_data.username)
+    try:
+        valid = user is not None and await passwords.verify_password_async(form_data.password, user.hashed_password)
+        if valid and passwords.needs_rehash(user.hashed_password):
+            # Coût BCRYPT_ROUNDS modifié : le hash est recalculé avec le mot de passe en clair
+            user.hashed_password = await passwords.hash_password_async(form_data.password)
+            await run_in_threadpool(db.commit)
+    except passwords.HashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if login_user_limiter is not None:
+        login_user_limiter.reset(form_data.username.lower())
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.schemas import User
+from app.routers.auth import get_current_active_user
+from app.alerts import ALERT_TOPIC
+from app.events import bus, events_available, sse_stream, SSE_HEADERS
+from app.stock_events import MOVEMENT_TOPIC
+
+router = APIRouter()
+
+@router.get("/stream")
+async def stream_stock_events(
+    request: Request,
+    product_id: Optional[List[int]] = Query(None, description="Limiter le flux à ces produits (répétable)"),
+    topics: Optional[List[str]] = Query(None, description=f"Sujets: {MOVEMENT_TOPIC}, {ALERT_TOPIC} (défaut: tous)"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _available: None = Depends(events_available)
+):
+    """
+    Flux SSE des changements de stock, en remplacement du polling des listes.
+
+    - `event: movements` : delta d'un mouvement (`p` produit, `t` type, `dk`/`dc`
+      variation kg/cartons, `k`/`c` stock après, `ref`/`rid` document source)
+    - `event: alerts` : franchissement de seuil d'alerte
+    - `event: reset` : des événements ont été perdus (reconnexion trop tardive,
+      redémarrage du serveur) ; le client doit recharger l'état complet.
+
+    À la reconnexion, le navigateur renvoie `Last-Event-ID` et les événements
+    manqués sont rejoués. Le paramètre `last_event_id` permet la même chose aux
+    clients qui ne gèrent pas l'en-tête.
+    """
+    db.close()
+    last_event_id = last_event_id or request.query_params.get("last_event_id")
+    sub = bus.subscribe(topics or [MOVEMENT_TOPIC, ALERT_TOPIC], product_ids=product_id, last_event_id=last_event_id)
+    return StreamingResponse(sse_stream(request, sub), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 
 from app.database import (
@@ -8,9 +11,19 @@ from app.database import (
     StockMovement,
     StockAdjustment,
     Product,
+    ProductDemand,
+    StockTake,
+    StockTakeCount,
+    StockTakeSnapshot,
+    LedgerArchive,
 )
 from app.schemas import User
 from app.routers.auth import get_current_active_user
+from app.journal import movement_journal
+from app.archive import ArchiveError, archive_year
+from app.demand import rebuild_demand
+from app.backup import backup_service, list_backups
+from app import profiling, sqltrace
 
 router = APIRouter()
 
@@ -35,9 +48,19 @@ def purge_transactions(
         p.stock_actuel_cartons = 0
     db.commit()
 
+    # Vider le journal différé pour qu'aucun mouvement ne soit inséré après la purge
+    if movement_journal.running:
+        movement_journal.flush_all()
+
     # Supprimer l'historique des mouvements et ajustements d'abord
     db.query(StockMovement).delete(synchronize_session=False)
     db.query(StockAdjustment).delete(synchronize_session=False)
+    db.query(ProductDemand).delete(synchronize_session=False)
+
+    # Inventaires : stocks figés et comptages n'ont plus de sens après la remise à zéro
+    db.query(StockTakeCount).delete(synchronize_session=False)
+    db.query(StockTakeSnapshot).delete(synchronize_session=False)
+    db.query(StockTake).delete(synchronize_session=False)
 
     # Supprimer les entrées et les sorties
     db.query(StockEntry).delete(synchronize_session=False)
@@ -49,3 +72,201 @@ def purge_transactions(
         "message": "Transactions purgées avec succès",
         "deleted": True,
     }
+
+@router.get("/archives")
+def list_archives(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Exercices archivés (fichier, nombre de réceptions, sorties et mouvements déplacés).
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return [
+        {
+            "year": archive.year,
+            "filename": archive.filename,
+            "entries": archive.entries,
+            "exits": archive.exits,
+            "movements": archive.movements,
+            "archived_at": archive.archived_at,
+        }
+        for archive in db.query(LedgerArchive).order_by(LedgerArchive.year).all()
+    ]
+
+@router.post("/archive/{year}")
+def archive_fiscal_year(
+    year: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Déplacer un exercice clos (réceptions, sorties, mouvements) dans son
+    fichier d'archive ; les stocks sont reportés par un mouvement d'ouverture.
+    Les rapports sur une période archivée lisent l'archive (voir app/archive.py).
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+    # Les mouvements encore dans le journal différé doivent être en base avant le déplacement
+    if movement_journal.running:
+        movement_journal.flush_all()
+
+    try:
+        archive = archive_year(db, year, current_user.id)
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": f"Exercice {year} archivé",
+        "year": archive.year,
+        "filename": archive.filename,
+        "entries": archive.entries,
+        "exits": archive.exits,
+        "movements": archive.movements,
+    }
+
+@router.post("/demand/rebuild")
+def rebuild_product_demand(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Recalculer la consommation journalière des produits depuis l'historique
+    des sorties (après corrections de sorties ou import en masse, voir
+    app/demand.py). Les exercices archivés ne sont pas relus.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    products = rebuild_demand(db)
+    db.commit()
+    return {"message": "Consommation recalculée", "products": products}
+
+@router.post("/backup", status_code=202)
+def start_backup(
+    kind: str = Query("incremental", pattern="^(incremental|full)$"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Lancer une sauvegarde à chaud en arrière-plan (complète, ou pages modifiées
+    depuis le dernier instantané). L'API reste disponible pendant la copie ;
+    résultat dans GET /backups.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    if backup_service is None:
+        raise HTTPException(status_code=400, detail="Hot backup requires SQLite (use pg_dump)")
+    if not backup_service.start(kind):
+        raise HTTPException(status_code=409, detail="A backup is already running")
+    return {"message": "Sauvegarde lancée", "kind": kind}
+
+@router.get("/backups")
+def get_backups(current_user: User = Depends(get_current_active_user)):
+    """
+    Sauvegardes conservées (chaînes complète + incréments), sauvegarde en cours
+    et résultat de la dernière.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    if backup_service is None:
+        raise HTTPException(status_code=400, detail="Hot backup requires SQLite (use pg_dump)")
+    return {
+        "running": backup_service.running,
+        "last": backup_service.last,
+        "backups": list_backups(backup_service.directory),
+    }
+
+@router.get("/sql-trace")
+def get_sql_trace(
+    limit: int = Query(20, ge=1, le=500),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Dernières traces SQL par requête HTTP (texte, types des paramètres, durée,
+    fonction appelante). Nécessite `SQL_TRACE=1`.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    if not sqltrace.TRACE_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL trace disabled (set SQL_TRACE=1)")
+    return {
+        "slow_query_ms": sqltrace.SLOW_QUERY_MS,
+        "traces": sqltrace.get_recent_traces(limit),
+    }
+
+@router.get("/profile")
+async def sample_profile(
+    seconds: float = Query(10.0, gt=0, le=profiling.MAX_SAMPLING_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Échantillonner la pile de tous les threads du worker pendant `seconds`
+    secondes et renvoyer un fichier « collapsed stacks » (flamegraph.pl,
+    speedscope). Un seul profil à la fois. Route asynchrone : l'échantillonnage
+    tourne dans le thread dédié du profileur, pas dans le pool des routes.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    profiler = profiling.SamplingProfiler(interval=interval_ms / 1000.0)
+    try:
+        collapsed = await profiler.run_async(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return PlainTextResponse(
+        collapsed,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(profiler.samples),
+        },
+    )
+
+@router.get("/profiles")
+def list_request_profiles(current_user: User = Depends(get_current_active_user)):
+    """
+    Profils cProfile enregistrés pour les requêtes envoyées avec l'en-tête
+    `X-Profile` (nécessite `REQUEST_PROFILE_TOKEN`).
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return profiling.list_profiles()
+
+@router.get("/profiles/{name}")
+def get_request_profile(
+    name: str,
+    format: str = Query("prof", pattern="^(prof|text)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Télécharger un profil de requête (`.prof` pour snakeviz / pstats) ou son
+    résumé texte (`format=text`).
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(profiling.profile_summary(path, limit=limit, sort=sort))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
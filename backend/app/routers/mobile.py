@@ -4,7 +4,10 @@ from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db, Product, StockEntry, StockEntryItem, StockExit, StockExitItem, StockMovement
+from app.database import get_db, Product, StockEntry, StockEntryItem, StockExit, StockExitItem
+from app.httpcache import conditional_get
+from app.responses import rows_response
+from app.routers.products import PRODUCT_COLUMNS
 from app.schemas import Product as ProductSchema, StockEntryBatchCreate, StockExitCreateFlexible
 from app.schemas import (
     StockExit as StockExitSchema,  # ancien schéma item (aplati)
@@ -19,9 +22,10 @@ from app.schemas import (
     StockEntryUpdate,
 )
 from app.routers.stock_entries import update_product_stock_on_entry
-from app.routers.stock_exits import update_product_stock_on_exit
+from app.routers.stock_exits import post_stock_exit
 router = APIRouter()
 from app.routers.auth import get_current_active_user
+from app.journal import record_movement
 
 class StockEntryCreateFlexible(BaseModel):
     date_reception: datetime
@@ -42,8 +46,8 @@ class StockEntryCreateFlexible(BaseModel):
 
 # Mobile API for Products
 @router.get("/products", response_model=List[ProductSchema])
-def get_products_mobile(db: Session = Depends(get_db)):
-    return db.query(Product).all()
+def get_products_mobile(db: Session = Depends(get_db), _etag: None = Depends(conditional_get("products"))):
+    return rows_response(db.query(*PRODUCT_COLUMNS).all())
 
 @router.get("/products/{product_id}", response_model=ProductSchema)
 def get_product_by_id_mobile(product_id: int, db: Session = Depends(get_db)):
@@ -71,88 +75,22 @@ def add_multiple_stock_exits(
             prix_vente=exit_entry.prix_vente,
             created_by= 0
         )
-        db.add(header)
-        db.commit()
-        db.refresh(header)
-
-        for it in exit_entry.items:
-            product = db.query(Product).filter(Product.id == it.product_id).first()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Product not found: {it.product_id}")
-
-            # Vérification stock dispo
-            if product.stock_actuel_kg < it.qte_kg or product.stock_actuel_cartons < it.qte_cartons:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Insufficient stock for product {it.product_id}. "
-                           f"Available: {product.stock_actuel_kg} kg, {product.stock_actuel_cartons} cartons. "
-                           f"Requested: {it.qte_kg} kg, {it.qte_cartons} cartons."
-                )
-
-            # Création item sortie
-            item = StockExitItem(
-                exit_id=header.id,
+        items = [
+            StockExitItem(
                 product_id=it.product_id,
                 qte_kg=it.qte_kg,
                 qte_cartons=it.qte_cartons,
                 date_peremption=it.date_peremption,
                 remarque=it.remarque,
             )
-            db.add(item)
-            db.commit()
-            db.refresh(item)
-
-            # 🔥 MAJ stock avec la même logique que dans create_stock_exit
-            old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_exit(
-                db, it.product_id, it.qte_kg, it.qte_cartons
-            )
-
-            # 🔥 Création mouvement
-            create_stock_movement_exit(
-                db,
-                it.product_id,
-                old_kg,
-                old_cartons,
-                it.qte_kg,
-                it.qte_cartons,
-                new_kg,
-                new_cartons,
-                reference_id=item.id,
-                user_id= 0,
-            )
-
-            all_created_items.append(serialize_exit_item(item, header))
-
-    return all_created_items
+            for it in exit_entry.items
+        ]
+        # Demande cumulée par produit vérifiée avant toute écriture (voir post_stock_exit)
+        post_stock_exit(db, header, items, user_id=0)
+        all_created_items.extend(serialize_exit_item(item, header) for item in items)
 
-def create_stock_movement_exit(
-    db: Session,
-    product_id: int,
-    qte_kg_avant: float,
-    qte_cartons_avant: int,
-    qte_kg_mouvement: float,
-    qte_cartons_mouvement: int,
-    qte_kg_apres: float,
-    qte_cartons_apres: int,
-    reference_id: int,
-    user_id: int,
-):
-    movement = StockMovement(
-        product_id=product_id,
-        type_mouvement="SORTIE",
-        qte_kg_avant=qte_kg_avant,
-        qte_cartons_avant=qte_cartons_avant,
-        qte_kg_mouvement=-float(qte_kg_mouvement or 0.0),  # négatif
-        qte_cartons_mouvement=-int(qte_cartons_mouvement or 0),
-        qte_kg_apres=qte_kg_apres,
-        qte_cartons_apres=qte_cartons_apres,
-        reference_id=reference_id,
-        reference_type="EXIT",
-        created_by=0,
-    )
-    db.add(movement)
     db.commit()
-
+    return all_created_items
 
 def serialize_exit_item(item: StockExitItem, header: StockExit) -> dict:
     return {
@@ -193,8 +131,6 @@ def add_multiple_stock_entries_public(
             created_by=0  # utilisateur par défaut
         )
         db.add(header)
-        db.commit()
-        db.refresh(header)
 
         for it in entry.items:
             product = db.query(Product).filter(Product.id == it.product_id).first()
@@ -203,7 +139,7 @@ def add_multiple_stock_entries_public(
 
             # Création item entrée
             item = StockEntryItem(
-                entry_id=header.id,
+                entry=header,
                 product_id=it.product_id,
                 qte_kg=it.qte_kg,
                 qte_cartons=it.qte_cartons,
@@ -211,8 +147,7 @@ def add_multiple_stock_entries_public(
                 remarque=it.remarque,
             )
             db.add(item)
-            db.commit()
-            db.refresh(item)
+            db.flush()  # id de la ligne, référencé par le mouvement
 
             # MAJ stock
             old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_entry(
@@ -236,6 +171,7 @@ def add_multiple_stock_entries_public(
 
             all_created_items.append(serialize_entry_item(item, header))
 
+    db.commit()
     return all_created_items
 
 
@@ -252,7 +188,8 @@ def create_stock_movement(
     reference_type: str,
     user_id: int,
 ):
-    movement = StockMovement(
+    record_movement(
+        db,
         product_id=product_id,
         type_mouvement="ENTREE",
         qte_kg_avant=qte_kg_avant,
@@ -265,8 +202,6 @@ def create_stock_movement(
         reference_type=reference_type,
         created_by=0,
     )
-    db.add(movement)
-    db.commit()
 
 
 def serialize_entry_item(item: StockEntryItem, header: StockEntry) -> dict:
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.database import get_db, Product
+from app.database import get_db, Product, low_stock_condition
 from app.schemas import ProductCreate, ProductUpdate, Product as ProductSchema, User
 from app.routers.auth import get_current_active_user
+from app.responses import rows_response, schema_columns
+from app.httpcache import conditional_get
 
 router = APIRouter()
 
+# Colonnes du schéma de réponse : les listes sont servies depuis les lignes, sans objets ORM
+PRODUCT_COLUMNS = schema_columns(ProductSchema, Product)
+
 @router.post("/", response_model=ProductSchema)
 def create_product(
     product: ProductCreate,
@@ -31,11 +36,11 @@ def create_product(
     data.setdefault('prix_achat', 0.0)
     data.setdefault('prix_vente', 0.0)
     data.setdefault('seuil_alerte', 0.0)
+    data.setdefault('seuil_alerte_cartons', 0)
 
     db_product = Product(**data)
     db.add(db_product)
     db.commit()
-    db.refresh(db_product)
     return db_product
 
 @router.get("/", response_model=List[ProductSchema])
@@ -44,9 +49,10 @@ def read_products(
     limit: int = 100,
     search: Optional[str] = Query(None, description="Rechercher par nom, code produit ou code-barre"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
-    query = db.query(Product)
+    query = db.query(*PRODUCT_COLUMNS)
     
     if search:
         search_filter = f"%{search}%"
@@ -56,14 +62,14 @@ def read_products(
             (Product.code_barre.ilike(search_filter))
         )
     
-    products = query.offset(skip).limit(limit).all()
-    return products
+    return rows_response(query.offset(skip).limit(limit).all())
 
 @router.get("/{product_id}", response_model=ProductSchema)
 def read_product(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
     product = db.query(Product).filter(Product.id == product_id).first()
     if product is None:
@@ -74,7 +80,8 @@ def read_product(
 def read_product_by_code(
     code_produit: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
     product = db.query(Product).filter(Product.code_produit == code_produit).first()
     if product is None:
@@ -85,7 +92,8 @@ def read_product_by_code(
 def read_product_by_barcode(
     code_barre: str,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
     product = db.query(Product).filter(Product.code_barre == code_barre).first()
     if product is None:
@@ -120,7 +128,6 @@ def update_product(
         setattr(product, field, value)
     
     db.commit()
-    db.refresh(product)
     return product
 
 @router.delete("/{product_id}")
@@ -143,14 +150,11 @@ def delete_product(
 @router.get("/low-stock/alert", response_model=List[ProductSchema])
 def get_low_stock_products(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
-    """Retourner les produits dont le stock est en dessous du seuil d'alerte"""
-    products = db.query(Product).filter(
-        (Product.stock_actuel_kg <= Product.seuil_alerte) |
-        (Product.stock_actuel_cartons <= Product.seuil_alerte)
-    ).all()
-    return products
+    """Retourner les produits dont le stock est en dessous du seuil d'alerte (kg ou cartons)"""
+    return db.query(Product).filter(low_stock_condition).all()
 
 @router.get("/mobile/products", response_model=List[ProductSchema])
 def get_products_mobile(
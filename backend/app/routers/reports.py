@@ -1,73 +1,98 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import func, and_, select
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date, time
 import tempfile
 import os
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-import io
 
-from app.database import get_db, Product, StockEntry, StockExit, StockMovement, StockEntryItem
+import orjson
+
+from app.database import get_db, Product, StockEntry, StockExit, StockMovement, StockEntryItem, low_stock_condition
 from app.database import StockExitItem
-from app.schemas import User, StockReport, PeriodReport
+from app.schemas import User, StockReport, PeriodReport, DashboardReport, TypeSortie
 from app.routers.auth import get_current_active_user
+from app.httpcache import conditional_get
+from app.ledger import VersionedCache, current_version
+from app.responses import rows_response
+from app.archive import history
+from app.analytics import GRANULARITIES, abc_classification, exit_series
+from app.demand import reorder_suggestions
 
 router = APIRouter()
 
+_dashboard_cache = VersionedCache(maxsize=32)
+_analytics_cache = VersionedCache(maxsize=32, tables=("stock_exits", "stock_exit_items"))
+_reorder_cache = VersionedCache(maxsize=16, tables=("products", "product_demand"))
+_abc_cache = VersionedCache(maxsize=16, tables=("products", "stock_exits", "stock_exit_items"))
+
+def default_period(date_debut: Optional[datetime], date_fin: Optional[datetime]):
+    """Période par défaut des analyses : l'année qui se termine aujourd'hui."""
+    if date_fin is None:
+        date_fin = datetime.combine(date.today(), time.max)
+    if date_debut is None:
+        date_debut = datetime.combine(date_fin.date() - timedelta(days=365), time.min)
+    if date_debut > date_fin:
+        raise HTTPException(status_code=400, detail="date_debut must be before date_fin")
+    return date_debut, date_fin
+
 @router.get("/stock-summary", response_model=List[StockReport])
 def get_stock_summary(
     date_debut: Optional[datetime] = Query(None),
     date_fin: Optional[datetime] = Query(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get())
 ):
     """Résumé du stock par produit avec totaux des entrées et sorties"""
     
     # Requête de base pour les produits
     products = db.query(Product).all()
     
+    # Totaux d'entrées et de sorties de tous les produits, en une requête groupée chacun
+    entries_query = db.query(
+        StockEntryItem.product_id,
+        func.sum(StockEntryItem.qte_kg).label('total_kg'),
+        func.sum(StockEntryItem.qte_cartons).label('total_cartons')
+    ).join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+    
+    exits_query = db.query(
+        StockExitItem.product_id,
+        func.sum(StockExitItem.qte_kg).label('total_kg'),
+        func.sum(StockExitItem.qte_cartons).label('total_cartons')
+    ).join(StockExit, StockExitItem.exit_id == StockExit.id)
+    
+    # Appliquer les filtres de date si fournis
+    if date_debut and date_fin:
+        entries_query = entries_query.filter(
+            and_(StockEntry.date_reception >= date_debut, StockEntry.date_reception <= date_fin)
+        )
+        exits_query = exits_query.filter(
+            and_(StockExit.date_sortie >= date_debut, StockExit.date_sortie <= date_fin)
+        )
+    elif date_debut:
+        entries_query = entries_query.filter(StockEntry.date_reception >= date_debut)
+        exits_query = exits_query.filter(StockExit.date_sortie >= date_debut)
+    elif date_fin:
+        entries_query = entries_query.filter(StockEntry.date_reception <= date_fin)
+        exits_query = exits_query.filter(StockExit.date_sortie <= date_fin)
+    
+    entries = {row.product_id: row for row in entries_query.group_by(StockEntryItem.product_id)}
+    exits = {row.product_id: row for row in exits_query.group_by(StockExitItem.product_id)}
+    
     stock_reports = []
     for product in products:
-        # Calculer les totaux d'entrées
-        entries_query = db.query(
-            func.sum(StockEntryItem.qte_kg).label('total_kg'),
-            func.sum(StockEntryItem.qte_cartons).label('total_cartons')
-        ).join(StockEntry, StockEntryItem.entry_id == StockEntry.id).filter(StockEntryItem.product_id == product.id)
-        
-        # Calculer les totaux de sorties
-        exits_query = db.query(
-            func.sum(StockExitItem.qte_kg).label('total_kg'),
-            func.sum(StockExitItem.qte_cartons).label('total_cartons')
-        ).join(StockExit, StockExitItem.exit_id == StockExit.id).filter(StockExitItem.product_id == product.id)
-        
-        # Appliquer les filtres de date si fournis
-        if date_debut and date_fin:
-            entries_query = entries_query.filter(
-                and_(StockEntry.date_reception >= date_debut, StockEntry.date_reception <= date_fin)
-            )
-            exits_query = exits_query.filter(
-                and_(StockExit.date_sortie >= date_debut, StockExit.date_sortie <= date_fin)
-            )
-        elif date_debut:
-            entries_query = entries_query.filter(StockEntry.date_reception >= date_debut)
-            exits_query = exits_query.filter(StockExit.date_sortie >= date_debut)
-        elif date_fin:
-            entries_query = entries_query.filter(StockEntry.date_reception <= date_fin)
-            exits_query = exits_query.filter(StockExit.date_sortie <= date_fin)
-        
-        entries_result = entries_query.first()
-        exits_result = exits_query.first()
+        entries_result = entries.get(product.id)
+        exits_result = exits.get(product.id)
         
         stock_reports.append(StockReport(
             product=product,
-            total_entrees_kg=entries_result.total_kg or 0.0,
-            total_entrees_cartons=entries_result.total_cartons or 0,
-            total_sorties_kg=exits_result.total_kg or 0.0,
-            total_sorties_cartons=exits_result.total_cartons or 0,
+            total_entrees_kg=(entries_result.total_kg if entries_result else None) or 0.0,
+            total_entrees_cartons=(entries_result.total_cartons if entries_result else None) or 0,
+            total_sorties_kg=(exits_result.total_kg if exits_result else None) or 0.0,
+            total_sorties_cartons=(exits_result.total_cartons if exits_result else None) or 0,
             stock_actuel_kg=product.stock_actuel_kg,
             stock_actuel_cartons=product.stock_actuel_cartons
         ))
@@ -79,22 +104,19 @@ def get_period_report(
     date_debut: datetime = Query(...),
     date_fin: datetime = Query(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get())
 ):
     """Rapport de période avec statistiques globales"""
     
     # Nombre total de produits
     total_produits = db.query(Product).count()
     
-    # Nombre d'entrées dans la période
-    total_entrees = db.query(StockEntry).filter(
-        and_(StockEntry.date_reception >= date_debut, StockEntry.date_reception <= date_fin)
-    ).count()
-    
-    # Nombre de sorties dans la période
-    total_sorties = db.query(StockExit).filter(
-        and_(StockExit.date_sortie >= date_debut, StockExit.date_sortie <= date_fin)
-    ).count()
+    # Nombre d'entrées et de sorties dans la période (exercices archivés compris)
+    entries = history(db, StockEntry.__table__, "date_reception", date_debut, date_fin)
+    total_entrees = db.scalar(select(func.count()).select_from(entries))
+    exits = history(db, StockExit.__table__, "date_sortie", date_debut, date_fin)
+    total_sorties = db.scalar(select(func.count()).select_from(exits))
     
     # Valeur du stock actuel (basée sur les prix d'achat)
     valeur_stock = db.query(
@@ -110,26 +132,189 @@ def get_period_report(
         valeur_stock=valeur_stock
     )
 
+def compute_dashboard(db: Session, date_debut: datetime, date_fin: datetime, today: date) -> DashboardReport:
+    """Calculer tous les indicateurs du tableau de bord (3 requêtes au total)."""
+    expiry_limit = datetime.combine(today, time.max) + timedelta(days=7)
+    in_stock = (Product.stock_actuel_kg > 0) | (Product.stock_actuel_cartons > 0)
+    entry_period = StockEntry.date_reception.between(date_debut, date_fin)
+    exit_period = StockExit.date_sortie.between(date_debut, date_fin)
+
+    kpis = db.query(
+        select(func.count(Product.id)).scalar_subquery(),
+        select(func.coalesce(func.sum(Product.stock_actuel_kg * Product.prix_achat), 0.0)).scalar_subquery(),
+        select(func.coalesce(func.sum(Product.stock_actuel_kg), 0.0)).scalar_subquery(),
+        select(func.coalesce(func.sum(Product.stock_actuel_cartons), 0)).scalar_subquery(),
+        select(func.count(StockEntry.id)).where(entry_period).scalar_subquery(),
+        select(func.count(StockExit.id)).where(exit_period).scalar_subquery(),
+        select(func.coalesce(func.sum(StockEntryItem.qte_kg), 0.0))
+        .join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+        .where(entry_period).scalar_subquery(),
+        select(func.coalesce(func.sum(StockExitItem.qte_kg), 0.0))
+        .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .where(exit_period).scalar_subquery(),
+    ).one()
+
+    low_stock = db.query(
+        Product.id, Product.code_produit, Product.nom_produit,
+        Product.stock_actuel_kg, Product.stock_actuel_cartons, Product.seuil_alerte, Product.seuil_alerte_cartons,
+    ).filter(low_stock_condition).order_by(Product.nom_produit).all()
+
+    expiring = (
+        db.query(
+            Product.id, Product.code_produit, Product.nom_produit,
+            StockEntryItem.date_peremption, StockEntryItem.qte_kg, StockEntryItem.qte_cartons,
+            StockEntry.num_reception,
+        )
+        .join(StockEntryItem, StockEntryItem.product_id == Product.id)
+        .join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+        .filter(StockEntryItem.date_peremption.isnot(None), StockEntryItem.date_peremption <= expiry_limit, in_stock)
+        .order_by(StockEntryItem.date_peremption)
+        .all()
+    )
+
+    return DashboardReport(
+        date_debut=date_debut,
+        date_fin=date_fin,
+        total_produits=kpis[0],
+        valeur_stock=kpis[1] or 0.0,
+        stock_total_kg=kpis[2] or 0.0,
+        stock_total_cartons=kpis[3] or 0,
+        total_entrees=kpis[4],
+        total_sorties=kpis[5],
+        entrees_kg=kpis[6] or 0.0,
+        sorties_kg=kpis[7] or 0.0,
+        produits_alerte=len(low_stock),
+        produits_expirant=len(expiring),
+        low_stock=[
+            {
+                "product_id": r[0],
+                "code_produit": r[1],
+                "nom_produit": r[2],
+                "stock_kg": r[3] or 0.0,
+                "stock_cartons": r[4] or 0,
+                "seuil_alerte": r[5] or 0.0,
+                "seuil_alerte_cartons": r[6] or 0,
+            }
+            for r in low_stock
+        ],
+        expiring=[
+            {
+                "product_id": r[0],
+                "code_produit": r[1],
+                "nom_produit": r[2],
+                "date_peremption": r[3],
+                "qte_kg": r[4] or 0.0,
+                "qte_cartons": r[5] or 0,
+                "num_reception": r[6],
+            }
+            for r in expiring
+        ],
+        ledger_version=current_version(),
+        generated_at=datetime.now(),
+    )
+
+@router.get("/dashboard", response_model=DashboardReport)
+def get_dashboard(
+    date_debut: Optional[datetime] = Query(None, description="Début de période (défaut: 1er du mois)"),
+    date_fin: Optional[datetime] = Query(None, description="Fin de période (défaut: fin de journée)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Indicateurs du tableau de bord en un appel, servis depuis le cache tant qu'aucune écriture de stock n'a eu lieu."""
+    today = date.today()
+    if date_debut is None:
+        date_debut = datetime.combine(today.replace(day=1), time.min)
+    if date_fin is None:
+        date_fin = datetime.combine(today, time.max)
+
+    # Le JSON est mis en cache déjà encodé : un hit ne revalide ni ne resérialise rien
+    body = _dashboard_cache.get_or_compute(
+        (date_debut, date_fin, today),
+        lambda: compute_dashboard(db, date_debut, date_fin, today).model_dump_json().encode("utf-8"),
+    )
+    return Response(content=body, media_type="application/json")
+
+@router.get("/exit-analytics")
+def get_exit_analytics(
+    granularity: str = Query("month", pattern="^(" + "|".join(GRANULARITIES) + ")$"),
+    date_debut: Optional[datetime] = Query(None, description="Début de période (défaut: un an avant date_fin)"),
+    date_fin: Optional[datetime] = Query(None, description="Fin de période (défaut: fin de journée)"),
+    product_id: Optional[List[int]] = Query(None, description="Produits (paramètre répétable)"),
+    type_sortie: Optional[List[TypeSortie]] = Query(None, description="Types de sortie (paramètre répétable)"),
+    top: Optional[int] = Query(None, ge=1, le=1000, description="Seulement les N produits les plus sortis (kg)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", daily=True))
+):
+    """Sorties par période, produit et type de sortie, en colonnes (voir app/analytics.py)."""
+    date_debut, date_fin = default_period(date_debut, date_fin)
+    products = tuple(sorted(set(product_id or ())))
+    types = tuple(sorted({t.value for t in type_sortie or ()}))
+
+    body = _analytics_cache.get_or_compute(
+        (granularity, date_debut, date_fin, products, types, top),
+        lambda: orjson.dumps(exit_series(db, granularity, date_debut, date_fin, list(products), list(types), top)),
+    )
+    return Response(content=body, media_type="application/json")
+
+def get_abc_rows(db: Session, date_debut: datetime, date_fin: datetime, a_pct: float, b_pct: float):
+    """Classement ABC de la période, mis en cache jusqu'à la prochaine écriture de sorties ou de produits."""
+    if b_pct < a_pct:
+        raise HTTPException(status_code=400, detail="b_pct must be greater than or equal to a_pct")
+    return _abc_cache.get_or_compute(
+        (date_debut, date_fin, a_pct, b_pct),
+        lambda: abc_classification(db, date_debut, date_fin, a_pct / 100.0, b_pct / 100.0),
+    )
+
+@router.get("/abc")
+def get_abc_classification(
+    date_debut: Optional[datetime] = Query(None, description="Début de période (défaut: un an avant date_fin)"),
+    date_fin: Optional[datetime] = Query(None, description="Fin de période (défaut: fin de journée)"),
+    a_pct: float = Query(80.0, gt=0, le=100, description="Part cumulée couverte par la classe A (%)"),
+    b_pct: float = Query(95.0, gt=0, le=100, description="Part cumulée couverte par les classes A et B (%)"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products", "stock_exits", "stock_exit_items", daily=True))
+):
+    """Classes ABC (Pareto) des produits par valeur et par volume sortis, par valeur décroissante."""
+    date_debut, date_fin = default_period(date_debut, date_fin)
+    return ORJSONResponse(get_abc_rows(db, date_debut, date_fin, a_pct, b_pct))
+
+@router.get("/reorder-suggestions")
+def get_reorder_suggestions(
+    lead_time_days: float = Query(7.0, ge=0, le=365, description="Délai de livraison (jours)"),
+    review_days: float = Query(7.0, ge=0, le=365, description="Jours couverts en plus du délai par une commande"),
+    z: float = Query(1.65, ge=0, le=5, description="Niveau de service (1.65 ≈ 95 %)"),
+    only_needed: bool = Query(True, description="Seulement les produits sous leur point de commande"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products", "product_demand", daily=True))
+):
+    """Couverture en jours et quantités à commander, d'après la consommation lissée (voir app/demand.py)."""
+    today = date.today()
+    body = _reorder_cache.get_or_compute(
+        (lead_time_days, review_days, z, only_needed, today),
+        lambda: orjson.dumps(reorder_suggestions(db, today, lead_time_days, review_days, z, only_needed)),
+    )
+    return Response(content=body, media_type="application/json")
+
 @router.get("/movements")
 def get_movements(
     product_id: Optional[int] = Query(None),
     date_debut: Optional[datetime] = Query(None),
     date_fin: Optional[datetime] = Query(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_movements"))
 ):
-    """Historique des mouvements (tous produits ou filtré par produit)."""
-    query = db.query(StockMovement)
-    if product_id:
-        query = query.filter(StockMovement.product_id == product_id)
-    if date_debut and date_fin:
-        query = query.filter(and_(StockMovement.created_at >= date_debut, StockMovement.created_at <= date_fin))
-    elif date_debut:
-        query = query.filter(StockMovement.created_at >= date_debut)
-    elif date_fin:
-        query = query.filter(StockMovement.created_at <= date_fin)
-    movements = query.order_by(StockMovement.created_at.desc()).all()
-    return movements
+    """
+    Historique des mouvements (tous produits ou filtré par produit). Les
+    exercices archivés ne sont lus que si la période est bornée (date_debut
+    et / ou date_fin).
+    """
+    where = (lambda t: [t.c.product_id == product_id]) if product_id else None
+    movements = history(db, StockMovement.__table__, "created_at", date_debut, date_fin, where)
+    return rows_response(db.execute(select(movements).order_by(movements.c.created_at.desc())).all())
 
 @router.get("/movements/{product_id}")
 def get_product_movements(
@@ -137,35 +322,25 @@ def get_product_movements(
     date_debut: Optional[datetime] = Query(None),
     date_fin: Optional[datetime] = Query(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_movements"))
 ):
-    """Historique des mouvements pour un produit"""
-    
-    query = db.query(StockMovement).filter(StockMovement.product_id == product_id)
-   
-    if date_debut and date_fin:
-        query = query.filter(
-            and_(StockMovement.created_at >= date_debut, StockMovement.created_at <= date_fin)
-        )
-    elif date_debut:
-        query = query.filter(StockMovement.created_at >= date_debut)
-    elif date_fin:
-        query = query.filter(StockMovement.created_at <= date_fin)
-    
-    movements = query.order_by(StockMovement.created_at.desc()).all()
-    return movements
+    """Historique des mouvements pour un produit (exercices archivés compris si la période est bornée)"""
+    movements = history(
+        db, StockMovement.__table__, "created_at", date_debut, date_fin,
+        lambda t: [t.c.product_id == product_id],
+    )
+    return rows_response(db.execute(select(movements).order_by(movements.c.created_at.desc())).all())
 
 @router.get("/low-stock")
 def get_low_stock_alert(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
     """Produits avec stock faible (en dessous du seuil d'alerte)"""
     
-    products = db.query(Product).filter(
-        (Product.stock_actuel_kg <= Product.seuil_alerte) |
-        (Product.stock_actuel_cartons <= Product.seuil_alerte)
-    ).all()
+    products = db.query(Product).filter(low_stock_condition).all()
     
     return {
         "produits_alerte": len(products),
@@ -175,7 +350,8 @@ def get_low_stock_alert(
                 "code_produit": product.code_produit,
                 "stock_kg": product.stock_actuel_kg,
                 "stock_cartons": product.stock_actuel_cartons,
-                "seuil_alerte": product.seuil_alerte
+                "seuil_alerte": product.seuil_alerte,
+                "seuil_alerte_cartons": product.seuil_alerte_cartons
             }
             for product in products
         ]
@@ -216,6 +392,9 @@ def get_expired_products(
 
 def create_pdf_report(content: dict, title: str) -> str:
     """Créer un rapport PDF"""
+    # reportlab est importé au premier PDF : il ralentissait le démarrage
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
     
     # Créer un fichier temporaire
     temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
@@ -328,6 +507,56 @@ def download_stock_summary_excel(
     except ImportError:
         raise HTTPException(status_code=500, detail="openpyxl not available for Excel export")
 
+@router.get("/excel/abc")
+def download_abc_excel(
+    date_debut: Optional[datetime] = Query(None),
+    date_fin: Optional[datetime] = Query(None),
+    a_pct: float = Query(80.0, gt=0, le=100),
+    b_pct: float = Query(95.0, gt=0, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Télécharger le classement ABC en Excel"""
+    date_debut, date_fin = default_period(date_debut, date_fin)
+    rows = get_abc_rows(db, date_debut, date_fin, a_pct, b_pct)
+
+    try:
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment
+    except ImportError:
+        raise HTTPException(status_code=500, detail="openpyxl not available for Excel export")
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title="Classement ABC")
+    ws.append([f"Sorties du {date_debut.strftime('%d/%m/%Y')} au {date_fin.strftime('%d/%m/%Y')} "
+               f"(A : {a_pct:g} %, B : {b_pct:g} %)"])
+    headers = ["Rang", "Code Produit", "Nom Produit", "Valeur sortie", "Part cumulée valeur", "Classe valeur",
+               "Sorties KG", "Sorties Cartons", "Lignes", "Rang volume", "Part cumulée volume", "Classe volume"]
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center")
+        header_cells.append(cell)
+    ws.append(header_cells)
+    for row in rows:
+        ws.append([
+            row["rang_valeur"], row["code_produit"], row["nom_produit"], row["valeur"],
+            round(row["part_cumulee_valeur"], 4), row["classe_valeur"],
+            row["qte_kg"], row["qte_cartons"], row["lignes"],
+            row["rang_volume"], round(row["part_cumulee_volume"], 4), row["classe_volume"],
+        ])
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+    wb.save(temp_file.name)
+    temp_file.close()
+    return FileResponse(
+        temp_file.name,
+        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        filename=f"classement_abc_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    )
+
 @router.get("/pdf/stock-reception")
 def download_stock_reception_pdf(
     num_reception: str = Query(...),
@@ -335,6 +564,9 @@ def download_stock_reception_pdf(
     current_user: User = Depends(get_current_active_user)
 ):
     """Télécharger le bon d'entrée complet (réception) en PDF avec toutes les lignes (items)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     entries = db.query(StockEntry).filter(StockEntry.num_reception == num_reception).all()
     if not entries:
         raise HTTPException(status_code=404, detail="Aucune entrée trouvée pour ce numéro de réception")
@@ -409,7 +641,8 @@ def download_stock_reception_pdf(
 @router.get("/export-data")
 def export_data(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("products"))
 ):
     """Exporter les données de stock en JSON."""
     try:
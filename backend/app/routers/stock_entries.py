@@ -1,19 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db, StockEntry, StockEntryItem, Product, StockMovement
+from app.database import get_db, get_product_for_update, StockEntry, StockEntryItem
 from app.schemas import (
     StockEntryBatchCreate,
     StockEntryItem as StockEntryItemSchema,
     StockEntry as StockEntrySchema,
+    StockEntryDocumentPage,
     StockEntryUpdate,
+    DocumentLine,
     User,
 )
 from app.routers.auth import get_current_active_user
+from app.httpcache import conditional_get
+from app.documents import document_lines, list_documents
+from app.journal import record_movement
 
 router = APIRouter()
 
@@ -45,15 +50,14 @@ class StockEntryCreateFlexible(BaseModel):
 # Utilitaires
 
 def update_product_stock_on_entry(db: Session, product_id: int, qte_kg: float, qte_cartons: int):
-    """Met à jour le stock du produit (ajout) et renvoie (old_kg, old_cartons, new_kg, new_cartons)."""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    """Met à jour le stock du produit (ajout, sans commit) et renvoie (old_kg, old_cartons, new_kg, new_cartons)."""
+    product = get_product_for_update(db, product_id)
     if product is None:
         raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
     old_kg = float(product.stock_actuel_kg or 0.0)
     old_cartons = int(product.stock_actuel_cartons or 0)
     product.stock_actuel_kg = old_kg + float(qte_kg or 0.0)
     product.stock_actuel_cartons = old_cartons + int(qte_cartons or 0)
-    db.commit()
     return old_kg, old_cartons, product.stock_actuel_kg, product.stock_actuel_cartons
 
 
@@ -70,7 +74,8 @@ def create_stock_movement(
     reference_type: str,
     user_id: int,
 ):
-    movement = StockMovement(
+    record_movement(
+        db,
         product_id=product_id,
         type_mouvement="ENTREE",
         qte_kg_avant=qte_kg_avant,
@@ -83,8 +88,6 @@ def create_stock_movement(
         reference_type=reference_type,
         created_by=user_id,
     )
-    db.add(movement)
-    db.commit()
 
 
 def serialize_entry_item(item: StockEntryItem, header: StockEntry) -> dict:
@@ -125,25 +128,24 @@ def create_stock_entries_batch(
         created_by=current_user.id,
         remarque=payload.remarque,
     )
-    db.add(header)
-    db.commit()
-    db.refresh(header)
-
-    created_items = []
-    for it in payload.items:
-        # Ligne item
-        item = StockEntryItem(
-            entry_id=header.id,
+    items = [
+        StockEntryItem(
+            entry=header,
             product_id=it.product_id,
             qte_kg=it.qte_kg,
             qte_cartons=it.qte_cartons,
             date_peremption=it.date_peremption,
             remarque=it.remarque,
         )
-        db.add(item)
-        db.commit()
-        db.refresh(item)
+        for it in payload.items
+    ]
+    db.add(header)
+    db.add_all(items)
+    # Un seul aller-retour pour l'entête et les lignes : leurs ids sont lus au flush
+    db.flush()
 
+    created_items = []
+    for it, item in zip(payload.items, items):
         # MAJ stock + mouvement
         old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_entry(
             db, it.product_id, it.qte_kg, it.qte_cartons
@@ -163,6 +165,7 @@ def create_stock_entries_batch(
         )
         created_items.append(serialize_entry_item(item, header))
 
+    db.commit()
     return created_items
 
 
@@ -199,22 +202,18 @@ def create_stock_entry(
         remarque=entry.remarque,
         created_by=current_user.id,
     )
-    db.add(header)
-    db.commit()
-    db.refresh(header)
-
     # Créer l'item
     item = StockEntryItem(
-        entry_id=header.id,
+        entry=header,
         product_id=entry.product_id,
         qte_kg=float(entry.qte_kg or 0.0),
         qte_cartons=int(entry.qte_cartons or 0),
         date_peremption=entry.date_peremption,
         remarque=entry.remarque,
     )
+    db.add(header)
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    db.flush()
 
     # MAJ stock + mouvement
     old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_entry(
@@ -234,6 +233,7 @@ def create_stock_entry(
         user_id=current_user.id,
     )
 
+    db.commit()
     return [serialize_entry_item(item, header)]
 
 
@@ -247,9 +247,14 @@ def read_stock_entries(
     num_reception: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_entries", "stock_entry_items", "products")),
 ):
     # Jointure items + entête
-    q = db.query(StockEntryItem, StockEntry).join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+    q = (
+        db.query(StockEntryItem, StockEntry)
+        .join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+        .options(joinedload(StockEntryItem.product))
+    )
 
     if product_id:
         q = q.filter(StockEntryItem.product_id == product_id)
@@ -272,11 +277,52 @@ def read_stock_entries(
     ]
 
 
+# Déclarées avant /{entry_id} : « documents » n'est pas un id de ligne
+@router.get("/documents", response_model=StockEntryDocumentPage)
+def read_entry_documents(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la page précédente"),
+    date_debut: Optional[datetime] = Query(None),
+    date_fin: Optional[datetime] = Query(None),
+    num_reception: Optional[str] = Query(None),
+    num_facture: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_entries", "stock_entry_items")),
+):
+    """Réceptions (une ligne par entête) avec nombre de lignes, de produits et totaux kg / cartons."""
+    criteria = []
+    if date_debut:
+        criteria.append(StockEntry.date_reception >= date_debut)
+    if date_fin:
+        criteria.append(StockEntry.date_reception <= date_fin)
+    if num_reception:
+        criteria.append(StockEntry.num_reception.ilike(f"%{num_reception}%"))
+    if num_facture:
+        criteria.append(StockEntry.num_facture.ilike(f"%{num_facture}%"))
+    return list_documents(
+        db, StockEntry, StockEntryItem, StockEntryItem.entry_id, StockEntry.date_reception,
+        criteria, cursor, limit,
+    )
+
+
+@router.get("/documents/{document_id}/lines", response_model=List[DocumentLine])
+def read_entry_document_lines(
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_entries", "stock_entry_items", "products")),
+):
+    """Toutes les lignes d'une réception, avec leur produit."""
+    return document_lines(db, StockEntry, StockEntryItem, StockEntryItem.entry_id, document_id)
+
+
 @router.get("/{entry_id}", response_model=StockEntrySchema)
 def read_stock_entry(
     entry_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_entries", "stock_entry_items", "products")),
 ):
     item = db.query(StockEntryItem).filter(StockEntryItem.id == entry_id).first()
     if item is None:
@@ -318,10 +364,6 @@ def update_stock_entry(
         if field in data:
             setattr(item, field, data[field])
 
-    db.commit()
-    db.refresh(item)
-    db.refresh(header)
-
     # Ajuster le stock si quantités/produit ont changé
     new_product_id = item.product_id
     new_qte_kg = float(item.qte_kg or 0.0)
@@ -329,17 +371,17 @@ def update_stock_entry(
 
     if old_product_id != new_product_id or old_qte_kg != new_qte_kg or old_qte_cartons != new_qte_cartons:
         # Annuler l'ancien impact
-        prod_old = db.query(Product).filter(Product.id == old_product_id).first()
+        prod_old = get_product_for_update(db, old_product_id)
         if prod_old:
             prod_old.stock_actuel_kg = float(prod_old.stock_actuel_kg or 0.0) - old_qte_kg
             prod_old.stock_actuel_cartons = int(prod_old.stock_actuel_cartons or 0) - old_qte_cartons
         # Appliquer le nouveau
-        prod_new = db.query(Product).filter(Product.id == new_product_id).first()
+        prod_new = get_product_for_update(db, new_product_id)
         if prod_new:
             prod_new.stock_actuel_kg = float(prod_new.stock_actuel_kg or 0.0) + new_qte_kg
             prod_new.stock_actuel_cartons = int(prod_new.stock_actuel_cartons or 0) + new_qte_cartons
-        db.commit()
 
+    db.commit()
     return serialize_entry_item(item, header)
 
 
@@ -357,20 +399,20 @@ def delete_stock_entry(
         raise HTTPException(status_code=404, detail="Stock entry header not found")
 
     # Ajuster le stock en retirant les quantités de cette ligne
-    product = db.query(Product).filter(Product.id == item.product_id).first()
+    product = get_product_for_update(db, item.product_id)
     if product:
         product.stock_actuel_kg = float(product.stock_actuel_kg or 0.0) - float(item.qte_kg or 0.0)
         product.stock_actuel_cartons = int(product.stock_actuel_cartons or 0) - int(item.qte_cartons or 0)
 
     # Supprimer la ligne
     db.delete(item)
-    db.commit()
+    db.flush()
 
     # Si plus aucune ligne sur l'entête, supprimer l'entête
     remaining = db.query(StockEntryItem).filter(StockEntryItem.entry_id == header.id).count()
     if remaining == 0:
         db.delete(header)
-        db.commit()
+    db.commit()
 
     return {"message": "Stock entry item deleted successfully"}
 
@@ -380,10 +422,12 @@ def get_entries_by_product(
     product_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_entries", "stock_entry_items", "products")),
 ):
     q = (
         db.query(StockEntryItem, StockEntry)
         .join(StockEntry, StockEntryItem.entry_id == StockEntry.id)
+        .options(joinedload(StockEntryItem.product))
         .filter(StockEntryItem.product_id == product_id)
     )
     rows = q.all()
@@ -410,26 +454,21 @@ def add_multiple_stock_entries(
             num_packing_liste=entry.num_packing_liste,
             created_by=0  # Default value for mobile entries
         )
-        db.add(header)
-        db.commit()
-        db.refresh(header)
-
-        created_items = []
-        for it in entry.items:
-            item = StockEntryItem(
-                entry_id=header.id,
+        created_items = [
+            StockEntryItem(
+                entry=header,
                 product_id=it.product_id,
                 qte_kg=it.qte_kg,
                 qte_cartons=it.qte_cartons,
                 date_peremption=it.date_peremption,
                 remarque=it.remarque,
             )
-            db.add(item)
-            db.commit()
-            db.refresh(item)
-
-            created_items.append(item)
+            for it in entry.items
+        ]
+        db.add(header)
+        db.add_all(created_items)
 
         all_created_items.extend(created_items)
 
+    db.commit()
     return all_created_items
@@ -1,18 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.database import get_db, StockExit, StockExitItem, Product, StockMovement
+from app.database import get_db, get_product_for_update, get_products_for_update, StockExit, StockExitItem, Product
 from app.schemas import (
     StockExit as StockExitSchema,  # ancien schéma item (aplati)
+    StockExitDocumentPage,
     StockExitUpdate,
     TypeSortie,
+    DocumentLine,
     User,
 )
 from app.routers.auth import get_current_active_user
+from app.httpcache import conditional_get
+from app.documents import document_lines, list_documents
+from app.journal import record_movement
+from app.demand import record_demand
 
 router = APIRouter()
 
@@ -57,17 +63,57 @@ def ensure_stock_available(product: Product, qte_kg: float, qte_cartons: int):
         )
 
 
-def update_product_stock_on_exit(db: Session, product_id: int, qte_kg: float, qte_cartons: int):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
-    ensure_stock_available(product, qte_kg, qte_cartons)
-    old_kg = float(product.stock_actuel_kg or 0.0)
-    old_cartons = int(product.stock_actuel_cartons or 0)
-    product.stock_actuel_kg = old_kg - float(qte_kg or 0.0)
-    product.stock_actuel_cartons = old_cartons - int(qte_cartons or 0)
-    db.commit()
-    return old_kg, old_cartons, product.stock_actuel_kg, product.stock_actuel_cartons
+def post_stock_exit(db: Session, header: StockExit, items: List[StockExitItem], user_id: int) -> List[StockExitItem]:
+    """
+    Comptabiliser une sortie : entête, lignes, décréments de stock et mouvements
+    (sans commit : l'appelant valide le tout en une fois).
+
+    Les lignes sont regroupées par produit et la demande cumulée est comparée
+    au stock des produits, chargés et verrouillés en une seule requête : deux
+    lignes du même produit ne peuvent pas dépasser ensemble le stock disponible.
+    Rien n'est écrit si une ligne est refusée.
+    """
+    demand = {}
+    for item in items:
+        kg, cartons = demand.get(item.product_id, (0.0, 0))
+        demand[item.product_id] = (kg + float(item.qte_kg or 0.0), cartons + int(item.qte_cartons or 0))
+
+    products = get_products_for_update(db, demand)
+    for product_id, (kg, cartons) in demand.items():
+        product = products.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product not found: {product_id}")
+        ensure_stock_available(product, kg, cartons)
+    record_demand(db, header.date_sortie, header.type_sortie, demand)
+
+    for item in items:
+        item.exit = header
+        # Référence forte : la session ne garde les objets propres que par référence faible,
+        # la sérialisation des lignes après le commit relirait sinon chaque produit.
+        item.product = products[item.product_id]
+    db.add(header)
+    db.add_all(items)
+    db.flush()  # ids des lignes (un INSERT multi-lignes), référencés par les mouvements
+
+    for item in items:
+        product = products[item.product_id]
+        old_kg = float(product.stock_actuel_kg or 0.0)
+        old_cartons = int(product.stock_actuel_cartons or 0)
+        product.stock_actuel_kg = old_kg - float(item.qte_kg or 0.0)
+        product.stock_actuel_cartons = old_cartons - int(item.qte_cartons or 0)
+        create_stock_movement_exit(
+            db,
+            item.product_id,
+            old_kg,
+            old_cartons,
+            item.qte_kg,
+            item.qte_cartons,
+            product.stock_actuel_kg,
+            product.stock_actuel_cartons,
+            reference_id=item.id,
+            user_id=user_id,
+        )
+    return items
 
 
 def create_stock_movement_exit(
@@ -82,7 +128,8 @@ def create_stock_movement_exit(
     reference_id: int,
     user_id: int,
 ):
-    movement = StockMovement(
+    record_movement(
+        db,
         product_id=product_id,
         type_mouvement="SORTIE",
         qte_kg_avant=qte_kg_avant,
@@ -95,8 +142,6 @@ def create_stock_movement_exit(
         reference_type="EXIT",
         created_by=user_id,
     )
-    db.add(movement)
-    db.commit()
 
 
 def serialize_exit_item(item: StockExitItem, header: StockExit) -> dict:
@@ -133,50 +178,19 @@ def create_stock_exit(
             prix_vente=payload.prix_vente,
             created_by=current_user.id,
         )
-        db.add(header)
-        db.commit()
-        db.refresh(header)
-
-        created = []
-        for it in payload.items:
-            # Vérifier stock
-            prod = db.query(Product).filter(Product.id == it.product_id).first()
-            if prod is None:
-                raise HTTPException(status_code=404, detail=f"Product not found: {it.product_id}")
-            ensure_stock_available(prod, it.qte_kg, it.qte_cartons)
-
-            # Créer item
-            item = StockExitItem(
-                exit_id=header.id,
+        items = [
+            StockExitItem(
                 product_id=it.product_id,
                 qte_kg=it.qte_kg,
                 qte_cartons=it.qte_cartons,
                 date_peremption=it.date_peremption,
             )
-            db.add(item)
-            db.commit()
-            db.refresh(item)
-
-            # MAJ stock + mouvement
-            old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_exit(
-                db, it.product_id, it.qte_kg, it.qte_cartons
-            )
-            create_stock_movement_exit(
-                db,
-                it.product_id,
-                old_kg,
-                old_cartons,
-                it.qte_kg,
-                it.qte_cartons,
-                new_kg,
-                new_cartons,
-                reference_id=item.id,
-                user_id=current_user.id,
-            )
-
-            created.append(serialize_exit_item(item, header))
-
-        return created
+            for it in payload.items
+        ]
+        post_stock_exit(db, header, items, current_user.id)
+        # Une seule transaction : une ligne refusée annule toute la sortie
+        db.commit()
+        return [serialize_exit_item(item, header) for item in items]
 
     # Cas rétrocompat ligne unique
     if payload.product_id is None:
@@ -190,37 +204,14 @@ def create_stock_exit(
         prix_vente=payload.prix_vente,
         created_by=current_user.id,
     )
-    db.add(header)
-    db.commit()
-    db.refresh(header)
-
     item = StockExitItem(
-        exit_id=header.id,
         product_id=payload.product_id,
         qte_kg=float(payload.qte_kg or 0.0),
         qte_cartons=int(payload.qte_cartons or 0),
         date_peremption=payload.date_peremption,
     )
-    db.add(item)
+    post_stock_exit(db, header, [item], current_user.id)
     db.commit()
-    db.refresh(item)
-
-    old_kg, old_cartons, new_kg, new_cartons = update_product_stock_on_exit(
-        db, payload.product_id, item.qte_kg, item.qte_cartons
-    )
-    create_stock_movement_exit(
-        db,
-        payload.product_id,
-        old_kg,
-        old_cartons,
-        item.qte_kg,
-        item.qte_cartons,
-        new_kg,
-        new_cartons,
-        reference_id=item.id,
-        user_id=current_user.id,
-    )
-
     return [serialize_exit_item(item, header)]
 
 
@@ -235,8 +226,13 @@ def read_stock_exits(
     num_facture: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", "products")),
 ):
-    q = db.query(StockExitItem, StockExit).join(StockExit, StockExitItem.exit_id == StockExit.id)
+    q = (
+        db.query(StockExitItem, StockExit)
+        .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .options(joinedload(StockExitItem.product))
+    )
 
     if product_id:
         q = q.filter(StockExitItem.product_id == product_id)
@@ -261,11 +257,52 @@ def read_stock_exits(
     ]
 
 
+# Déclarées avant /{exit_id} : « documents » n'est pas un id de ligne
+@router.get("/documents", response_model=StockExitDocumentPage)
+def read_exit_documents(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor de la page précédente"),
+    date_debut: Optional[datetime] = Query(None),
+    date_fin: Optional[datetime] = Query(None),
+    type_sortie: Optional[TypeSortie] = Query(None),
+    num_facture: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items")),
+):
+    """Bons de sortie (une ligne par entête) avec nombre de lignes, de produits et totaux kg / cartons."""
+    criteria = []
+    if date_debut:
+        criteria.append(StockExit.date_sortie >= date_debut)
+    if date_fin:
+        criteria.append(StockExit.date_sortie <= date_fin)
+    if type_sortie:
+        criteria.append(StockExit.type_sortie == type_sortie)
+    if num_facture:
+        criteria.append(StockExit.num_facture.ilike(f"%{num_facture}%"))
+    return list_documents(
+        db, StockExit, StockExitItem, StockExitItem.exit_id, StockExit.date_sortie,
+        criteria, cursor, limit,
+    )
+
+
+@router.get("/documents/{document_id}/lines", response_model=List[DocumentLine])
+def read_exit_document_lines(
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", "products")),
+):
+    """Toutes les lignes d'un bon de sortie, avec leur produit."""
+    return document_lines(db, StockExit, StockExitItem, StockExitItem.exit_id, document_id)
+
+
 @router.get("/{exit_id}", response_model=StockExitSchema)
 def read_stock_exit(
     exit_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", "products")),
 ):
     item = db.query(StockExitItem).filter(StockExitItem.id == exit_id).first()
     if item is None:
@@ -308,12 +345,12 @@ def update_stock_exit(
             setattr(item, field, data[field])
 
     # Vérifier disponibilité stock pour le nouveau état
-    prod_new = db.query(Product).filter(Product.id == item.product_id).first()
+    prod_new = get_product_for_update(db, item.product_id)
     if prod_new is None:
         raise HTTPException(status_code=404, detail=f"Product not found: {item.product_id}")
 
     # Remettre l'ancien stock
-    prod_old = db.query(Product).filter(Product.id == old_product_id).first()
+    prod_old = get_product_for_update(db, old_product_id)
     if prod_old:
         prod_old.stock_actuel_kg = float(prod_old.stock_actuel_kg or 0.0) + old_qte_kg
         prod_old.stock_actuel_cartons = int(prod_old.stock_actuel_cartons or 0) + old_qte_cartons
@@ -324,9 +361,6 @@ def update_stock_exit(
     prod_new.stock_actuel_cartons = int(prod_new.stock_actuel_cartons or 0) - int(item.qte_cartons or 0)
 
     db.commit()
-    db.refresh(item)
-    db.refresh(header)
-
     return serialize_exit_item(item, header)
 
 
@@ -344,19 +378,19 @@ def delete_stock_exit(
         raise HTTPException(status_code=404, detail="Stock exit header not found")
 
     # Remise du stock
-    prod = db.query(Product).filter(Product.id == item.product_id).first()
+    prod = get_product_for_update(db, item.product_id)
     if prod:
         prod.stock_actuel_kg = float(prod.stock_actuel_kg or 0.0) + float(item.qte_kg or 0.0)
         prod.stock_actuel_cartons = int(prod.stock_actuel_cartons or 0) + int(item.qte_cartons or 0)
 
     db.delete(item)
-    db.commit()
+    db.flush()
 
     # Supprimer entête si plus d'items
     remaining = db.query(StockExitItem).filter(StockExitItem.exit_id == header.id).count()
     if remaining == 0:
         db.delete(header)
-        db.commit()
+    db.commit()
 
     return {"message": "Stock exit item deleted successfully"}
 
@@ -366,10 +400,12 @@ def get_exits_by_product(
     product_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", "products")),
 ):
     q = (
         db.query(StockExitItem, StockExit)
         .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .options(joinedload(StockExitItem.product))
         .filter(StockExitItem.product_id == product_id)
     )
     rows = q.all()
@@ -381,7 +417,13 @@ def get_exits_by_type(
     type_sortie: TypeSortie,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    _etag: None = Depends(conditional_get("stock_exits", "stock_exit_items", "products")),
 ):
-    q = db.query(StockExitItem, StockExit).join(StockExit, StockExitItem.exit_id == StockExit.id).filter(StockExit.type_sortie == type_sortie)
+    q = (
+        db.query(StockExitItem, StockExit)
+        .join(StockExit, StockExitItem.exit_id == StockExit.id)
+        .options(joinedload(StockExitItem.product))
+        .filter(StockExit.type_sortie == type_sortie)
+    )
     rows = q.all()
     return [serialize_exit_item(item, header) for (item, header) in rows]
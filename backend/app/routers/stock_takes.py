@@ -0,0 +1,156 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db, StockTake
+from app.schemas import (
+    StockTakeCreate,
+    StockTake as StockTakeSchema,
+    StockTakeCountInput,
+    StockTakeCountResult,
+    StockTakeStatus,
+    StockTakeVariance,
+    User,
+)
+from app.routers.auth import get_current_active_user
+from app.responses import rows_response
+from app.stocktake import (
+    StockTakeClosed,
+    StockTakeError,
+    cancel_stock_take,
+    get_open,
+    open_stock_take,
+    record_counts,
+    summary,
+    validate_stock_take,
+    variances,
+)
+
+router = APIRouter()
+
+UNCOUNTED = "^(ignore|zero)$"
+
+def _open_or_error(db: Session, stock_take_id: int, lock: bool = False) -> StockTake:
+    try:
+        return get_open(db, stock_take_id, lock=lock)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Stock take not found")
+    except StockTakeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+@router.post("/", response_model=StockTakeSchema)
+def create_stock_take(
+    payload: StockTakeCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Ouvrir un inventaire : le stock actuel de tous les produits est figé.
+    Les mouvements pendant le comptage restent possibles, l'écart est
+    appliqué au stock du moment de la validation.
+    """
+    stock_take = open_stock_take(db, payload.reference, payload.remarque, current_user.id)
+    return summary(db, stock_take)
+
+@router.get("/", response_model=List[StockTakeSchema])
+def list_stock_takes(
+    statut: Optional[StockTakeStatus] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    q = db.query(StockTake)
+    if statut:
+        q = q.filter(StockTake.statut == statut.value)
+    return [summary(db, stock_take) for stock_take in q.order_by(StockTake.id.desc()).all()]
+
+@router.get("/{stock_take_id}", response_model=StockTakeSchema)
+def get_stock_take(
+    stock_take_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    stock_take = db.query(StockTake).filter(StockTake.id == stock_take_id).first()
+    if not stock_take:
+        raise HTTPException(status_code=404, detail="Stock take not found")
+    return summary(db, stock_take)
+
+@router.post("/{stock_take_id}/counts", response_model=StockTakeCountResult)
+def post_counts(
+    stock_take_id: int,
+    counts: List[StockTakeCountInput],
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Lot de comptages d'un terminal (product_id ou code_barre). Par produit et
+    emplacement, le comptage le plus récent (`counted_at`) l'emporte : un lot
+    renvoyé ou arrivé en retard ne remplace pas une lecture plus récente.
+    Les produits inconnus sont renvoyés dans `unknown`, le reste est enregistré.
+    409 si la session est close, même si elle l'a été pendant l'envoi du lot.
+    """
+    stock_take = _open_or_error(db, stock_take_id)
+    try:
+        upserted, unknown = record_counts(
+            db, stock_take, [count.model_dump() for count in counts], current_user.id,
+        )
+    except StockTakeClosed as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except StockTakeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "received": len(counts),
+        "upserted": upserted,
+        "unknown": [counts[index] for index in unknown],
+    }
+
+@router.get("/{stock_take_id}/variances", response_model=List[StockTakeVariance])
+def get_variances(
+    stock_take_id: int,
+    uncounted: str = Query("ignore", pattern=UNCOUNTED),
+    only_differences: bool = Query(True),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Écarts par produit : quantité comptée (tous emplacements) moins quantité
+    figée. `uncounted=zero` : les produits non comptés sont comptés à zéro.
+    """
+    if not db.query(StockTake.id).filter(StockTake.id == stock_take_id).first():
+        raise HTTPException(status_code=404, detail="Stock take not found")
+    return rows_response(db.connection().execute(variances(stock_take_id, uncounted, only_differences)).all())
+
+@router.post("/{stock_take_id}/validate", response_model=StockTakeSchema)
+def validate(
+    stock_take_id: int,
+    uncounted: str = Query("ignore", pattern=UNCOUNTED),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Valider l'inventaire : un ajustement (et son mouvement) par écart, tous
+    enregistrés avec les nouveaux stocks en un seul commit. Rien n'est écrit
+    si un stock devenait négatif.
+
+    Sécurisé: réservé aux administrateurs.
+    """
+    if not getattr(current_user, "is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    _open_or_error(db, stock_take_id)
+    try:
+        stock_take = validate_stock_take(db, stock_take_id, current_user.id, uncounted)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Stock take not found")
+    except StockTakeClosed as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except StockTakeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return summary(db, stock_take)
+
+@router.post("/{stock_take_id}/cancel", response_model=StockTakeSchema)
+def cancel(
+    stock_take_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    _open_or_error(db, stock_take_id)
+    return summary(db, cancel_stock_take(db, stock_take_id, current_user.id))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
@@ -56,7 +56,8 @@ class ProductBase(BaseModel):
     unite_cartons: bool = True
     prix_achat: float = 0.0
     prix_vente: float = 0.0
-    seuil_alerte: float = 0.0
+    seuil_alerte: float = 0.0  # seuil en kg
+    seuil_alerte_cartons: int = 0
 
 class ProductCreate(ProductBase):
     pass
@@ -71,6 +72,7 @@ class ProductUpdate(BaseModel):
     prix_achat: Optional[float] = None
     prix_vente: Optional[float] = None
     seuil_alerte: Optional[float] = None
+    seuil_alerte_cartons: Optional[int] = None
 
 class Product(ProductBase):
     id: int
@@ -183,6 +185,54 @@ class StockExit(StockExitBase):
     class Config:
         from_attributes = True
 
+# Documents (entête + totaux de ses lignes), pour les listes au niveau réception / bon de sortie
+class DocumentTotals(BaseModel):
+    nb_lignes: int
+    nb_produits: int
+    total_kg: float
+    total_cartons: int
+
+class StockEntryDocument(DocumentTotals):
+    id: int
+    date_reception: datetime
+    num_reception: str
+    num_reception_carnet: Optional[str] = None
+    num_facture: Optional[str] = None
+    num_packing_liste: Optional[str] = None
+    remarque: Optional[str] = None
+    created_by: int
+    created_at: Optional[datetime] = None
+
+class StockExitDocument(DocumentTotals):
+    id: int
+    date_sortie: datetime
+    num_facture: Optional[str] = None
+    type_sortie: str
+    prix_vente: Optional[float] = None
+    remarque: Optional[str] = None
+    created_by: int
+    created_at: Optional[datetime] = None
+
+class StockEntryDocumentPage(BaseModel):
+    items: List[StockEntryDocument]
+    next_cursor: Optional[str] = None
+
+class StockExitDocumentPage(BaseModel):
+    items: List[StockExitDocument]
+    next_cursor: Optional[str] = None
+
+class DocumentLine(BaseModel):
+    id: int
+    product_id: int
+    product: Product
+    qte_kg: float
+    qte_cartons: int
+    date_peremption: Optional[datetime] = None
+    remarque: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 # Schémas pour les mouvements de stock
 class StockMovement(BaseModel):
     id: int
@@ -254,3 +304,102 @@ class PeriodReport(BaseModel):
     total_entrees: int
     total_sorties: int
     valeur_stock: float
+
+# Schémas pour le tableau de bord
+class DashboardLowStockItem(BaseModel):
+    product_id: int
+    code_produit: str
+    nom_produit: str
+    stock_kg: float
+    stock_cartons: int
+    seuil_alerte: float
+    seuil_alerte_cartons: int
+
+class DashboardExpiringItem(BaseModel):
+    product_id: int
+    code_produit: str
+    nom_produit: str
+    date_peremption: datetime
+    qte_kg: float
+    qte_cartons: int
+    num_reception: str
+
+class DashboardReport(BaseModel):
+    date_debut: datetime
+    date_fin: datetime
+    total_produits: int
+    total_entrees: int
+    total_sorties: int
+    valeur_stock: float
+    stock_total_kg: float
+    stock_total_cartons: int
+    entrees_kg: float
+    sorties_kg: float
+    produits_alerte: int
+    produits_expirant: int
+    low_stock: List[DashboardLowStockItem]
+    expiring: List[DashboardExpiringItem]
+    ledger_version: int
+    generated_at: datetime
+
+# Schémas pour les alertes de stock
+class StockAlertEvent(BaseModel):
+    product_id: int
+    code_produit: str
+    nom_produit: str
+    etat: str  # "bas" (passage sous le seuil) ou "normal" (retour au-dessus)
+    stock_kg: float
+    stock_cartons: int
+    seuil_alerte: float
+    seuil_alerte_cartons: int
+
+# Schémas pour les inventaires physiques
+class StockTakeStatus(str, Enum):
+    EN_COURS = "en_cours"
+    VALIDEE = "validee"
+    ANNULEE = "annulee"
+
+class StockTakeCreate(BaseModel):
+    reference: str
+    remarque: Optional[str] = None
+
+class StockTake(BaseModel):
+    id: int
+    reference: str
+    statut: StockTakeStatus
+    remarque: Optional[str] = None
+    started_by: int
+    started_at: Optional[datetime] = None
+    closed_by: Optional[int] = None
+    closed_at: Optional[datetime] = None
+    ajustements: int = 0
+    produits_figes: int = 0
+    produits_comptes: int = 0
+    comptages: int = 0
+
+class StockTakeCountInput(BaseModel):
+    # product_id ou code_barre (lecture du scanner)
+    product_id: Optional[int] = None
+    code_barre: Optional[str] = None
+    emplacement: str = ""
+    qte_kg: float = Field(0.0, ge=0)
+    qte_cartons: int = Field(0, ge=0)
+    counted_at: Optional[datetime] = None  # horodatage du terminal, sinon réception par le serveur
+    device_id: Optional[str] = None
+
+class StockTakeCountResult(BaseModel):
+    received: int
+    upserted: int
+    unknown: List[StockTakeCountInput]
+
+class StockTakeVariance(BaseModel):
+    product_id: int
+    code_produit: str
+    nom_produit: str
+    fige_kg: float
+    fige_cartons: int
+    compte_kg: float
+    compte_cartons: int
+    ecart_kg: float
+    ecart_cartons: int
+    emplacements: int
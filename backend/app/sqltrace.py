@@ -0,0 +1,197 @@
+"""
+Trace SQL par requête et journal des requêtes lentes (opt-in).
+
+Variables d'environnement :
+- `SQL_TRACE=1` : enregistre chaque requête SQL d'une requête HTTP (texte,
+  types des paramètres — jamais leurs valeurs —, durée, fonction du router
+  appelante). Les dernières traces sont consultables par un administrateur
+  (`GET /api/maintenance/sql-trace`) ;
+- `SLOW_QUERY_MS` (défaut 200, implicite avec SQL_TRACE) : au-delà, la
+  requête est écrite dans le journal tournant `SLOW_QUERY_LOG`
+  (défaut ./slow_queries.log) ;
+- `SERVER_TIMING=1` (implicite avec SQL_TRACE) : ajoute l'en-tête
+  `Server-Timing: db;dur=...` visible dans les outils du navigateur.
+
+Désactivé, le module n'installe aucun hook.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from app.database import engine
+
+TRACE_ENABLED = os.getenv("SQL_TRACE", "0").lower() in ("1", "true", "yes", "on")
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1" if TRACE_ENABLED else "0").lower() in ("1", "true", "yes", "on")
+SLOW_LOG_ENABLED = TRACE_ENABLED or "SLOW_QUERY_MS" in os.environ
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "./slow_queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+RECENT_TRACES = int(os.getenv("SQL_TRACE_KEEP", "50"))
+
+_ROUTERS_DIR = os.path.join("app", "routers")
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+
+class RequestTrace:
+    __slots__ = ("method", "path", "route", "queries", "statements", "db_ms", "total_ms")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.queries = 0
+        self.statements: List[dict] = []
+        self.db_ms = 0.0
+        self.total_ms = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "total_ms": round(self.total_ms, 3),
+            "db_ms": round(self.db_ms, 3),
+            "queries": self.queries,
+            "statements": self.statements,
+        }
+
+
+_current: ContextVar[Optional[RequestTrace]] = ContextVar("current_sql_trace", default=None)
+recent_traces: "deque[dict]" = deque(maxlen=RECENT_TRACES)
+_recent_lock = threading.Lock()
+
+
+def redact(parameters) -> object:
+    """Remplacer les valeurs des paramètres par leur type."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            # executemany : un seul jeu de paramètres suffit à décrire la forme
+            return {"rows": len(parameters), "each": redact(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def calling_router_function() -> str:
+    """Première fonction de `app/routers` dans la pile d'appel."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _ROUTERS_DIR in filename:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "-"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("trace_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["trace_start"].pop()) * 1000.0
+    trace = _current.get()
+    slow = SLOW_LOG_ENABLED and elapsed_ms >= SLOW_QUERY_MS
+    if not slow and (trace is None or not TRACE_ENABLED):
+        if trace is not None:
+            trace.queries += 1
+            trace.db_ms += elapsed_ms
+        return
+    entry = {
+        "sql": " ".join(statement.split()),
+        "params": redact(parameters),
+        "ms": round(elapsed_ms, 3),
+        "caller": calling_router_function(),
+    }
+    if trace is not None:
+        trace.queries += 1
+        trace.db_ms += elapsed_ms
+        if TRACE_ENABLED:
+            trace.statements.append(entry)
+    if slow:
+        slow_query_logger.warning(
+            "%.1fms %s %s params=%s",
+            elapsed_ms, entry["caller"], entry["sql"], entry["params"],
+        )
+
+
+def _on_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("trace_start"):
+        conn.info["trace_start"].pop()
+
+
+class SqlTraceMiddleware:
+    """Middleware ASGI : portée de trace par requête et en-tête Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _current.set(trace)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and SERVER_TIMING:
+                app_ms = (time.perf_counter() - start) * 1000.0
+                timing = (
+                    f'db;dur={trace.db_ms:.2f};desc="{trace.queries} queries", '
+                    f"app;dur={app_ms:.2f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if TRACE_ENABLED:
+                trace.total_ms = (time.perf_counter() - start) * 1000.0
+                route = scope.get("route")
+                trace.route = getattr(route, "path", None)
+                with _recent_lock:
+                    recent_traces.append(trace.as_dict())
+
+
+def get_recent_traces(limit: int = RECENT_TRACES) -> List[dict]:
+    with _recent_lock:
+        return list(recent_traces)[-limit:]
+
+
+def install(app) -> bool:
+    """Installer les hooks SQL et le middleware selon les options activées."""
+    if not (TRACE_ENABLED or SERVER_TIMING or SLOW_LOG_ENABLED):
+        return False
+    if SLOW_LOG_ENABLED and not slow_query_logger.handlers:
+        handler = RotatingFileHandler(
+            SLOW_QUERY_LOG, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.WARNING)
+        slow_query_logger.propagate = False
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _on_error)
+    if TRACE_ENABLED or SERVER_TIMING:
+        app.add_middleware(SqlTraceMiddleware)
+    return True
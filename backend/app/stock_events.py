@@ -0,0 +1,55 @@
+"""
+Flux des mouvements de stock.
+
+Chaque `StockMovement` inséré (entrées, sorties, ajustements, lots mobiles)
+est publié sur le bus d'événements après le commit, sous forme de delta
+compact, pour que les clients mettent à jour leur vue sans recharger les
+listes de produits ou de mouvements.
+"""
+from typing import Iterable
+
+from sqlalchemy import event
+
+from app.database import SessionLocal, StockMovement
+from app.events import bus
+
+MOVEMENT_TOPIC = "movements"
+
+
+def movement_delta(movement) -> dict:
+    """Delta compact : p=produit, t=type, dk/dc=variation kg/cartons, k/c=stock après."""
+    return {
+        "id": movement.id,
+        "p": movement.product_id,
+        "t": movement.type_mouvement,
+        "dk": movement.qte_kg_mouvement,
+        "dc": movement.qte_cartons_mouvement,
+        "k": movement.qte_kg_apres,
+        "c": movement.qte_cartons_apres,
+        "ref": movement.reference_type,
+        "rid": movement.reference_id,
+    }
+
+
+def publish_movements(deltas: Iterable[dict]):
+    for delta in deltas:
+        bus.publish(MOVEMENT_TOPIC, delta, product_id=delta["p"])
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_movements(session, flush_context):
+    new = [movement_delta(obj) for obj in session.new if isinstance(obj, StockMovement)]
+    if new:
+        session.info.setdefault("movement_events", []).extend(new)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_movements(session):
+    deltas = session.info.pop("movement_events", None)
+    if deltas:
+        publish_movements(sorted(deltas, key=lambda d: d["id"]))
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_movements(session, previous_transaction):
+    session.info.pop("movement_events", None)
@@ -0,0 +1,319 @@
+"""
+Inventaires physiques par sessions.
+
+- ouverture : le stock non nul de tous les produits est figé dans
+  `stock_take_snapshots` (un INSERT ... SELECT) ;
+- comptages : les terminaux envoient leurs lectures par lots ; une seule
+  ligne par (produit, emplacement), la plus récente (`counted_at`)
+  l'emporte, même si les lots arrivent dans le désordre (un UPSERT par lot) ;
+- écarts : quantité comptée (tous emplacements) moins quantité figée,
+  calculés par la base en une requête ;
+- validation : chaque écart est appliqué au stock *actuel* (les entrées et
+  sorties faites pendant le comptage sont conservées) par un ou deux
+  `StockAdjustment` (hausse / baisse) et leurs mouvements, en un seul commit.
+
+Les produits non comptés sont ignorés, ou remis à zéro avec
+`uncounted="zero"` (inventaire complet).
+"""
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, insert, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.database import (
+    Product,
+    StockAdjustment,
+    StockTake,
+    StockTakeCount,
+    StockTakeSnapshot,
+)
+from app.journal import record_movement
+
+OPEN = "en_cours"
+VALIDATED = "validee"
+CANCELLED = "annulee"
+
+
+class StockTakeError(ValueError):
+    """Opération impossible sur la session (déjà close, stock négatif...)."""
+
+
+class StockTakeClosed(StockTakeError):
+    """La session n'est plus en cours (validée ou annulée)."""
+
+
+def open_stock_take(db: Session, reference: str, remarque, user_id: int) -> StockTake:
+    """Ouvrir une session et figer le stock (commit compris)."""
+    stock_take = StockTake(reference=reference, remarque=remarque, statut=OPEN, started_by=user_id, ajustements=0)
+    db.add(stock_take)
+    db.flush()
+    db.execute(insert(StockTakeSnapshot).from_select(
+        ["stock_take_id", "product_id", "qte_kg", "qte_cartons"],
+        select(
+            literal(stock_take.id), Product.id,
+            func.coalesce(Product.stock_actuel_kg, 0.0), func.coalesce(Product.stock_actuel_cartons, 0),
+        ).where((Product.stock_actuel_kg != 0) | (Product.stock_actuel_cartons != 0)),
+    ))
+    db.commit()
+    return stock_take
+
+
+def get_open(db: Session, stock_take_id: int, lock: bool = False) -> StockTake:
+    """Session encore en cours ; avec `lock`, verrouillée jusqu'au commit.
+
+    Le verrou est un UPDATE sans effet plutôt qu'un SELECT ... FOR UPDATE :
+    sous SQLite aussi il prend le verrou d'écriture, si bien qu'aucun lot de
+    comptages ni aucune validation ne s'intercale entre la lecture du statut
+    et le commit.
+    """
+    query = db.query(StockTake).filter(StockTake.id == stock_take_id)
+    if lock:
+        db.execute(update(StockTake).where(StockTake.id == stock_take_id).values(statut=StockTake.statut))
+        query = query.populate_existing()
+    stock_take = query.first()
+    if stock_take is None:
+        raise LookupError(f"Stock take not found: {stock_take_id}")
+    if stock_take.statut != OPEN:
+        raise StockTakeClosed(f"Stock take {stock_take_id} is {stock_take.statut}")
+    return stock_take
+
+
+def _upsert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        raise StockTakeError(f"Upsert not supported on {dialect}")
+    statement = upsert(StockTakeCount)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=["stock_take_id", "product_id", "emplacement"],
+        set_={
+            "qte_kg": excluded.qte_kg,
+            "qte_cartons": excluded.qte_cartons,
+            "counted_at": excluded.counted_at,
+            "device_id": excluded.device_id,
+            "counted_by": excluded.counted_by,
+        },
+        # Dernière lecture gagnante : un lot en retard n'écrase pas un comptage plus récent
+        where=excluded.counted_at >= StockTakeCount.counted_at,
+    )
+
+
+def _local(moment):
+    # Horodatages comparés entre terminaux : tous en heure locale naïve, comme `datetime.now()`
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def record_counts(db: Session, stock_take: StockTake, counts: List[Dict], user_id: int) -> Tuple[int, List[int]]:
+    """Enregistrer un lot de comptages (commit compris).
+
+    `counts` : dicts product_id / code_barre, emplacement, qte_kg,
+    qte_cartons, counted_at, device_id. Renvoie (lignes écrites, index des
+    comptages dont le produit est inconnu). `StockTakeClosed` si la session
+    a été validée ou annulée entre-temps : rien n'est écrit.
+    """
+    now = datetime.now()
+    codes = {count["code_barre"] for count in counts if count.get("product_id") is None and count.get("code_barre")}
+    by_code = dict(db.execute(select(Product.code_barre, Product.id).where(Product.code_barre.in_(codes))).all()) if codes else {}
+    ids = {count["product_id"] for count in counts if count.get("product_id") is not None}
+    known = set(db.scalars(select(Product.id).where(Product.id.in_(ids)))) if ids else set()
+
+    latest: Dict[tuple, Dict] = {}
+    unknown = []
+    for index, count in enumerate(counts):
+        product_id = count.get("product_id")
+        if product_id is None:
+            product_id = by_code.get(count.get("code_barre"))
+        if product_id is None or (count.get("product_id") is not None and product_id not in known):
+            unknown.append(index)
+            continue
+        row = {
+            "stock_take_id": stock_take.id,
+            "product_id": product_id,
+            "emplacement": count.get("emplacement") or "",
+            "qte_kg": float(count.get("qte_kg") or 0.0),
+            "qte_cartons": int(count.get("qte_cartons") or 0),
+            "counted_at": _local(count.get("counted_at")) or now,
+            "device_id": count.get("device_id"),
+            "counted_by": user_id,
+        }
+        # Doublons dans le lot : un UPSERT ne peut toucher deux fois la même ligne
+        key = (product_id, row["emplacement"])
+        if key not in latest or row["counted_at"] >= latest[key]["counted_at"]:
+            latest[key] = row
+    # Statut relu sous verrou, dans la transaction de l'UPSERT
+    get_open(db, stock_take.id, lock=True)
+    if latest:
+        db.execute(_upsert(db), list(latest.values()))
+    db.commit()
+    return len(latest), unknown
+
+
+def variances(stock_take_id: int, uncounted: str = "ignore", only_differences: bool = True):
+    """Requête des écarts par produit : figé, compté (tous emplacements), écart."""
+    counted = (
+        select(
+            StockTakeCount.product_id,
+            func.sum(StockTakeCount.qte_kg).label("compte_kg"),
+            func.sum(StockTakeCount.qte_cartons).label("compte_cartons"),
+            func.count().label("emplacements"),
+        )
+        .where(StockTakeCount.stock_take_id == stock_take_id)
+        .group_by(StockTakeCount.product_id)
+        .subquery("counted")
+    )
+    snapshot = select(StockTakeSnapshot).where(StockTakeSnapshot.stock_take_id == stock_take_id).subquery("snapshot")
+    # Produits comptés (figé à zéro s'ils n'avaient pas de stock à l'ouverture)
+    parts = [
+        select(
+            counted.c.product_id,
+            func.coalesce(snapshot.c.qte_kg, 0.0).label("fige_kg"),
+            func.coalesce(snapshot.c.qte_cartons, 0).label("fige_cartons"),
+            counted.c.compte_kg,
+            counted.c.compte_cartons,
+            counted.c.emplacements,
+        ).outerjoin(snapshot, snapshot.c.product_id == counted.c.product_id)
+    ]
+    if uncounted == "zero":
+        parts.append(
+            select(
+                snapshot.c.product_id,
+                snapshot.c.qte_kg,
+                snapshot.c.qte_cartons,
+                literal(0.0),
+                literal(0),
+                literal(0),
+            ).where(~snapshot.c.product_id.in_(select(counted.c.product_id)))
+        )
+    rows = union_all(*parts).subquery("rows") if len(parts) > 1 else parts[0].subquery("rows")
+    ecart_kg = (rows.c.compte_kg - rows.c.fige_kg).label("ecart_kg")
+    ecart_cartons = (rows.c.compte_cartons - rows.c.fige_cartons).label("ecart_cartons")
+    statement = (
+        select(
+            rows.c.product_id, Product.code_produit, Product.nom_produit,
+            rows.c.fige_kg, rows.c.fige_cartons, rows.c.compte_kg, rows.c.compte_cartons,
+            ecart_kg, ecart_cartons, rows.c.emplacements,
+        )
+        .join(Product, Product.id == rows.c.product_id)
+        .order_by(rows.c.product_id)
+    )
+    if only_differences:
+        statement = statement.where((rows.c.compte_kg != rows.c.fige_kg) | (rows.c.compte_cartons != rows.c.fige_cartons))
+    return statement
+
+
+def validate_stock_take(db: Session, stock_take_id: int, user_id: int, uncounted: str = "ignore") -> StockTake:
+    """Appliquer tous les écarts : ajustements, mouvements et stocks en un seul commit."""
+    stock_take = get_open(db, stock_take_id, lock=True)
+    differences = variances(stock_take_id, uncounted).subquery("differences")
+    rows = db.execute(select(differences)).all()
+
+    # Produits concernés verrouillés en une requête, dans l'ordre des ids
+    products = {
+        product.id: product
+        for product in db.query(Product)
+        .filter(Product.id.in_(select(differences.c.product_id)))
+        .order_by(Product.id)
+        .with_for_update()
+        .populate_existing()
+    }
+
+    now = datetime.now()
+    negative = []
+    adjustments = []
+    for row in rows:
+        product = products[row.product_id]
+        new_kg = float(product.stock_actuel_kg or 0.0) + float(row.ecart_kg)
+        new_cartons = int(product.stock_actuel_cartons or 0) + int(row.ecart_cartons)
+        if new_kg < -1e-9 or new_cartons < 0:
+            negative.append(product.code_produit)
+            continue
+        # Une hausse et / ou une baisse : kg et cartons peuvent varier en sens contraires
+        for sign in (1, -1):
+            kg = max(0.0, sign * float(row.ecart_kg))
+            cartons = max(0, sign * int(row.ecart_cartons))
+            if kg or cartons:
+                adjustments.append((product, sign, kg, cartons, StockAdjustment(
+                    date_ajustement=now,
+                    product_id=product.id,
+                    type_ajustement="increase" if sign > 0 else "decrease",
+                    qte_kg=kg,
+                    qte_cartons=cartons,
+                    raison=f"Inventaire {stock_take.reference}",
+                    reference_document=f"INV-{stock_take.id}",
+                    created_by=user_id,
+                )))
+    if negative:
+        db.rollback()
+        raise StockTakeError(
+            f"Stock would become negative for {len(negative)} product(s): {', '.join(negative[:20])}"
+        )
+
+    db.add_all([adjustment for *_, adjustment in adjustments])
+    db.flush()  # ids des ajustements (INSERT multi-lignes), référencés par les mouvements
+
+    for product, sign, kg, cartons, adjustment in adjustments:
+        old_kg = float(product.stock_actuel_kg or 0.0)
+        old_cartons = int(product.stock_actuel_cartons or 0)
+        product.stock_actuel_kg = old_kg + sign * kg
+        product.stock_actuel_cartons = old_cartons + sign * cartons
+        record_movement(
+            db,
+            product_id=product.id,
+            type_mouvement="ENTREE" if sign > 0 else "SORTIE",
+            qte_kg_avant=old_kg,
+            qte_cartons_avant=old_cartons,
+            qte_kg_mouvement=sign * kg,
+            qte_cartons_mouvement=sign * cartons,
+            qte_kg_apres=product.stock_actuel_kg,
+            qte_cartons_apres=product.stock_actuel_cartons,
+            reference_id=adjustment.id,
+            reference_type="ADJUSTMENT",
+            created_by=user_id,
+        )
+
+    stock_take.statut = VALIDATED
+    stock_take.closed_by = user_id
+    stock_take.closed_at = now
+    stock_take.ajustements = len(adjustments)
+    db.commit()
+    return stock_take
+
+
+def cancel_stock_take(db: Session, stock_take_id: int, user_id: int) -> StockTake:
+    stock_take = get_open(db, stock_take_id, lock=True)
+    stock_take.statut = CANCELLED
+    stock_take.closed_by = user_id
+    stock_take.closed_at = datetime.now()
+    db.commit()
+    return stock_take
+
+
+def summary(db: Session, stock_take: StockTake) -> Dict:
+    """Session avec nombre de produits figés, de produits comptés et de comptages."""
+    frozen, counted, counts = db.execute(select(
+        select(func.count()).where(StockTakeSnapshot.stock_take_id == stock_take.id).scalar_subquery(),
+        select(func.count(func.distinct(StockTakeCount.product_id)))
+        .where(StockTakeCount.stock_take_id == stock_take.id).scalar_subquery(),
+        select(func.count()).where(StockTakeCount.stock_take_id == stock_take.id).scalar_subquery(),
+    )).one()
+    return {
+        "id": stock_take.id,
+        "reference": stock_take.reference,
+        "statut": stock_take.statut,
+        "remarque": stock_take.remarque,
+        "started_by": stock_take.started_by,
+        "started_at": stock_take.started_at,
+        "closed_by": stock_take.closed_by,
+        "closed_at": stock_take.closed_at,
+        "ajustements": stock_take.ajustements or 0,
+        "produits_figes": frozen,
+        "produits_comptes": counted,
+        "comptages": counts,
+    }
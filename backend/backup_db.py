@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Sauvegarde à chaud et restauration de la base SQLite (voir app/backup.py).
+
+L'API peut rester démarrée : la copie se fait par paquets de pages, sans
+bloquer les écritures, et chaque sauvegarde est vérifiée.
+
+Usage :
+    python backup_db.py full                 # nouvelle chaîne
+    python backup_db.py incremental          # pages modifiées depuis le dernier instantané
+    python backup_db.py list
+    python backup_db.py restore backups/full-20250101-020000-000000.db restored.db
+    python backup_db.py restore <base> restored.db --upto <base>.inc-<horodatage>.gz
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["full", "incremental", "list", "restore"])
+    parser.add_argument("base", nargs="?", help="restore : sauvegarde complète de départ")
+    parser.add_argument("target", nargs="?", help="restore : fichier à créer")
+    parser.add_argument("--upto", help="restore : dernier incrément à rejouer (tous par défaut)")
+    parser.add_argument("--dir", default=None, help="répertoire des sauvegardes (BACKUP_DIR)")
+    args = parser.parse_args()
+
+    from app.backup import BACKUP_DIR, BackupError, backup_service, full_backup, incremental_backup, list_backups, restore
+
+    directory = args.dir or BACKUP_DIR
+    try:
+        if args.command == "list":
+            print(json.dumps(list_backups(directory), indent=2))
+        elif args.command == "restore":
+            if not args.base or not args.target:
+                parser.error("restore : base et target sont requis")
+            if os.path.exists(args.target):
+                print(f"❌ {args.target} existe déjà")
+                return 1
+            applied = restore(args.base, args.target, args.upto)
+            print(f"✅ {args.target} restauré ({applied} incréments rejoués, intégrité vérifiée)")
+        else:
+            if backup_service is None:
+                print("❌ Sauvegarde à chaud réservée à SQLite (PostgreSQL : pg_dump)")
+                return 1
+            backup = full_backup if args.command == "full" else incremental_backup
+            print(json.dumps(backup(backup_service.source_path, directory), indent=2))
+    except BackupError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
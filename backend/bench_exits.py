@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Latence d'une sortie de stock selon son nombre de lignes (1 à 500).
+
+Génère un jeu de produits approvisionnés (voir datagen.py) dans une base
+temporaire, puis poste des sorties de N lignes via POST /api/stock-exits/
+et affiche, pour chaque taille, la latence médiane, le coût par ligne et le
+nombre de requêtes SQL.
+
+Usage :
+    python bench_exits.py
+    python bench_exits.py --sizes 1,50,500 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,50,100,250,500", help="nombres de lignes, séparés par des virgules")
+    parser.add_argument("--repeat", type=int, default=10, help="sorties mesurées par taille")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='stock-exits-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+
+    from app.database import Base, sync_schema
+    from app.main import app
+    from app.querycount import count_queries
+    from datagen import DatasetConfig, generate
+
+    # Assez de produits pour 500 lignes distinctes, assez de stock pour toutes les sorties
+    config = replace(DatasetConfig(), products=max(sizes) * 2, receptions=max(sizes) * 8, lines_per_reception=40,
+                     exits=0, adjustments=0, seed=args.seed)
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(bind=engine)
+    sync_schema(engine)
+    generate(engine, config, log=lambda message: None)
+    engine.dispose()
+
+    rng = random.Random(args.seed)
+    with TestClient(app) as client:
+        token = client.post("/api/auth/token", data={
+            "username": config.admin_username, "password": config.admin_password,
+        }).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        products = client.get("/api/products/", params={"limit": 100000}, headers=headers).json()
+        in_stock = [p["id"] for p in products if p["stock_actuel_kg"] >= 50 and p["stock_actuel_cartons"] >= 20]
+        if len(in_stock) < max(sizes):
+            print(f"❌ {len(in_stock)} produits approvisionnés seulement")
+            return 1
+
+        def post(lines):
+            items = [{"product_id": pid, "qte_kg": 0.1, "qte_cartons": 0} for pid in rng.sample(in_stock, lines)]
+            response = client.post("/api/stock-exits/", headers=headers, json={
+                "date_sortie": "2025-01-15T10:00:00", "type_sortie": "vente", "items": items,
+            })
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+        post(1)  # chauffe
+        print(f"[exits] {'lignes':>6s} {'médiane':>10s} {'p95':>10s} {'par ligne':>10s} {'requêtes':>9s}")
+        for size in sizes:
+            durations = []
+            for _ in range(args.repeat):
+                with count_queries() as queries:
+                    started = time.perf_counter()
+                    post(size)
+                    durations.append((time.perf_counter() - started) * 1000.0)
+            durations.sort()
+            median = statistics.median(durations)
+            p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+            print(f"[exits] {size:6d} {median:8.2f}ms {p95:8.2f}ms {median / size:8.3f}ms {queries.count:9d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
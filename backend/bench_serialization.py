@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Coût CPU de la sérialisation des listes de produits, par chemin de réponse.
+
+Mesure (temps CPU du processus, requête SQL comprise) pour 1 000 produits :
+- `orm+pydantic+json`   : objets ORM validés par le `response_model` puis
+                          encodés par `json` (ancien chemin de GET /api/products/) ;
+- `orm+pydantic+orjson` : idem avec `ORJSONResponse` (classe par défaut seule) ;
+- `rows+orjson`         : colonnes du schéma lues en tuples, encodées par orjson
+                          sans revalidation (chemin actuel, voir app/responses.py).
+
+Usage :
+    python bench_serialization.py
+    python bench_serialization.py --products 5000 --repeat 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='stock-ser-')}/bench.db"
+
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from sqlalchemy import create_engine
+
+    from app.database import Product, SessionLocal, sync_schema
+    from app.responses import rows_response
+    from app.routers.products import PRODUCT_COLUMNS
+    from app.schemas import Product as ProductSchema
+    from datagen import DatasetConfig, generate
+
+    engine = create_engine(os.environ["DATABASE_URL"])
+    sync_schema(engine)
+    generate(engine, replace(DatasetConfig(), products=args.products, receptions=0, exits=0, adjustments=0),
+             log=lambda message: None)
+    engine.dispose()
+
+    def validated(db):
+        # Ce que fait FastAPI avec un response_model : validation puis dump en mode JSON
+        return [ProductSchema.model_validate(p).model_dump(mode="json") for p in db.query(Product).all()]
+
+    paths = {
+        "orm+pydantic+json": lambda db: JSONResponse(validated(db)).body,
+        "orm+pydantic+orjson": lambda db: ORJSONResponse(validated(db)).body,
+        "rows+orjson": lambda db: rows_response(db.query(*PRODUCT_COLUMNS).all()).body,
+    }
+
+    print(f"[ser] {args.products} produits, {args.repeat} répétitions, CPU par 1 000 produits :")
+    baseline = None
+    for name, build in paths.items():
+        samples = []
+        for i in range(args.repeat + 2):
+            db = SessionLocal()
+            try:
+                started = time.process_time()
+                body = build(db)
+                elapsed = time.process_time() - started
+            finally:
+                db.close()
+            if i >= 2:  # deux tours de chauffe
+                samples.append(elapsed * 1000.0 * 1000 / args.products)
+        median = statistics.median(samples)
+        baseline = baseline or median
+        print(f"  {name:22s} {median:8.2f} ms  x{baseline / median:5.1f}  ({len(body)} octets)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
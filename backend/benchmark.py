@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Banc de performance de l'API de stock.
+
+Génère un jeu de données reproductible (voir datagen.py) dans une base
+temporaire, puis mesure les scénarios clés en processus via TestClient :
+scan code-barres, liste de produits, réception en lot, sortie, résumé de stock, historique des
+mouvements et exports. Les résultats (latences min/médiane/p95, débit) sont
+écrits en JSON, un fichier par commit, pour comparer deux versions.
+
+Usage :
+    python benchmark.py                          # jeu « small », résultats dans bench_results/
+    python benchmark.py --scale medium --concurrency 4
+    python benchmark.py --only scan_lookup,exit --iterations 200
+    python benchmark.py --compare bench_results/abc1234.json
+    python benchmark.py --database-url sqlite:///./bench.db --no-generate
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, replace
+
+from datagen import DatasetConfig
+
+SCALES = {
+    "small": DatasetConfig(products=500, receptions=2000, exits=3000, adjustments=300),
+    "medium": DatasetConfig(products=2000, receptions=20000, exits=40000, adjustments=3000),
+    "large": DatasetConfig(products=10000, receptions=200000, exits=400000, adjustments=20000),
+}
+
+# Nombre d'itérations par défaut : les exports et listes complètes sont lents
+DEFAULT_ITERATIONS = {
+    "scan_lookup": 500,
+    "product_list": 50,
+    "batch_entry": 50,
+    "exit": 100,
+    "stock_summary": 20,
+    "movements": 10,
+    "product_movements": 100,
+    "exit_analytics": 10,
+    "abc": 10,
+    "export_json": 20,
+    "export_excel": 5,
+    "export_pdf": 5,
+}
+
+
+class Scenarios:
+    """Scénarios mesurés ; chaque méthode effectue une requête et vérifie son statut."""
+
+    def __init__(self, client, headers, seed):
+        self.client = client
+        self.headers = headers
+        self.rng = random.Random(seed)
+        products = client.get("/api/products/", params={"limit": 100000}, headers=headers).json()
+        self.barcodes = [p["code_barre"] for p in products if p.get("code_barre")]
+        self.product_ids = [p["id"] for p in products]
+        # Produits assez fournis pour absorber toutes les sorties du banc
+        self.in_stock = [p["id"] for p in products if p["stock_actuel_kg"] >= 100 and p["stock_actuel_cartons"] >= 50]
+        self.counter = 0
+
+    def _check(self, response, expected=200):
+        if response.status_code != expected:
+            raise RuntimeError(f"{response.request.method} {response.request.url} -> HTTP {response.status_code}: {response.text[:200]}")
+        return response
+
+    def scan_lookup(self):
+        code = self.rng.choice(self.barcodes)
+        self._check(self.client.get(f"/api/products/by-barcode/{code}", headers=self.headers))
+
+    def product_list(self):
+        self._check(self.client.get("/api/products/", params={"limit": 1000}, headers=self.headers))
+
+    def batch_entry(self):
+        self.counter += 1
+        items = [
+            {"product_id": pid, "qte_kg": 10.0, "qte_cartons": 1}
+            for pid in self.rng.sample(self.product_ids, min(20, len(self.product_ids)))
+        ]
+        self._check(self.client.post("/api/stock-entries/batch", headers=self.headers, json={
+            "date_reception": "2025-01-15T08:00:00", "num_reception": f"BENCH-{self.counter}", "items": items,
+        }))
+
+    def exit(self):
+        items = [
+            {"product_id": pid, "qte_kg": 0.5, "qte_cartons": 0}
+            for pid in self.rng.sample(self.in_stock, min(5, len(self.in_stock)))
+        ]
+        self._check(self.client.post("/api/stock-exits/", headers=self.headers, json={
+            "date_sortie": "2025-01-15T10:00:00", "type_sortie": "vente", "items": items,
+        }))
+
+    def stock_summary(self):
+        self._check(self.client.get("/api/reports/stock-summary", headers=self.headers))
+
+    def movements(self):
+        self._check(self.client.get("/api/reports/movements", headers=self.headers, params={
+            "date_debut": "2024-12-01T00:00:00", "date_fin": "2024-12-31T23:59:59",
+        }))
+
+    def product_movements(self):
+        pid = self.rng.choice(self.product_ids)
+        self._check(self.client.get(f"/api/reports/movements/{pid}", headers=self.headers))
+
+    def exit_analytics(self):
+        self._check(self.client.get("/api/reports/exit-analytics", headers=self.headers, params={
+            "granularity": "week", "date_debut": "2024-01-01T00:00:00", "date_fin": "2024-12-31T23:59:59",
+        }))
+
+    def abc(self):
+        self._check(self.client.get("/api/reports/abc", headers=self.headers, params={
+            "date_debut": "2024-01-01T00:00:00", "date_fin": "2024-12-31T23:59:59",
+        }))
+
+    def export_json(self):
+        self._check(self.client.get("/api/reports/export-data", headers=self.headers))
+
+    def export_excel(self):
+        self._check(self.client.get("/api/reports/excel/stock-summary", headers=self.headers))
+
+    def export_pdf(self):
+        self._check(self.client.get("/api/reports/pdf/stock-summary", headers=self.headers))
+
+
+def run_scenario(func, iterations, concurrency, warmup):
+    for _ in range(warmup):
+        func()
+
+    def timed(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            durations = list(pool.map(timed, range(iterations)))
+    else:
+        durations = [timed(i) for i in range(iterations)]
+    wall = time.perf_counter() - started
+
+    durations.sort()
+    ms = [d * 1000.0 for d in durations]
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "min_ms": round(ms[0], 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+        "ops_per_s": round(iterations / wall, 2),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline_path, results, threshold) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nComparaison avec {baseline.get('commit')} ({baseline_path}) sur la médiane :")
+    for key in ("scale", "database"):
+        if baseline.get(key) != results[key]:
+            print(f"  attention : {key} différent ({baseline.get(key)} / {results[key]})")
+    regressions = 0
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            print(f"  {name:20s} nouveau")
+            continue
+        change = (current["median_ms"] - before["median_ms"]) / before["median_ms"] * 100.0 if before["median_ms"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  <-- régression"
+            regressions += 1
+        print(f"  {name:20s} {before['median_ms']:10.3f} -> {current['median_ms']:10.3f} ms  {change:+7.1f}%{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+        help="base à utiliser (défaut : BENCH_DATABASE_URL, sinon SQLite temporaire ; voir pg_harness.py)",
+    )
+    parser.add_argument("--no-generate", action="store_true", help="ne pas générer de données (base déjà remplie)")
+    parser.add_argument("--only", help="scénarios à lancer, séparés par des virgules")
+    parser.add_argument("--iterations", type=int, help="itérations par scénario (défaut : selon le scénario)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1, help="requêtes simultanées (threads)")
+    parser.add_argument("--output", help="fichier de résultats (défaut : bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="résultats de référence à comparer")
+    parser.add_argument("--threshold", type=float, default=10.0, help="régression tolérée en %% (défaut 10)")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='stock-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+
+    from app.database import Base, sync_schema
+    from app.main import app
+    from datagen import generate
+
+    config = replace(SCALES[args.scale], seed=args.seed)
+    if not args.no_generate:
+        engine = create_engine(database_url)
+        Base.metadata.drop_all(bind=engine)
+        sync_schema(engine)
+        started = time.perf_counter()
+        generate(engine, config, log=lambda message: None)
+        print(f"[bench] jeu « {args.scale} » généré en {time.perf_counter() - started:.1f}s")
+        engine.dispose()
+
+    names = args.only.split(",") if args.only else list(DEFAULT_ITERATIONS)
+    unknown = [name for name in names if name not in DEFAULT_ITERATIONS]
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(unknown)}")
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database_url.split(":", 1)[0],
+        "scale": args.scale,
+        "dataset": asdict(config),
+        "scenarios": {},
+    }
+
+    with TestClient(app) as client:
+        token = client.post("/api/auth/token", data={
+            "username": config.admin_username, "password": config.admin_password,
+        }).json()["access_token"]
+        scenarios = Scenarios(client, {"Authorization": f"Bearer {token}"}, args.seed)
+        for name in names:
+            iterations = args.iterations or DEFAULT_ITERATIONS[name]
+            stats = run_scenario(getattr(scenarios, name), iterations, args.concurrency, args.warmup)
+            results["scenarios"][name] = stats
+            print(
+                f"[bench] {name:20s} médiane {stats['median_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+                f"{stats['ops_per_s']:8.1f} ops/s  (n={iterations})"
+            )
+
+    output = args.output or os.path.join("bench_results", f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"[bench] résultats écrits dans {output}")
+
+    if args.compare:
+        return 1 if compare(args.compare, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
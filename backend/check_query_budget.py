@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Vérification du budget de requêtes SQL des endpoints de liste.
+
+Crée une base SQLite temporaire, y enregistre des produits, réceptions,
+sorties et ajustements via l'API, puis appelle chaque endpoint de liste et
+échoue (code de sortie 1) si l'un d'eux dépasse son budget : un chargement
+paresseux par ligne (N+1) fait exploser le compte dès quelques dizaines de
+lignes.
+
+Usage (à lancer en CI) :
+    python check_query_budget.py
+    python pg_harness.py -- python check_query_budget.py
+"""
+import os
+import sys
+import tempfile
+
+# BENCH_DATABASE_URL : base vide fournie par pg_harness.py (PostgreSQL)
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp(prefix='query-budget-')}/budget.db"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.querycount import count_queries  # noqa: E402
+
+NUM_PRODUCTS = 30
+NUM_DOCUMENTS = 5
+
+# 1 requête d'authentification (utilisateur courant) + requêtes propres à l'endpoint
+BUDGETS = {
+    "/api/products/": 2,
+    "/api/products/low-stock/alert": 2,
+    "/api/stock-entries/": 2,
+    "/api/stock-entries/by-product/1": 2,
+    "/api/stock-exits/": 2,
+    "/api/stock-exits/by-product/1": 2,
+    "/api/stock-exits/by-type/vente": 2,
+    "/api/stock-entries/documents": 2,
+    "/api/stock-entries/documents/1/lines": 2,
+    "/api/stock-exits/documents": 2,
+    "/api/stock-exits/documents/1/lines": 2,
+    "/api/adjustments/": 2,
+    "/api/alerts/": 2,
+    "/api/reports/stock-summary": 4,
+    "/api/reports/movements": 2,
+    "/api/reports/movements/1": 2,
+    "/api/reports/low-stock": 2,
+    "/api/reports/dashboard": 4,
+    "/api/reports/exit-analytics": 2,
+    "/api/reports/reorder-suggestions": 2,
+    "/api/reports/abc": 2,
+    "/api/reports/export-data": 2,
+    "/api/mobile/products": 1,
+}
+
+
+def seed(client: TestClient) -> dict:
+    client.post("/api/auth/register", json={
+        "username": "budget", "email": "budget@example.com", "password": "budget", "is_admin": True,
+    })
+    token = client.post("/api/auth/token", data={"username": "budget", "password": "budget"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    ids = []
+    for i in range(NUM_PRODUCTS):
+        r = client.post("/api/products/", headers=headers, json={
+            "code_produit": f"QB{i:03d}", "code_barre": f"99{i:011d}", "nom_produit": f"Produit {i}",
+            "prix_achat": 1.0, "prix_vente": 2.0, "seuil_alerte": 5.0,
+        })
+        ids.append(r.json()["id"])
+
+    for d in range(NUM_DOCUMENTS):
+        client.post("/api/stock-entries/batch", headers=headers, json={
+            "date_reception": f"2024-01-{d + 1:02d}T08:00:00", "num_reception": f"REC-{d}",
+            "items": [{"product_id": pid, "qte_kg": 10.0, "qte_cartons": 2} for pid in ids],
+        })
+        client.post("/api/stock-exits/", headers=headers, json={
+            "date_sortie": f"2024-02-{d + 1:02d}T08:00:00", "type_sortie": "vente",
+            "items": [{"product_id": pid, "qte_kg": 1.0, "qte_cartons": 1} for pid in ids],
+        })
+    for pid in ids:
+        client.post("/api/adjustments/", headers=headers, json={
+            "date_ajustement": "2024-03-01T08:00:00", "product_id": pid,
+            "type_ajustement": "increase", "qte_kg": 1.0, "qte_cartons": 0, "raison": "inventaire",
+        })
+    return headers
+
+
+def main() -> int:
+    failures = 0
+    with TestClient(app) as client:
+        headers = seed(client)
+        for url, budget in BUDGETS.items():
+            with count_queries() as counter:
+                response = client.get(url, headers=headers)
+            ok = response.status_code == 200 and counter.count <= budget
+            status = "ok  " if ok else "FAIL"
+            print(f"{status} {url:40s} {counter.count:3d} queries (budget {budget}) HTTP {response.status_code}")
+            if not ok:
+                failures += 1
+                for sql in counter.statements:
+                    print(f"       {sql.splitlines()[0][:140]}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Vérification du temps de démarrage du backend (lancé par l'application de bureau).
+
+1. `python -X importtime -c "import app.main"` : temps d'import par paquet,
+   et échec si un module réservé aux rapports / exports / mots de passe
+   (`LAZY_MODULES`) est importé au démarrage ;
+2. démarrage à froid : `python -m uvicorn app.main:app` sur une base déjà
+   initialisée, chronométré jusqu'à la première réponse de /health, médiane
+   de `--runs` lancements ; échec au-delà de `--budget-ms`.
+
+Usage (à lancer en CI) :
+    python check_startup.py
+    python check_startup.py --budget-ms 3000 --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Importés à la première utilisation seulement (PDF, Excel, bcrypt, JWT)
+LAZY_MODULES = ("reportlab", "openpyxl", "bcrypt", "jwt", "cryptography")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_profile(env: dict) -> dict:
+    """Temps d'import cumulé (µs) par paquet de premier niveau, d'après -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import app.main a échoué :\n{result.stderr[-2000:]}")
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # ligne d'en-tête
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return packages
+
+
+def cold_start(env: dict, timeout: float = 30.0) -> float:
+    """Millisecondes entre le lancement d'uvicorn et la première réponse de /health."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn arrêté (code {process.returncode})")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000.0
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health sans réponse après {timeout:.0f} s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "2500")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="paquets les plus coûteux à afficher")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='startup-')}/startup.db"
+    env.setdefault("MOVEMENT_JOURNAL", "0")
+    failed = False
+
+    # Premier import : crée la base, les suivants trouvent le schéma à jour
+    packages = import_profile(env)
+    packages = import_profile(env)
+    total = sum(packages.values())
+    print(f"[startup] import app.main : {total / 1000:.0f} ms")
+    for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"[startup]   {name:24s} {micros / 1000:8.1f} ms")
+    eager = [name for name in LAZY_MODULES if name in packages]
+    if eager:
+        print(f"❌ importés au démarrage : {', '.join(eager)}")
+        failed = True
+
+    durations = [cold_start(env) for _ in range(args.runs)]
+    median = statistics.median(durations)
+    status = "ok  " if median <= args.budget_ms else "FAIL"
+    print(f"{status} démarrage à froid -> /health : {median:.0f} ms "
+          f"(min {min(durations):.0f}, max {max(durations):.0f}, budget {args.budget_ms:.0f})")
+    failed = failed or median > args.budget_ms
+
+    if failed:
+        print("\n❌ Budget de démarrage dépassé")
+        return 1
+    print("\n✅ Démarrage dans le budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
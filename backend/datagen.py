@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Générateur reproductible de données de stock à l'échelle de la production.
+
+Produits, réceptions (entête + lignes), sorties (entête + lignes),
+ajustements et mouvements, répartis sur une période donnée. Les événements
+sont rejoués dans l'ordre chronologique en mémoire : les sorties ne
+consomment que le stock disponible, chaque mouvement porte ses quantités
+avant/après et le stock final des produits est cohérent avec l'historique.
+
+Même graine + mêmes paramètres => même jeu de données, ligne pour ligne.
+Sur une base existante, les lignes sont ajoutées à la suite des données
+présentes et partent du stock actuel des produits.
+
+Usage :
+    python datagen.py --products 2000 --receptions 50000 --exits 80000 --seed 42
+    python datagen.py --reset --database-url sqlite:///./bench.db
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import create_engine, insert, select
+
+EXIT_TYPES = ["vente", "depot_vente", "don", "perime", "non_consommable", "non_utilisable"]
+EXIT_TYPE_WEIGHTS = [80, 8, 4, 4, 2, 2]
+CARTON_WEIGHTS = [1.0, 2.5, 5.0, 10.0, 12.0, 20.0, 25.0]
+
+
+@dataclass
+class DatasetConfig:
+    products: int = 500
+    receptions: int = 5000
+    lines_per_reception: int = 8
+    exits: int = 8000
+    lines_per_exit: int = 4
+    adjustments: int = 1000
+    days: int = 365
+    end_date: str = "2024-12-31"
+    seed: int = 42
+    chunk_size: int = 20000
+    admin_username: str = "admin"
+    admin_password: str = "admin123"
+
+
+def _sorted_offsets(rng, count, span_seconds):
+    return sorted(rng.random() * span_seconds for _ in range(count))
+
+
+def generate(engine, config: DatasetConfig, log=print) -> dict:
+    """Insérer le jeu de données décrit par `config` ; renvoie le nombre de lignes par table."""
+    from app.bulkload import BulkLoader, StockLedger, fast_load, next_ids
+    from app.database import (
+        Product,
+        StockAdjustment,
+        StockEntry,
+        StockEntryItem,
+        StockExit,
+        StockExitItem,
+        StockMovement,
+        User,
+    )
+    from app.routers.auth import get_password_hash
+
+    rng = random.Random(config.seed)
+    end = datetime.strptime(config.end_date, "%Y-%m-%d") + timedelta(hours=18)
+    start = end - timedelta(days=config.days)
+    span = (end - start).total_seconds()
+
+    # Ordre des clés étrangères : entêtes avant lignes, produits avant tout
+    tables = [
+        Product.__table__,
+        StockEntry.__table__,
+        StockExit.__table__,
+        StockAdjustment.__table__,
+        StockEntryItem.__table__,
+        StockExitItem.__table__,
+        StockMovement.__table__,
+    ]
+
+    with fast_load(engine, tables) as conn:
+        # Les identifiants sont attribués ici : on complète une base existante
+        # à la suite des lignes déjà présentes.
+        ids = next_ids(conn, tables)
+        existing = conn.execute(
+            select(Product.id, Product.stock_actuel_kg, Product.stock_actuel_cartons).order_by(Product.id)
+        ).all()
+
+        admin_id = conn.execute(
+            select(User.id).where(User.username == config.admin_username)
+        ).scalar()
+        if admin_id is None:
+            admin_id = conn.execute(insert(User.__table__).values(
+                username=config.admin_username,
+                email=f"{config.admin_username}@stockapp.com",
+                hashed_password=get_password_hash(config.admin_password),
+                is_active=True,
+                is_admin=True,
+            )).inserted_primary_key[0]
+
+        loader = BulkLoader(conn, tables, config.chunk_size)
+        ledger = StockLedger(loader, ids["stock_movements"], admin_id)
+        kg_per_carton = {}
+        for row in existing:
+            ledger.open(row.id, row.stock_actuel_kg, row.stock_actuel_cartons)
+            kg_per_carton[row.id] = rng.choice(CARTON_WEIGHTS)
+
+        # Nouveaux produits : stock initial nul, mis à jour à la fin avec le stock simulé
+        first_product_id = ids["products"] + 1
+        for i in range(first_product_id, first_product_id + config.products):
+            kg_per_carton[i] = rng.choice(CARTON_WEIGHTS)
+            ledger.open(i)
+            prix_achat = round(rng.uniform(0.5, 40.0), 2)
+            loader.add("products", {
+                "id": i,
+                "code_produit": f"P{i:06d}",
+                "code_barre": f"{200000000000 + i:013d}",
+                "nom_produit": f"Produit {i}",
+                "description": None,
+                "unite_kg": True,
+                "unite_cartons": True,
+                "prix_achat": prix_achat,
+                "prix_vente": round(prix_achat * rng.uniform(1.1, 1.8), 2),
+                "stock_actuel_kg": 0.0,
+                "stock_actuel_cartons": 0,
+                "seuil_alerte": float(rng.choice([0, 10, 25, 50, 100])),
+                "seuil_alerte_cartons": rng.choice([0, 1, 2, 5]),
+                "created_at": start,
+            })
+        product_ids = sorted(ledger.kg)
+        if not product_ids:
+            raise RuntimeError("Aucun produit (utiliser --products)")
+
+        # Popularité inégale : quelques produits concentrent l'essentiel des lignes
+        weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(product_ids))]
+        rng.shuffle(weights)
+        cum_weights = list(accumulate(weights))
+
+        timeline = heapq.merge(
+            ((t, "entry") for t in _sorted_offsets(rng, config.receptions, span)),
+            ((t, "exit") for t in _sorted_offsets(rng, config.exits, span)),
+            ((t, "adjustment") for t in _sorted_offsets(rng, config.adjustments, span)),
+        )
+
+        stock_kg, stock_cartons = ledger.kg, ledger.cartons
+        for offset, kind in timeline:
+            at = start + timedelta(seconds=offset)
+            if kind == "entry":
+                ids["stock_entries"] += 1
+                entry_id = ids["stock_entries"]
+                loader.add("stock_entries", {
+                    "id": entry_id,
+                    "date_reception": at,
+                    "num_reception": f"REC-{entry_id:07d}",
+                    "num_reception_carnet": f"CARN-{entry_id:07d}",
+                    "num_facture": f"FACT-{rng.randint(1000, 999999)}",
+                    "num_packing_liste": f"PACK-{rng.randint(1000, 999999)}",
+                    "created_by": admin_id,
+                    "created_at": at,
+                    "remarque": None,
+                })
+                count = max(1, int(rng.gauss(config.lines_per_reception, config.lines_per_reception / 3)))
+                for product_id in set(rng.choices(product_ids, cum_weights=cum_weights, k=count)):
+                    cartons = rng.randint(5, 120)
+                    qte_kg = round(cartons * kg_per_carton[product_id], 3)
+                    ids["stock_entry_items"] += 1
+                    loader.add("stock_entry_items", {
+                        "id": ids["stock_entry_items"],
+                        "entry_id": entry_id,
+                        "product_id": product_id,
+                        "qte_kg": qte_kg,
+                        "qte_cartons": cartons,
+                        "date_peremption": at + timedelta(days=rng.randint(30, 720)),
+                        "remarque": None,
+                    })
+                    ledger.move(product_id, "ENTREE", qte_kg, cartons, ids["stock_entry_items"], "ENTRY", at)
+
+            elif kind == "exit":
+                count = max(1, int(rng.gauss(config.lines_per_exit, config.lines_per_exit / 3)))
+                lines = []
+                for product_id in set(rng.choices(product_ids, cum_weights=cum_weights, k=count)):
+                    available = stock_cartons[product_id]
+                    if available <= 0 or stock_kg[product_id] <= 0:
+                        continue
+                    cartons = rng.randint(1, max(1, min(available, 40)))
+                    qte_kg = min(round(cartons * kg_per_carton[product_id], 3), stock_kg[product_id])
+                    lines.append((product_id, qte_kg, cartons))
+                if not lines:
+                    continue
+                ids["stock_exits"] += 1
+                exit_id = ids["stock_exits"]
+                loader.add("stock_exits", {
+                    "id": exit_id,
+                    "date_sortie": at,
+                    "num_facture": f"FV-{exit_id:07d}",
+                    "prix_vente": None,
+                    "type_sortie": rng.choices(EXIT_TYPES, EXIT_TYPE_WEIGHTS)[0],
+                    "remarque": None,
+                    "created_by": admin_id,
+                    "created_at": at,
+                })
+                for product_id, qte_kg, cartons in lines:
+                    ids["stock_exit_items"] += 1
+                    loader.add("stock_exit_items", {
+                        "id": ids["stock_exit_items"],
+                        "exit_id": exit_id,
+                        "product_id": product_id,
+                        "qte_kg": qte_kg,
+                        "qte_cartons": cartons,
+                        "date_peremption": None,
+                        "remarque": None,
+                    })
+                    ledger.move(product_id, "SORTIE", -qte_kg, -cartons, ids["stock_exit_items"], "EXIT", at)
+
+            else:
+                product_id = rng.choices(product_ids, cum_weights=cum_weights)[0]
+                increase = rng.random() < 0.4 or stock_cartons[product_id] <= 0
+                cartons = rng.randint(1, 3) if increase else rng.randint(1, min(3, stock_cartons[product_id]))
+                qte_kg = round(cartons * kg_per_carton[product_id], 3)
+                if not increase:
+                    qte_kg = min(qte_kg, stock_kg[product_id])
+                sign = 1 if increase else -1
+                ids["stock_adjustments"] += 1
+                loader.add("stock_adjustments", {
+                    "id": ids["stock_adjustments"],
+                    "date_ajustement": at,
+                    "product_id": product_id,
+                    "type_ajustement": "increase" if increase else "decrease",
+                    "qte_kg": qte_kg,
+                    "qte_cartons": cartons,
+                    "raison": "Inventaire" if increase else "Casse",
+                    "reference_document": None,
+                    "created_by": admin_id,
+                    "created_at": at,
+                })
+                ledger.move(
+                    product_id, "ENTREE" if increase else "SORTIE",
+                    sign * qte_kg, sign * cartons, ids["stock_adjustments"], "ADJUSTMENT", at,
+                )
+
+        loader.flush()
+        ledger.write_stock(conn, Product.__table__, updated_at=end)
+
+    # Consommation lissée par produit (suggestions de réapprovisionnement) : les
+    # sorties chargées en masse ne passent pas par post_stock_exit
+    from app.demand import rebuild_demand
+
+    with engine.begin() as conn:
+        rebuild_demand(conn)
+
+    for name, count in loader.counts.items():
+        log(f"[datagen] {name}: {count}")
+    return dict(loader.counts)
+
+
+def main() -> int:
+    defaults = DatasetConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///./stock_management.db"))
+    parser.add_argument("--reset", action="store_true", help="supprimer et recréer toutes les tables avant la génération")
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from app.database import Base, sync_schema
+
+    config = DatasetConfig(**{field: getattr(args, field) for field in asdict(defaults)})
+    engine = create_engine(args.database_url)
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    sync_schema(engine)
+
+    started = time.perf_counter()
+    try:
+        generate(engine, config)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Données générées en {time.perf_counter() - started:.1f}s (graine {config.seed})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ import asyncio
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine, Base, User
 from app.routers.auth import get_password_hash
+from app.bulkload import BulkLoader
 
 async def create_default_user():
     """Créer un utilisateur admin par défaut"""
@@ -85,10 +86,10 @@ async def create_sample_products():
             }
         ]
         
-        for product_data in sample_products:
-            product = Product(**product_data)
-            db.add(product)
-        
+        # Insertion Core en un lot (voir app/bulkload.py)
+        loader = BulkLoader(db.connection(), [Product.__table__])
+        loader.extend("products", sample_products)
+        loader.flush()
         db.commit()
         print(f"{len(sample_products)} produits d'exemple créés avec succès")
         
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Cluster PostgreSQL jetable pour les tests et bancs de performance (sans Docker).
+
+Crée un cluster avec `initdb` dans un répertoire temporaire, le démarre sur un
+port libre (socket Unix privée, fsync désactivé : données jetables), crée la
+base, lance la commande donnée avec `DATABASE_URL` et `BENCH_DATABASE_URL`
+(lue par benchmark.py et check_query_budget.py) pointant dessus, puis
+arrête et supprime le cluster.
+
+Les binaires sont cherchés dans `PG_BIN`, le PATH, puis /usr/lib/postgresql/*/bin.
+Le pilote psycopg2 doit être installé (extra « postgresql »).
+
+Usage :
+    python pg_harness.py -- python benchmark.py --scale small
+    python pg_harness.py -- python check_query_budget.py
+    python pg_harness.py --keep -- python datagen.py --reset
+"""
+import argparse
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+
+DB_NAME = "stock_management"
+DB_USER = "postgres"
+
+
+def find_pg_bin() -> str:
+    candidates = [os.getenv("PG_BIN", "")]
+    initdb = shutil.which("initdb")
+    if initdb:
+        candidates.append(os.path.dirname(initdb))
+    candidates += sorted(glob.glob("/usr/lib/postgresql/*/bin"), reverse=True)
+    candidates += sorted(glob.glob("/usr/local/opt/postgresql*/bin"), reverse=True)
+    for directory in candidates:
+        if directory and os.path.isfile(os.path.join(directory, "initdb")):
+            return directory
+    raise RuntimeError("initdb introuvable (installer PostgreSQL ou définir PG_BIN)")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep", action="store_true", help="ne pas supprimer le cluster à la fin")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="commande à lancer (après --)")
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("aucune commande à lancer")
+
+    try:
+        pg_bin = find_pg_bin()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 2
+
+    def tool(name):
+        return os.path.join(pg_bin, name)
+
+    workdir = tempfile.mkdtemp(prefix="stock-pg-")
+    datadir = os.path.join(workdir, "data")
+    port = free_port()
+    started = False
+    try:
+        subprocess.run(
+            [tool("initdb"), "-D", datadir, "-U", DB_USER, "-A", "trust", "-E", "UTF8", "--no-locale"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {port} -k {workdir} -c listen_addresses='' -c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+        subprocess.run(
+            [tool("pg_ctl"), "-D", datadir, "-l", os.path.join(workdir, "postgres.log"), "-o", options, "-w", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        started = True
+        subprocess.run(
+            [tool("createdb"), "-h", workdir, "-p", str(port), "-U", DB_USER, DB_NAME],
+            check=True,
+        )
+
+        url = f"postgresql+psycopg2://{DB_USER}@/{DB_NAME}?host={workdir}&port={port}"
+        print(f"[pg] cluster prêt : {url}")
+        env = dict(os.environ, DATABASE_URL=url, BENCH_DATABASE_URL=url)
+        return subprocess.run(command, env=env).returncode
+    except subprocess.CalledProcessError as e:
+        print(f"❌ {' '.join(e.cmd)} a échoué (code {e.returncode}), journal : {workdir}/postgres.log")
+        return 2
+    finally:
+        if started:
+            subprocess.run(
+                [tool("pg_ctl"), "-D", datadir, "-m", "fast", "-w", "stop"],
+                stdout=subprocess.DEVNULL,
+            )
+        if args.keep:
+            print(f"[pg] cluster conservé dans {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
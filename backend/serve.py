@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Serveur de production : plusieurs workers uvicorn derrière un même port.
+
+L'application est importée une seule fois dans le processus maître (schéma
+synchronisé, routes construites), puis les workers sont créés par fork et
+partagent le socket d'écoute ; un worker qui meurt est relancé. Sous
+Windows (pas de fork), uvicorn lance lui-même les workers, qui réimportent
+l'application.
+
+Rien de modifiable n'est partagé entre workers, sauf les versions du grand
+livre (fichier projeté en mémoire, voir app/ledger.py) : une écriture dans
+un worker invalide les caches de rapports et les ETags de tous les autres.
+Restent propres à chaque worker : les limites de débit de connexion et les
+métriques /metrics.
+
+Le journal des mouvements (MOVEMENT_JOURNAL) suppose un seul processus
+écrivain : il est refusé avec plus d'un worker. Le bus d'événements SSE est
+lui aussi propre au processus (un abonné ne verrait que les écritures de
+son worker) : les flux /api/events et /api/alerts/stream sont désactivés
+avec plus d'un worker (503), et SSE_EVENTS=1 est refusé.
+
+Usage :
+    python serve.py
+    python serve.py --workers 8 --port 8000
+Variables : HOST, PORT, WEB_CONCURRENCY (défaut : nombre de cœurs).
+"""
+import argparse
+import atexit
+import os
+import signal
+import socket
+import sys
+import tempfile
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_forked(app, sock: socket.socket, workers: int, log_level: str) -> int:
+    import uvicorn
+
+    from app.database import engine
+
+    # Aucune connexion ouverte par le maître ne doit être héritée par les workers
+    engine.dispose()
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 1
+            try:
+                engine.dispose(close=False)
+                config = uvicorn.Config(app, log_level=log_level, proxy_headers=True)
+                uvicorn.Server(config).run(sockets=[sock])
+                code = 0
+            finally:
+                # Jamais de retour dans la boucle du maître
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"🚀 {workers} workers sur {sock.getsockname()[0]}:{sock.getsockname()[1]} (maître {os.getpid()})", flush=True)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"⚠️  worker {pid} arrêté (statut {status}), relance", flush=True)
+            spawn()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+
+    # Versions du grand livre partagées : le fichier doit être connu avant l'import de l'application
+    shared_file = os.path.join(tempfile.gettempdir(), f"stock-ledger-{os.getpid()}.bin")
+    os.environ["LEDGER_SHARED_FILE"] = shared_file
+    master_pid = os.getpid()
+
+    @atexit.register
+    def remove_shared_file():
+        if os.getpid() == master_pid:
+            try:
+                os.remove(shared_file)
+            except OSError:
+                pass
+
+    if workers > 1:
+        if os.getenv("SSE_EVENTS", "").lower() in ("1", "true", "yes", "on"):
+            print("❌ SSE_EVENTS suppose un seul processus : --workers 1 ou SSE_EVENTS=0")
+            return 1
+        # Avant tout import de app.events (et hérité par les workers réimportés sous Windows)
+        os.environ["SSE_EVENTS"] = "0"
+        print("ℹ️  Flux SSE (/api/events, /api/alerts/stream) désactivés avec plusieurs workers")
+
+    from app.database import enable_wal
+    from app.journal import JOURNAL_ENABLED
+
+    if JOURNAL_ENABLED and workers > 1:
+        print("❌ MOVEMENT_JOURNAL suppose un seul processus : --workers 1 ou MOVEMENT_JOURNAL=0")
+        return 1
+    # WAL : les lectures des autres workers ne bloquent plus pendant une écriture
+    enable_wal()
+
+    import uvicorn
+
+    if workers == 1:
+        from app.main import app
+
+        uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level, proxy_headers=True)
+        return 0
+    if not hasattr(os, "fork"):
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers,
+                    log_level=args.log_level, proxy_headers=True)
+        return 0
+
+    from app.main import app  # préchargement : une seule synchronisation du schéma
+
+    return _run_forked(app, _listen(args.host, args.port), workers, args.log_level)
+
+
+if __name__ == "__main__":
+    sys.exit(main())